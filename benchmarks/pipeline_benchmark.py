@@ -0,0 +1,384 @@
+"""
+End-to-end pipeline benchmark for the Job Application Helper.
+
+Measures the stages a resume goes through on a fixed, synthetic corpus (resumes of 1, 2, 5
+and 10 pages as PDF and DOCX, plus matching job descriptions and agent outputs):
+  * parse_pdf / parse_docx: utils.parse_resume
+  * clean_extract:          clean_raw_output + extract_content on raw agent output
+  * crew_kickoff:           one analysis crew run against the offline fake LLM (zero latency),
+                            i.e. the orchestration overhead of crewai plus this repo
+  * format_docx:            utils.format_resume_with_markers
+
+Every stage runs in a fresh interpreter, so its peak RSS is its own. Per stage, the report has
+ops/sec, p50/p95 latency per operation and peak RSS. The results can be stored as a baseline
+and later runs compared against it. A stage counts as a regression when it is more than
+--tolerance slower (ops/sec or p95) or uses that much more memory.
+
+Usage:
+    python benchmarks/pipeline_benchmark.py [--iterations 5] [--stages parse_pdf,format_docx] [--json]
+    python benchmarks/pipeline_benchmark.py --update-baseline      # store results as the new baseline
+    python benchmarks/pipeline_benchmark.py --compare [--tolerance 0.2]  # exit code 1 on regression
+"""
+import os
+import sys
+import json
+import time
+import random
+import zipfile
+import argparse
+import statistics
+import subprocess
+import tempfile
+from xml.sax.saxutils import escape
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pipeline_baseline.json")
+CORPUS_PAGES = (1, 2, 5, 10)
+LINES_PER_PAGE = 48
+CORPUS_SEED = 1234 # Fixed: the corpus must be identical between runs for results to be comparable
+STAGES = ("parse_pdf", "parse_docx", "clean_extract", "crew_kickoff", "format_docx")
+DEFAULT_TOLERANCE = 0.2
+
+# --- Synthetic Corpus ---
+_SKILLS = ("Python", "SQL", "Kubernetes", "Terraform", "React", "Go", "Spark", "Airflow", "AWS", "Docker")
+_VERBS = ("Built", "Led", "Designed", "Migrated", "Automated", "Optimized", "Shipped", "Mentored")
+_OBJECTS = ("data pipelines", "a billing service", "CI/CD workflows", "the search backend",
+            "observability dashboards", "an internal API platform", "ML feature stores")
+
+
+def _resume_lines(pages, rng):
+    """A plain-text resume of roughly `pages` pages (header, experience, projects, skills)."""
+    lines = ["Jordan Example", "jordan@example.com | +1 555 0100 | github.com/jordan"]
+    target = pages * LINES_PER_PAGE
+    lines.append("EXPERIENCE")
+    company = 0
+    while len(lines) < target - 8:
+        company += 1
+        lines.append(f"Company {company} Inc - Senior Engineer")
+        lines.append(f"Jan {2000 + company % 20} - Dec {2001 + company % 20}")
+        for _ in range(rng.randint(3, 6)):
+            lines.append(f"- {rng.choice(_VERBS)} {rng.choice(_OBJECTS)} with {rng.choice(_SKILLS)}, "
+                         f"cutting latency by {rng.randint(10, 70)}%")
+    lines += ["PROJECTS", "Open Source Widget", f"- {rng.choice(_VERBS)} {rng.choice(_OBJECTS)}"]
+    lines += ["SKILLS", ", ".join(_SKILLS)]
+    return lines
+
+
+def _job_description(rng):
+    skills = rng.sample(_SKILLS, 4)
+    return (f"We are hiring a Senior Engineer. Requirements: {', '.join(skills)}. "
+            f"You will own {rng.choice(_OBJECTS)} and {rng.choice(_OBJECTS)}.")
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(lines, path):
+    """Writes a minimal text PDF (Helvetica, LINES_PER_PAGE lines per page) without extra dependencies."""
+    page_chunks = [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)]
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_refs = []
+    for chunk in page_chunks:
+        stream = "BT /F1 10 Tf 50 760 Td 15 TL " + " ".join(f"({_pdf_escape(line)}) Tj T*" for line in chunk) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        page_refs.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {len(page_refs)} >>"
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref_at = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    output += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(output)
+
+
+_DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+_DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/></Relationships>'
+)
+
+
+def write_docx(lines, path):
+    """Writes a minimal DOCX (one paragraph per line) with fixed timestamps, without extra dependencies."""
+    paragraphs = "".join(f'<w:p><w:r><w:t xml:space="preserve">{escape(line)}</w:t></w:r></w:p>' for line in lines)
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f'<w:body>{paragraphs}</w:body></w:document>'
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in (("[Content_Types].xml", _DOCX_CONTENT_TYPES), ("_rels/.rels", _DOCX_RELS),
+                              ("word/document.xml", document)):
+            archive.writestr(zipfile.ZipInfo(name, date_time=(2020, 1, 1, 0, 0, 0)), content)
+
+
+def build_corpus(directory):
+    """
+    Writes the synthetic corpus to `directory`.
+
+    Returns:
+        dict: pdf/docx file lists, job descriptions, raw agent outputs and marked resume texts.
+    """
+    sys.path.insert(0, REPO_ROOT)
+    import resume_sections # Light module: marks the plain text the way the modifier agent would
+
+    rng = random.Random(CORPUS_SEED)
+    corpus = {"pdf": [], "docx": [], "job_descriptions": [], "raw_outputs": [], "marked": []}
+    for pages in CORPUS_PAGES:
+        lines = _resume_lines(pages, rng)
+        for extension, writer in (("pdf", write_pdf), ("docx", write_docx)):
+            path = os.path.join(directory, f"resume_{pages:02d}p.{extension}")
+            writer(lines, path)
+            corpus[extension].append(path)
+        marked = resume_sections.join_sections(
+            resume_sections.mark_plain_section(section)
+            for section in resume_sections.split_plain_sections("\n".join(lines))
+        )
+        corpus["marked"].append(marked)
+        corpus["job_descriptions"].append(_job_description(rng))
+        corpus["raw_outputs"].append(
+            "Thought: I now can give a great answer\n"
+            f"=== MODIFIED RESUME START ===\n{marked}\n=== MODIFIED RESUME END ==="
+        )
+    with open(os.path.join(directory, "corpus.json"), "w", encoding="utf-8") as f:
+        json.dump(corpus, f)
+    return corpus
+
+
+# --- Stage Runner (child process) ---
+def _stage_operations(stage, corpus, workdir):
+    """Returns the list of zero-argument callables that make up one iteration of `stage`."""
+    import utils
+    import job_application_agent as agent
+
+    if stage in ("parse_pdf", "parse_docx"):
+        paths = corpus["pdf" if stage == "parse_pdf" else "docx"]
+        return [lambda path=path: _check(utils.parse_resume(path), stage) for path in paths]
+    if stage == "clean_extract":
+        return [
+            lambda raw=raw: _check(agent.extract_content(
+                agent.clean_raw_output(raw), agent.MODIFICATION_START_MARKER, agent.MODIFICATION_END_MARKER), stage)
+            for raw in corpus["raw_outputs"]
+        ]
+    if stage == "crew_kickoff":
+        pairs = zip(corpus["marked"], corpus["job_descriptions"])
+        return [
+            lambda resume=resume, jd=jd: _check(agent._kickoff_crew([agent.create_analysis_task(resume, jd)], "Benchmark"), stage)
+            for resume, jd in pairs
+        ]
+    if stage == "format_docx":
+        target = os.path.join(workdir, "formatted.docx")
+        return [lambda marked=marked: _check(utils.format_resume_with_markers(marked, filename=target), stage)
+                for marked in corpus["marked"]]
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def _check(result, stage):
+    if not result:
+        raise RuntimeError(f"{stage} returned no result")
+    return result
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB (None where the resource module is unavailable)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024 # bytes on macOS, KB on Linux
+
+
+def _run_stage_in_process(stage, corpus_dir, iterations, result_file):
+    """
+    Child entry point: runs one stage and writes its raw samples as JSON to `result_file` (not to
+    stdout, which verbose crews keep printing to).
+    """
+    import logging
+    sys.path.insert(0, REPO_ROOT)
+    logging.disable(logging.CRITICAL) # Per-call INFO logging would dominate the timings
+    with open(os.path.join(corpus_dir, "corpus.json"), encoding="utf-8") as f:
+        corpus = json.load(f)
+    operations = _stage_operations(stage, corpus, corpus_dir)
+    for operation in operations: # Warm-up pass: deferred imports and first-use setup are not measured
+        operation()
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for operation in operations:
+            op_started = time.perf_counter()
+            operation()
+            samples.append(time.perf_counter() - op_started)
+    total = time.perf_counter() - started
+    with open(result_file, "w", encoding="utf-8") as f:
+        json.dump({"samples": samples, "total": total, "peak_rss_mb": _peak_rss_mb()}, f)
+
+
+# --- Parent ---
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _summarize(raw):
+    samples = raw["samples"]
+    return {
+        "ops": len(samples),
+        "ops_per_sec": len(samples) / raw["total"] if raw["total"] else None,
+        "p50_ms": statistics.median(samples) * 1000,
+        "p95_ms": _percentile(samples, 0.95) * 1000,
+        "peak_rss_mb": raw["peak_rss_mb"],
+    }
+
+
+def _child_env(workdir):
+    env = dict(os.environ)
+    env.update({
+        "JOB_APP_LLM_BACKEND": "fake", # crew_kickoff measures orchestration, not a model
+        "JOB_APP_FAKE_LATENCY": "0",
+        "JOB_APP_FAKE_TOKENS_PER_SEC": "0",
+        "JOB_APP_FAKE_FAILURE_RATE": "0",
+        "JOB_APP_FAKE_MALFORMED_RATE": "0",
+        "JOB_APP_DISABLE_CACHE": "1",
+        "JOB_APP_DISABLE_PARSE_CACHE": "1", # parse_* measure extraction, not parsed-resume cache hits
+        "JOB_APP_DISABLE_TELEMETRY": "1",
+        "JOB_APP_DISABLE_RATE_LIMIT": "1", # The NIM request budget would throttle the fake backend
+        "JOB_APP_CACHE_DIR": os.path.join(workdir, "cache"),
+    })
+    return env
+
+
+def run_benchmark(iterations=5, stages=STAGES):
+    """
+    Builds the corpus and runs each stage in a fresh interpreter.
+
+    Returns:
+        dict: Per-stage results (ops, ops_per_sec, p50_ms, p95_ms, peak_rss_mb) or an error.
+    """
+    results = {"iterations": iterations, "python": sys.version.split()[0], "corpus_pages": list(CORPUS_PAGES), "stages": {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        build_corpus(workdir)
+        for stage in stages:
+            result_file = os.path.join(workdir, f"{stage}.result.json")
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run-stage", stage, "--corpus-dir", workdir,
+                 "--iterations", str(iterations), "--result-file", result_file],
+                cwd=workdir, env=_child_env(workdir), capture_output=True, text=True, timeout=1800
+            )
+            if completed.returncode != 0:
+                error = (completed.stderr.strip().splitlines() or ["unknown error"])[-1]
+                results["stages"][stage] = {"error": error}
+                continue
+            try:
+                with open(result_file, encoding="utf-8") as f:
+                    results["stages"][stage] = _summarize(json.load(f))
+            except (OSError, ValueError, KeyError) as e:
+                results["stages"][stage] = {"error": f"Unreadable stage result: {e}"}
+    return results
+
+
+def compare_with_baseline(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compares stage results against a stored baseline.
+
+    Returns:
+        list: (stage, metric, baseline value, current value) for every regression beyond `tolerance`.
+    """
+    regressions = []
+    for stage, current in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous or "error" in previous or "error" in current:
+            continue
+        if previous.get("ops_per_sec") and current["ops_per_sec"] < previous["ops_per_sec"] * (1 - tolerance):
+            regressions.append((stage, "ops_per_sec", previous["ops_per_sec"], current["ops_per_sec"]))
+        for metric in ("p95_ms", "peak_rss_mb"):
+            if previous.get(metric) and current.get(metric) and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append((stage, metric, previous[metric], current[metric]))
+    return regressions
+
+
+def _print_report(results, regressions=None):
+    print(f"--- Pipeline benchmark ({results['iterations']} iterations, Python {results['python']}) ---")
+    print(f"  {'stage':<14} {'ops/sec':>10} {'p50 ms':>10} {'p95 ms':>10} {'peak RSS MB':>12}")
+    for stage, stats in results["stages"].items():
+        if "error" in stats:
+            print(f"  {stage:<14} failed: {stats['error']}")
+            continue
+        rss = f"{stats['peak_rss_mb']:.1f}" if stats["peak_rss_mb"] is not None else "n/a"
+        print(f"  {stage:<14} {stats['ops_per_sec']:>10.1f} {stats['p50_ms']:>10.2f} {stats['p95_ms']:>10.2f} {rss:>12}")
+    if regressions is not None:
+        if not regressions:
+            print("  No regressions against the baseline.")
+        for stage, metric, previous, current in regressions:
+            print(f"  REGRESSION {stage} {metric}: {previous:.2f} -> {current:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parsing, output extraction, crew orchestration and DOCX rendering.")
+    parser.add_argument("--iterations", type=int, default=5, help="Measured passes over the corpus per stage.")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of: {', '.join(STAGES)}.")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON instead of a report.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_FILE, help="Baseline results file.")
+    parser.add_argument("--compare", action="store_true", help="Compare against the baseline; exit code 1 on regression.")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed slowdown before a regression is reported (0.2 = 20%%).")
+    parser.add_argument("--run-stage", help=argparse.SUPPRESS)
+    parser.add_argument("--corpus-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        _run_stage_in_process(args.run_stage, args.corpus_dir, max(1, args.iterations), args.result_file)
+        sys.exit(0)
+
+    selected = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = [stage for stage in selected if stage not in STAGES]
+    if unknown:
+        parser.error(f"Unknown stage(s): {', '.join(unknown)}")
+    if args.compare and not os.path.exists(args.baseline):
+        # Checked before the (slow) run, so a missing baseline never passes as "no regressions"
+        parser.error(f"No baseline at {args.baseline}; create one with --update-baseline.")
+    benchmark_results = run_benchmark(iterations=max(1, args.iterations), stages=selected)
+
+    found_regressions = None
+    if args.compare:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline_results = json.load(f)
+        found_regressions = compare_with_baseline(benchmark_results, baseline_results, args.tolerance)
+        unbaselined = [stage for stage in benchmark_results["stages"] if stage not in baseline_results.get("stages", {})]
+        if unbaselined:
+            print(f"Note: no baseline for stage(s) {', '.join(unbaselined)}; they are not compared.", file=sys.stderr)
+        benchmark_results["regressions"] = [
+            {"stage": stage, "metric": metric, "baseline": previous, "current": current}
+            for stage, metric, previous, current in found_regressions
+        ]
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(benchmark_results, f, indent=2)
+
+    if args.json:
+        print(json.dumps(benchmark_results, indent=2))
+    else:
+        _print_report(benchmark_results, found_regressions)
+    sys.exit(1 if found_regressions else 0)
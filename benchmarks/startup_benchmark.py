@@ -0,0 +1,127 @@
+"""
+Startup-time benchmark for the Job Application Helper.
+
+Reports, as the median over several fresh interpreter runs:
+  * cold import time of `main` (and of the modules it pulls in), and
+  * time-to-window: interpreter start until the main Tk window has been drawn.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--runs 5] [--json]
+
+Time-to-window needs a display; without one it is reported as unavailable.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each probe runs in a fresh interpreter so module caches never hide import cost.
+# The child prints a single JSON line; `_t0` is taken before anything else is imported.
+IMPORT_PROBE = """
+import time; _t0 = time.perf_counter()
+import sys, json
+sys.path.insert(0, {repo!r})
+timings = {{}}
+for name in ("config", "utils", "job_application_agent", "main"):
+    started = time.perf_counter()
+    __import__(name)
+    timings[name] = time.perf_counter() - started
+timings["total"] = time.perf_counter() - _t0
+timings["heavy_modules_loaded"] = sorted(m for m in ("crewai", "langchain_nvidia_ai_endpoints", "litellm", "docx", "pypdf") if m in sys.modules)
+print(json.dumps(timings))
+"""
+
+WINDOW_PROBE = """
+import time; _t0 = time.perf_counter()
+import sys, json
+sys.path.insert(0, {repo!r})
+import tkinter as tk
+import main
+root = tk.Tk()
+main.JobAppHelperGUI.start_agent_warm_up = lambda self: None # Measure the window, not the warm-up
+app = main.JobAppHelperGUI(root)
+root.update() # Process pending draw events so the window is actually on screen
+elapsed = time.perf_counter() - _t0
+root.destroy()
+print(json.dumps({{"time_to_window": elapsed}}))
+"""
+
+
+def _run_probe(source, workdir):
+    """Runs a probe script in a fresh interpreter and returns its decoded JSON line (None on failure)."""
+    env = dict(os.environ)
+    env.setdefault("NVIDIA_NIM_API_KEY", "benchmark-placeholder-key") # Only presence is checked at startup
+    completed = subprocess.run(
+        [sys.executable, "-c", source.format(repo=REPO_ROOT)],
+        cwd=workdir, env=env, capture_output=True, text=True, timeout=120
+    )
+    if completed.returncode != 0:
+        return None, completed.stderr.strip().splitlines()[-1:] or ["unknown error"]
+    return json.loads(completed.stdout.strip().splitlines()[-1]), None
+
+
+def run_benchmark(runs=5):
+    """
+    Runs the import and window probes `runs` times each.
+
+    Returns:
+        dict: Median timings in seconds plus diagnostic fields.
+    """
+    results = {"runs": runs, "python": sys.version.split()[0]}
+    # Run from a scratch directory so main.py's log file does not land in the repo
+    with tempfile.TemporaryDirectory() as workdir:
+        import_samples = []
+        for _ in range(runs):
+            sample, error = _run_probe(IMPORT_PROBE, workdir)
+            if sample is None:
+                results["import_error"] = error[0]
+                break
+            import_samples.append(sample)
+        if import_samples:
+            results["cold_import"] = {
+                name: statistics.median(sample[name] for sample in import_samples)
+                for name in ("config", "utils", "job_application_agent", "main", "total")
+            }
+            results["heavy_modules_loaded_at_import"] = import_samples[-1]["heavy_modules_loaded"]
+
+        window_samples = []
+        for _ in range(runs):
+            sample, error = _run_probe(WINDOW_PROBE, workdir)
+            if sample is None:
+                results["time_to_window_error"] = error[0]
+                break
+            window_samples.append(sample["time_to_window"])
+        results["time_to_window"] = statistics.median(window_samples) if window_samples else None
+    return results
+
+
+def _print_report(results):
+    print(f"--- Startup benchmark ({results['runs']} runs, Python {results['python']}) ---")
+    if "cold_import" in results:
+        for name, seconds in results["cold_import"].items():
+            print(f"  import {name:<24} {seconds * 1000:8.1f} ms")
+        heavy = results["heavy_modules_loaded_at_import"]
+        print(f"  heavy modules loaded at import: {', '.join(heavy) if heavy else 'none'}")
+    else:
+        print(f"  cold import failed: {results.get('import_error')}")
+    if results["time_to_window"] is not None:
+        print(f"  time to window                 {results['time_to_window'] * 1000:8.1f} ms")
+    else:
+        print(f"  time to window: unavailable ({results.get('time_to_window_error')})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold import time and time-to-window.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreter runs per measurement (median is reported).")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON instead of a report.")
+    args = parser.parse_args()
+    benchmark_results = run_benchmark(runs=max(1, args.runs))
+    if args.json:
+        print(json.dumps(benchmark_results, indent=2))
+    else:
+        _print_report(benchmark_results)
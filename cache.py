@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+DEFAULT_MEMORY_ENTRIES = 128
+DEFAULT_DISK_MAX_BYTES = 50 * 1024 * 1024 # 50 MB per namespace
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60 # One week
+
+
+def make_cache_key(*parts):
+    """
+    Builds a content-addressed key (sha256 hex digest) from the given parts.
+    Parts must be JSON serializable; dict keys are sorted so the key is stable.
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TieredCache:
+    """
+    Two-tier key/value cache: an in-memory LRU in front of a JSON-file store on disk.
+
+    Values must be JSON serializable. Disk entries expire after `ttl_seconds` and the
+    oldest entries are evicted once the namespace directory exceeds `max_disk_bytes`.
+    Safe to use from multiple threads.
+    """
+
+    def __init__(self, namespace, cache_dir=None, max_memory_entries=DEFAULT_MEMORY_ENTRIES,
+                 max_disk_bytes=DEFAULT_DISK_MAX_BYTES, ttl_seconds=DEFAULT_TTL_SECONDS, enabled=True):
+        self.namespace = namespace
+        self.directory = os.path.join(cache_dir or os.getenv("JOB_APP_CACHE_DIR", DEFAULT_CACHE_DIR), namespace)
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._memory = OrderedDict() # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    # --- Public API ---
+    def get(self, key):
+        """Returns the cached value for `key`, or None on a miss (or expired entry)."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if self._is_fresh(stored_at, now):
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+        value, stored_at = self._read_disk(key, now)
+        with self._lock:
+            if value is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+            self._remember(key, stored_at, value)
+        return value
+
+    def put(self, key, value):
+        """Stores `value` under `key` in both tiers."""
+        if not self.enabled:
+            return
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, stored_at, value)
+            self._stats["writes"] += 1
+        self._write_disk(key, stored_at, value)
+
+    def invalidate(self, key):
+        """Removes `key` from both tiers (no-op if absent)."""
+        with self._lock:
+            self._memory.pop(key, None)
+        try:
+            os.remove(self._path_for(key))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log.warning(f"Could not remove cache entry {key[:12]} ({self.namespace}): {e}")
+
+    def clear(self):
+        """Empties both tiers for this namespace."""
+        with self._lock:
+            self._memory.clear()
+        for path, _, _ in self._disk_entries():
+            try:
+                os.remove(path)
+            except OSError as e:
+                log.warning(f"Could not remove cache file {path}: {e}")
+
+    def stats(self):
+        """Returns a snapshot of hit/miss counters plus the current tier sizes."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["memory_entries"] = len(self._memory)
+        lookups = snapshot["memory_hits"] + snapshot["disk_hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = ((snapshot["memory_hits"] + snapshot["disk_hits"]) / lookups) if lookups else 0.0
+        return snapshot
+
+    # --- Internal Helpers ---
+    def _is_fresh(self, stored_at, now):
+        return not self.ttl_seconds or (now - stored_at) <= self.ttl_seconds
+
+    def _remember(self, key, stored_at, value):
+        # Caller holds the lock
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _path_for(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read_disk(self, key, now):
+        path = self._path_for(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            return None, None
+        except (OSError, ValueError) as e:
+            log.warning(f"Discarding unreadable cache entry {path}: {e}")
+            self.invalidate(key)
+            return None, None
+
+        stored_at = record.get("stored_at", 0)
+        if not self._is_fresh(stored_at, now):
+            log.debug(f"Cache entry {key[:12]} ({self.namespace}) expired.")
+            self.invalidate(key)
+            return None, None
+        return record.get("value"), stored_at
+
+    def _write_disk(self, key, stored_at, value):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path_for(key)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"stored_at": stored_at, "value": value}, f, ensure_ascii=False)
+            os.replace(tmp_path, path) # Atomic so concurrent readers never see partial files
+        except (OSError, TypeError, ValueError) as e:
+            log.warning(f"Could not write cache entry {key[:12]} ({self.namespace}): {e}")
+            return
+        self._enforce_disk_limits()
+
+    def _disk_entries(self):
+        """Yields (path, size, mtime) for every entry file in the namespace directory."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            yield path, st.st_size, st.st_mtime
+
+    def _enforce_disk_limits(self):
+        """Drops expired entries, then the oldest ones until the namespace fits in max_disk_bytes."""
+        now = time.time()
+        entries = []
+        total = 0
+        for path, size, mtime in self._disk_entries():
+            if self.ttl_seconds and (now - mtime) > self.ttl_seconds:
+                self._evict_file(path)
+                continue
+            entries.append((mtime, size, path))
+            total += size
+        if not self.max_disk_bytes or total <= self.max_disk_bytes:
+            return
+        entries.sort() # Oldest first
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            self._evict_file(path)
+            total -= size
+
+    def _evict_file(self, path):
+        key = os.path.splitext(os.path.basename(path))[0]
+        with self._lock:
+            self._memory.pop(key, None)
+            self._stats["evictions"] += 1
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    # Example usage when running this script directly
+    import tempfile
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    print("--- Testing TieredCache ---")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = TieredCache("demo", cache_dir=tmp_dir, max_memory_entries=2)
+        key = make_cache_key("analysis", "resume text", "job description")
+        print("Miss:", cache.get(key))
+        cache.put(key, ["analysis", "modified"])
+        print("Memory hit:", cache.get(key))
+        fresh = TieredCache("demo", cache_dir=tmp_dir) # New process simulation: empty memory tier
+        print("Disk hit:", fresh.get(key))
+        print("Stats:", fresh.stats())
+    print("--- Test Finished ---")
@@ -0,0 +1,277 @@
+import re
+import time
+import logging
+import threading
+import resume_diff
+import resume_model
+from resume_sections import MARKER_PATTERN, BULLET_PATTERN
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+CHARS_PER_TOKEN = 4 # Rough estimate; budgets only need to be stable, not exact
+DEFAULT_CONTEXT_TOKENS = 2400 # Upper bound of the chat context sent with every turn
+DEFAULT_RECENT_TURNS = 4 # Turns kept verbatim; older ones are folded into the rolling summary
+RESUME_DIGEST_TOKENS = 400
+RESUME_DIGEST_BULLET_WORDS = 14 # Bullets are cut to their first words in the resume digest
+JOB_DESCRIPTION_DIGEST_TOKENS = 350
+ANALYSIS_DIGEST_TOKENS = 350
+CHANGES_DIGEST_TOKENS = 500
+MAX_TURN_TOKENS = 250 # A single verbatim turn (user + agent) is cut to this size
+SUMMARY_TOKENS = 250
+MODIFIED_START = "=== MODIFIED RESUME START ==="
+MODIFIED_END = "=== MODIFIED RESUME END ==="
+MAIN_MARKER_PATTERN = re.compile(r"^=== [A-Z ]+ ===$") # ANALYSIS/MODIFIED RESUME/ESSAY START/END lines
+
+
+def estimate_tokens(text):
+    return len(text or "") // CHARS_PER_TOKEN
+
+
+def _truncate(text, max_tokens):
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    text = (text or "").strip()
+    return text if len(text) <= max_chars else text[:max_chars - 3].rstrip() + "..."
+
+
+def digest_text(text, max_tokens):
+    """
+    Compacts a document for the chat context: strips formatting and block markers, collapses
+    whitespace, drops blank and repeated lines, and keeps whole lines up to `max_tokens`.
+
+    Args:
+        text (str): Document text (plain or marked).
+        max_tokens (int): Size budget of the digest.
+
+    Returns:
+        str: The digest (possibly with a "[... N more lines]" note).
+    """
+    seen = set()
+    lines = []
+    for line in (text or "").splitlines():
+        match = MARKER_PATTERN.match(line)
+        line = " ".join((match.group(2) if match else line).split())
+        if not line or MAIN_MARKER_PATTERN.match(line) or line.lower() in seen:
+            continue
+        seen.add(line.lower())
+        lines.append(line)
+    kept, used = [], 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            if max_tokens - used > 20: # Worth keeping the start of a long line (e.g. a one-paragraph JD)
+                kept.append(_truncate(line, max_tokens - used - 1))
+            break
+        kept.append(line)
+        used += cost
+    if len(kept) < len(lines) or (kept and kept[-1] != lines[len(kept) - 1]):
+        kept.append(f"[... {len(lines) - len(kept)} more lines]" if len(kept) < len(lines) else "[... truncated]")
+    return "\n".join(kept)
+
+
+def summarize_turns_locally(previous_summary, turns):
+    """Fallback summarizer: keeps the first sentence of every question and answer."""
+    def first_sentence(text):
+        return re.split(r"(?<=[.!?])\s", " ".join(text.split()), maxsplit=1)[0]
+    parts = [previous_summary] if previous_summary else []
+    parts += [f"User asked: {first_sentence(user)} Agent: {first_sentence(agent)}" for user, agent in turns]
+    summary = " ".join(parts)
+    max_chars = SUMMARY_TOKENS * CHARS_PER_TOKEN
+    # Over budget: drop the oldest part, the latest turns matter most for follow-up questions
+    return summary if len(summary) <= max_chars else "..." + summary[-(max_chars - 3):].lstrip()
+
+
+class ChatSession:
+    """
+    Token-budgeted context for one chat window. Holds pinned digests of the current resume, the
+    job description, the analysis and the resume changes, the last `recent_turns` turns verbatim, and a rolling summary
+    of older turns that `summarizer` refreshes on a background thread. context() therefore
+    stays about the same size however long the conversation gets.
+    """
+
+    def __init__(self, original_resume, job_description, analysis, modified_resume,
+                 summarizer=None, recent_turns=DEFAULT_RECENT_TURNS, max_context_tokens=DEFAULT_CONTEXT_TOKENS):
+        self.summarizer = summarizer or summarize_turns_locally
+        self.recent_turns = max(1, recent_turns)
+        self.max_context_tokens = max_context_tokens
+        self._lock = threading.Lock()
+        self._documents = {}
+        self._digests = {}
+        self._turns = [] # (user, agent) kept verbatim
+        self._unsummarized = [] # Older turns waiting for the background summarizer
+        self._in_flight = [] # Turns the summarizer is folding in right now (not in _summary yet)
+        self._summary = ""
+        self._summarizing = False
+        self.update_documents(original_resume, job_description, analysis, modified_resume)
+
+    # --- Documents ---
+    def update_documents(self, original_resume=None, job_description=None, analysis=None, modified_resume=None):
+        """Refreshes the pinned digests of the documents that changed (None keeps the current one)."""
+        updates = {"original_resume": original_resume, "job_description": job_description,
+                   "analysis": analysis, "modified_resume": modified_resume}
+        with self._lock:
+            changed = {name for name, value in updates.items() if value is not None and value != self._documents.get(name)}
+            if not changed:
+                return
+            for name in changed:
+                self._documents[name] = updates[name]
+            documents = dict(self._documents)
+        digests = {}
+        if "job_description" in changed:
+            digests["job_description"] = digest_text(documents.get("job_description"), JOB_DESCRIPTION_DIGEST_TOKENS)
+        if "analysis" in changed:
+            digests["analysis"] = digest_text(documents.get("analysis"), ANALYSIS_DIGEST_TOKENS)
+        if changed & {"original_resume", "modified_resume"}:
+            digests["resume"] = self._resume_digest(documents)
+        if changed & {"original_resume", "modified_resume", "job_description"}:
+            digests["changes"] = self._changes_digest(documents)
+        with self._lock:
+            self._digests.update(digests)
+        log.debug(f"Chat session digests refreshed: {sorted(digests)}")
+
+    @staticmethod
+    def _modified_block(documents):
+        modified = documents.get("modified_resume") or ""
+        if MODIFIED_START in modified and MODIFIED_END in modified:
+            return modified.split(MODIFIED_START, 1)[1].split(MODIFIED_END, 1)[0].strip()
+        return modified
+
+    @classmethod
+    def _resume_digest(cls, documents):
+        """
+        Compact outline of the current resume (the modified one if it is a marked resume, else the
+        original): one line per header, heading and entry, and bullets cut to their first words.
+        Keeps unchanged resume content answerable once the turns about it have been summarized.
+        """
+        block = cls._modified_block(documents)
+        if resume_model.is_marked(block):
+            model = resume_model.parse(block, marked=True)
+        else:
+            model = resume_model.parse(documents.get("original_resume") or "", marked=False)
+        lines = [" | ".join(text for _, text in model.header.lines)]
+        for section in model.sections:
+            lines.append(f"{section.heading}:")
+            lines += [text for _, text in section.body]
+            for entry in section.entries:
+                lines.append(" | ".join(entry.details))
+                for bullet in entry.bullets:
+                    words = BULLET_PATTERN.sub("", bullet, count=1).split()
+                    short = " ".join(words[:RESUME_DIGEST_BULLET_WORDS])
+                    lines.append(f"- {short}..." if len(words) > RESUME_DIGEST_BULLET_WORDS else f"- {short}")
+        return digest_text("\n".join(lines), RESUME_DIGEST_TOKENS)
+
+    @classmethod
+    def _changes_digest(cls, documents):
+        modified = documents.get("modified_resume") or ""
+        block = cls._modified_block(documents)
+        diff = resume_diff.diff_resumes(documents.get("original_resume") or "", block, documents.get("job_description"))
+        if diff is not None:
+            return digest_text(diff.to_prompt_text(), CHANGES_DIGEST_TOKENS)
+        # No marked modification to diff: fall back to a digest of whatever resume text there is
+        return digest_text(modified or documents.get("original_resume"), CHANGES_DIGEST_TOKENS)
+
+    # --- Turns ---
+    def add_turn(self, user_message, agent_reply):
+        """Records a finished turn; turns beyond `recent_turns` are summarized in the background."""
+        turn = (_truncate(user_message, MAX_TURN_TOKENS // 2), _truncate(agent_reply, MAX_TURN_TOKENS))
+        with self._lock:
+            self._turns.append(turn)
+            while len(self._turns) > self.recent_turns:
+                self._unsummarized.append(self._turns.pop(0))
+            start_summarizer = bool(self._unsummarized) and not self._summarizing
+            if start_summarizer:
+                self._summarizing = True
+        if start_summarizer:
+            threading.Thread(target=self._summarize_pending, name="chat-summarizer", daemon=True).start()
+
+    def _summarize_pending(self):
+        while True:
+            with self._lock:
+                pending, self._unsummarized = self._unsummarized, []
+                self._in_flight = pending
+                previous = self._summary
+                if not pending:
+                    self._summarizing = False
+                    return
+            try:
+                summary = self.summarizer(previous, pending)
+            except Exception as e:
+                log.warning(f"Chat summarizer failed, using the local summary: {e}")
+                summary = None
+            summary = _truncate(summary or summarize_turns_locally(previous, pending), SUMMARY_TOKENS)
+            with self._lock:
+                self._summary = summary
+                self._in_flight = []
+            log.info(f"Folded {len(pending)} chat turn(s) into the rolling summary.")
+
+    def wait_for_summary(self, timeout=None):
+        """Blocks until background summarization is idle (used by the demo below). Returns True if idle."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self._summarizing:
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+
+    # --- Context ---
+    def context(self):
+        """
+        Returns the chat context for the next prompt: pinned digests, the rolling summary and the
+        recent turns, kept within `max_context_tokens` (oldest recent turns are folded first).
+        """
+        with self._lock:
+            digests = dict(self._digests)
+            turns = list(self._turns)
+            summary = self._summary
+            waiting = self._in_flight + self._unsummarized
+            if waiting: # Not in the summary yet: include a cheap local version meanwhile
+                summary = summarize_turns_locally(summary, waiting)
+
+        pinned = []
+        for title, name in (("Resume (digest)", "resume"), ("Job description (digest)", "job_description"), ("Analysis (digest)", "analysis"),
+                            ("Changes made to the resume (original -> modified)", "changes")):
+            if digests.get(name):
+                pinned.append(f"{title}:\n{digests[name]}")
+
+        def render(summary_text, recent):
+            parts = list(pinned)
+            if summary_text:
+                parts.append(f"Earlier in this conversation (summary):\n{summary_text}")
+            if recent:
+                parts.append("Recent conversation:\n" + "\n".join(f"User: {user}\nAgent: {agent}" for user, agent in recent))
+            return "\n\n".join(parts)
+
+        text = render(summary, turns)
+        while turns and estimate_tokens(text) > self.max_context_tokens:
+            summary = summarize_turns_locally(summary, [turns.pop(0)])
+            text = render(summary, turns)
+        return text
+
+    def stats(self):
+        """Turn counts and the current context size in (estimated) tokens."""
+        with self._lock:
+            counts = {"recent_turns": len(self._turns), "pending_summary_turns": len(self._in_flight) + len(self._unsummarized),
+                      "has_summary": bool(self._summary)}
+        counts["context_tokens"] = estimate_tokens(self.context())
+        return counts
+
+
+if __name__ == "__main__":
+    # Example usage when running this script directly
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    print("--- Testing chat session context ---")
+    original = "Jane Doe\njane@example.com\nEXPERIENCE\nAcme Corp - Engineer\n- Built data pipelines\nSKILLS\nPython, SQL"
+    modified = ("=== MODIFIED RESUME START ===\n@@NAME@@ Jane Doe\n@@CONTACT@@ jane@example.com\n@@HEADING@@ EXPERIENCE\n"
+                "@@SUBHEAD_COMP@@ Acme Corp - Engineer\n@@BULLET@@ - Built Python data pipelines on Kubernetes\n"
+                "@@HEADING@@ SKILLS\n@@NORMAL@@ Python, SQL, Kubernetes\n=== MODIFIED RESUME END ===")
+    session = ChatSession(original, "Python engineer. Kubernetes a plus. " * 40, "Strong Python. Missing Kubernetes.", modified)
+    for turn in range(12):
+        session.add_turn(f"Question {turn}: why did you mention Kubernetes in the Acme bullet? " * 3,
+                         f"Answer {turn}: because the job description asks for it. " * 10)
+        session.wait_for_summary(timeout=5)
+        print(f"Turn {turn + 1:2d}: {session.stats()}")
+    print(session.context())
+    print("--- Test Finished ---")
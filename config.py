@@ -56,6 +56,27 @@ def load_api_key():
     log.info(f"{key_variable_name} loaded successfully from environment.")
     return api_key
 
+def get_env_number(name, default, cast=float):
+    """
+    Reads a numeric setting from the environment.
+
+    Args:
+        name (str): Environment variable name.
+        default: Value used if the variable is unset or invalid.
+        cast (type): int or float.
+
+    Returns:
+        The parsed value, or `default`.
+    """
+    value = os.getenv(name, "").strip()
+    if not value:
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        log.warning(f"Ignoring invalid value for {name}: {value!r} (using {default}).")
+        return default
+
 if __name__ == "__main__":
     # Example usage when running this script directly
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
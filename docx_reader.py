@@ -0,0 +1,159 @@
+import logging
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+MC_NS = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+DOCUMENT_PART = "word/document.xml"
+DOCUMENT_RELS_PART = "word/_rels/document.xml.rels"
+HEADER_REL_TYPE = "/header"
+CELL_SEPARATOR = " | " # Joins the cells of a one-line-per-cell row (e.g. "Languages | Python, Go")
+
+# Run content that maps to text (as python-docx's paragraph.text does)
+_TEXT = W_NS + "t"
+_CHARACTERS = {W_NS + "tab": "\t", W_NS + "br": "\n", W_NS + "cr": "\n", W_NS + "noBreakHyphen": "-"}
+_PARAGRAPH = W_NS + "p"
+_ROW = W_NS + "tr"
+_CELL = W_NS + "tc"
+_FALLBACK = MC_NS + "Fallback" # Legacy VML copy of a text box already read from mc:Choice
+
+
+def _iter_part_lines(source, keep_empty=True):
+    """
+    Streams one WordprocessingML part (document body or header) and yields its text lines in
+    reading order: one per paragraph, text box paragraphs before the paragraph they are anchored
+    in, and table rows after their cells are complete. Each element is detached from its parent
+    once it has been read, so the tree iterparse builds only ever holds the open elements and
+    memory stays flat however large the part is.
+
+    Args:
+        source: A file object (or path) holding the part's XML.
+        keep_empty (bool): Yield "" for empty body paragraphs (blank lines, as python-docx does).
+    """
+    paragraphs = [] # Text buffers of the open (possibly nested) paragraphs
+    sinks = [[]] # Where finished lines go: the output, or the cell being read
+    rows = [] # Cell line lists of the open table rows
+    skip_depth = 0
+    open_elements = [] # The current element's ancestors (each holds at most one finished child)
+    for event, element in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            open_elements.append(element)
+        else:
+            open_elements.pop()
+            if open_elements:
+                open_elements[-1].remove(element) # Its text is read below, from the detached element
+        tag = element.tag
+        if tag == _FALLBACK:
+            skip_depth += 1 if event == "start" else -1
+            continue
+        if skip_depth:
+            continue
+        if event == "start":
+            if tag == _PARAGRAPH:
+                paragraphs.append([])
+            elif tag == _ROW:
+                rows.append([])
+            elif tag == _CELL:
+                sinks.append([])
+            continue
+        if tag == _TEXT:
+            if paragraphs:
+                paragraphs[-1].append(element.text or "")
+        elif tag in _CHARACTERS:
+            if paragraphs:
+                paragraphs[-1].append(_CHARACTERS[tag])
+        elif tag == _PARAGRAPH:
+            line = "".join(paragraphs.pop())
+            if line.strip() or (keep_empty and len(sinks) == 1):
+                sinks[-1].append(line)
+        elif tag == _CELL:
+            cell_lines = sinks.pop()
+            if rows:
+                rows[-1].append(cell_lines)
+        elif tag == _ROW:
+            cells = [cell for cell in rows.pop() if cell]
+            if cells and all(len(cell) == 1 for cell in cells):
+                sinks[-1].append(CELL_SEPARATOR.join(cell[0].strip() for cell in cells))
+            else:
+                sinks[-1].extend(line for cell in cells for line in cell)
+        if len(sinks) == 1 and sinks[0]:
+            yield from sinks[0]
+            sinks[0].clear()
+
+
+def _header_parts(archive):
+    """Header part names in relationship order (headers hold contact lines in many templates)."""
+    try:
+        with archive.open(DOCUMENT_RELS_PART) as rels:
+            relationships = ET.parse(rels).getroot()
+    except KeyError:
+        return []
+    names = []
+    for relationship in relationships.iter(REL_NS + "Relationship"):
+        if relationship.get("Type", "").endswith(HEADER_REL_TYPE) and relationship.get("TargetMode") != "External":
+            name = posixpath.normpath(posixpath.join("word", relationship.get("Target", "")))
+            if name in archive.NameToInfo and name not in names:
+                names.append(name)
+    return names
+
+
+def iter_docx_lines(file_path, include_headers=True):
+    """
+    Yields the text of a .docx file line by line without building a python-docx object model:
+    page header lines first (each distinct line once), then the body's paragraphs, table rows
+    and text boxes in reading order. Stopping the iteration early stops reading the file.
+
+    Args:
+        file_path (str): The path to the .docx file.
+        include_headers (bool): Also read the header parts.
+
+    Yields:
+        str: One paragraph (or table row) per line.
+
+    Raises:
+        zipfile.BadZipFile, KeyError, xml.etree.ElementTree.ParseError: If the file is not a valid .docx.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        if include_headers:
+            seen = set()
+            for name in _header_parts(archive):
+                with archive.open(name) as part:
+                    for line in _iter_part_lines(part, keep_empty=False):
+                        if line.strip() not in seen:
+                            seen.add(line.strip())
+                            yield line
+        with archive.open(DOCUMENT_PART) as part:
+            yield from _iter_part_lines(part)
+
+
+if __name__ == "__main__":
+    # Example usage when running this script directly
+    import os
+    import time
+    import tempfile
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    print("--- Testing streaming DOCX reader ---")
+    from docx import Document # Only needed to build the sample
+    sample = Document()
+    sample.sections[0].header.paragraphs[0].text = "jane@example.com | +1 555 0100"
+    sample.add_paragraph("Jane Doe")
+    sample.add_paragraph("SKILLS")
+    table = sample.add_table(rows=2, cols=2)
+    for row, (label, value) in zip(table.rows, (("Languages", "Python, Go"), ("Cloud", "AWS, Kubernetes"))):
+        row.cells[0].text, row.cells[1].text = label, value
+    sample.add_paragraph("EXPERIENCE")
+    sample.add_paragraph("- Built data pipelines")
+    path = os.path.join(tempfile.mkdtemp(), "sample.docx")
+    sample.save(path)
+    started = time.perf_counter()
+    lines = list(iter_docx_lines(path))
+    print(f"Streamed in {(time.perf_counter() - started) * 1000:.1f} ms:")
+    print("\n".join(lines))
+    print(f"python-docx paragraphs only: {[p.text for p in Document(path).paragraphs]}")
+    print("--- Test Finished ---")
@@ -0,0 +1,282 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import logging
+import threading
+from config import get_env_number
+import resume_sections
+import structured_output
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+BACKEND_ENV_VAR = "JOB_APP_LLM_BACKEND" # "nim" (default) or "fake"
+FAKE_BACKEND = "fake"
+DEFAULT_LATENCY = 0.05 # Seconds before the first token
+DEFAULT_TOKENS_PER_SECOND = 200.0 # Generation speed; 0 means instant
+CHARS_PER_TOKEN = 4 # Rough token estimate used for usage numbers and pacing
+FENCED_BLOCK_PATTERN = re.compile(r"```\n(.*?)\n```", re.DOTALL)
+KEYWORD_PATTERN = re.compile(r"[A-Za-z][A-Za-z+#.]{2,}")
+
+
+class FakeLLMError(RuntimeError):
+    """Simulated provider failure (raised at the configured failure rate). Reported as HTTP 429, like a throttled NIM call."""
+    status_code = 429
+
+
+def is_enabled():
+    """True if JOB_APP_LLM_BACKEND selects the offline fake backend."""
+    return os.getenv(BACKEND_ENV_VAR, "").strip().lower() == FAKE_BACKEND
+
+
+def get_settings():
+    """
+    Returns the fake backend's behaviour, read from the environment on every call.
+
+    Environment variables:
+        JOB_APP_FAKE_LATENCY: Seconds before the first token (default 0.05).
+        JOB_APP_FAKE_TOKENS_PER_SEC: Generation speed (default 200; 0 = instant).
+        JOB_APP_FAKE_FAILURE_RATE: Probability (0-1) that a call raises FakeLLMError.
+        JOB_APP_FAKE_MALFORMED_RATE: Probability (0-1) that an output breaks the marker format.
+        JOB_APP_FAKE_SEED: Seed for the failure/malformed draws, for reproducible runs.
+    """
+    return {
+        "latency": max(0.0, get_env_number("JOB_APP_FAKE_LATENCY", DEFAULT_LATENCY)),
+        "tokens_per_second": max(0.0, get_env_number("JOB_APP_FAKE_TOKENS_PER_SEC", DEFAULT_TOKENS_PER_SECOND)),
+        "failure_rate": min(1.0, max(0.0, get_env_number("JOB_APP_FAKE_FAILURE_RATE", 0.0))),
+        "malformed_rate": min(1.0, max(0.0, get_env_number("JOB_APP_FAKE_MALFORMED_RATE", 0.0))),
+    }
+
+
+def cache_tag():
+    """Identifies the backend in response-cache keys, so fake outputs never answer real requests."""
+    return FAKE_BACKEND if is_enabled() else "nim"
+
+
+_random_lock = threading.Lock()
+_random = random.Random(os.getenv("JOB_APP_FAKE_SEED") or None)
+
+def _draw(probability):
+    if probability <= 0:
+        return False
+    with _random_lock:
+        return _random.random() < probability
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+# --- Output Templates ---
+def _fenced_blocks(prompt):
+    return FENCED_BLOCK_PATTERN.findall(prompt)
+
+def _keywords(text, limit=5):
+    """The most frequent longer words of a text (stand-in for 'JD keywords')."""
+    counts = {}
+    for word in KEYWORD_PATTERN.findall(text):
+        word = word.rstrip(".").lower()
+        if len(word) > 4:
+            counts[word] = counts.get(word, 0) + 1
+    return [word for word, _ in sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]]
+
+def _mark_section(section):
+    marked = resume_sections.mark_plain_section(section)
+    if section.kind == "entry" and section.lines:
+        # Entries open with their company/project line
+        is_project = "project" in (section.heading or "").lower()
+        entry_marker = resume_sections.FMT_SUBHEADING_PROJECT if is_project else resume_sections.FMT_SUBHEADING_COMPANY
+        marked = marked.replace(resume_sections.FMT_NORMAL, entry_marker, 1)
+    return marked
+
+def _mark_plain_resume(text):
+    """Marks plain resume text the way a well-behaved modifier would."""
+    return resume_sections.join_sections(_mark_section(section) for section in resume_sections.split_plain_sections(text))
+
+def _mark_single_section(text, label):
+    """Marks one section handed out by per-section tailoring (an entry, or a plain section body)."""
+    lines = [line for line in text.splitlines() if line.strip()]
+    is_entry = len(lines) > 1 and any(resume_sections.BULLET_PATTERN.match(line) for line in lines[1:])
+    section = resume_sections.ResumeSection("entry" if is_entry else "section", label, lines[0] if lines else "", lines)
+    return _mark_section(section)
+
+def _generate(prompt):
+    """Returns a marker-conformant answer for the agent task described by `prompt`."""
+    import job_application_agent as agents # Deferred: the agent module imports this one (via llm_client)
+    blocks = _fenced_blocks(prompt)
+    source = blocks[0] if blocks else ""
+    job_description = blocks[1] if len(blocks) > 1 else ""
+
+    if "Respond with a single JSON object" in prompt: # JSON output mode
+        document = {}
+        if '- "analysis"' in prompt:
+            keywords = _keywords(job_description) or ["requirements"]
+            document["analysis"] = {
+                "summary": "Relevant experience that maps to the role.", "strengths": ["Relevant experience"],
+                "gaps": [f"Little mention of {keyword}" for keyword in keywords], "missing_keywords": keywords,
+                "recommendations": ["Work the missing keywords into the experience bullets."],
+            }
+        if '- "resume"' in prompt:
+            document["resume"] = structured_output.marked_text_to_elements(_mark_plain_resume(source))
+        return json.dumps(document)
+    if "does not follow the required output format" in prompt: # Re-wrap call
+        text = blocks[-1] if blocks else ""
+        if agents.ESSAY_START_MARKER in prompt.split("Text:")[0]:
+            return f"{agents.ESSAY_START_MARKER}\n{text}\n{agents.ESSAY_END_MARKER}"
+        return f"{agents.MODIFICATION_START_MARKER}\n{_mark_plain_resume(text)}\n{agents.MODIFICATION_END_MARKER}"
+    if "rewrite ONE section of an already formatted resume" in prompt: # Section-scoped chat edit
+        lines = source.splitlines()
+        bullet = next((i for i, line in enumerate(lines) if line.startswith(agents.FMT_BULLET)), None)
+        if bullet is not None:
+            lines[bullet] = f"{lines[bullet]} (revised as requested)"
+        return f"{agents.MODIFICATION_START_MARKER}\n" + "\n".join(lines) + f"\n{agents.MODIFICATION_END_MARKER}"
+    if "rewrite ONE section of a resume" in prompt: # Per-section tailoring
+        label = re.search(r"The original section \((.*?)\):", prompt)
+        marked = _mark_single_section(source, label.group(1) if label else None)
+        return f"{agents.MODIFICATION_START_MARKER}\n{marked}\n{agents.MODIFICATION_END_MARKER}"
+    if "Resume Modifier AI" in prompt: # Full modification
+        return f"{agents.MODIFICATION_START_MARKER}\n{_mark_plain_resume(source)}\n{agents.MODIFICATION_END_MARKER}"
+    if "Essay Writer AI" in prompt:
+        topics = ", ".join(_keywords(job_description or source)) or "the role"
+        essay = (
+            f"I am excited to apply because this role builds on what I do best. My experience with {topics} "
+            f"has prepared me to contribute from day one, and I am eager to keep growing with the team."
+        )
+        return f"{agents.ESSAY_START_MARKER}\n{essay}\n{agents.ESSAY_END_MARKER}"
+    if "running summary of a chat" in prompt: # Chat session summary
+        previous = blocks[0] if blocks and blocks[0] != "(none)" else ""
+        requests = [line[len("User: "):].strip() for line in (blocks[-1] if blocks else "").splitlines() if line.startswith("User: ")]
+        return " ".join(filter(None, [previous] + [f"The user asked: {request}" for request in requests]))
+    if "asking about their resume" in prompt: # Explanation
+        return "I emphasized the experience that best matches the job description and aligned the wording with its key requirements."
+    if agents.ANALYSIS_START_MARKER in prompt: # Analysis
+        keywords = _keywords(job_description) or ["requirements"]
+        analysis = "\n".join(
+            ["Strengths:", "- Relevant experience that maps to the role."]
+            + ["Gaps / keywords to add:"] + [f"- {keyword}" for keyword in keywords]
+        )
+        return f"{agents.ANALYSIS_START_MARKER}\n{analysis}\n{agents.ANALYSIS_END_MARKER}"
+    return "OK."
+
+def _malform(text):
+    """Breaks the output the way real models do, to exercise the repair paths."""
+    import job_application_agent as agents
+    with _random_lock:
+        mode = _random.choice(("truncate_end", "filler", "strip_line_markers"))
+    if mode == "truncate_end" and text.startswith("{"): # JSON cut off mid-document
+        return text[:len(text) * 9 // 10]
+    if mode == "truncate_end":
+        for end_marker in (agents.MODIFICATION_END_MARKER, agents.ESSAY_END_MARKER, agents.ANALYSIS_END_MARKER):
+            if text.rstrip().endswith(end_marker):
+                return text.rstrip()[:-len(end_marker)] + end_marker[:len(end_marker) // 2]
+    if mode == "strip_line_markers" and "@@" in text:
+        return "\n".join(resume_sections.MARKER_PATTERN.sub(r"\2", line) for line in text.splitlines())
+    return f"Sure, here is what you asked for:\n{text}"
+
+
+# --- Public API ---
+def _prompt_text(messages):
+    if isinstance(messages, str):
+        return messages
+    return "\n".join(str(message.get("content", "")) for message in messages)
+
+def generate(messages, max_tokens=None):
+    """
+    Produces the fake answer for a chat request without waiting.
+
+    Returns:
+        tuple: (text, prompt_tokens, completion_tokens).
+
+    Raises:
+        FakeLLMError: At the configured failure rate.
+    """
+    settings = get_settings()
+    prompt = _prompt_text(messages)
+    if _draw(settings["failure_rate"]):
+        raise FakeLLMError("Simulated provider failure (JOB_APP_FAKE_FAILURE_RATE).")
+    text = _generate(prompt)
+    if _draw(settings["malformed_rate"]):
+        text = _malform(text)
+    if max_tokens and estimate_tokens(text) > max_tokens:
+        text = text[:max_tokens * CHARS_PER_TOKEN] # Truncated like a real max_tokens cut-off
+    if "Final Answer:" in prompt: # CrewAI's ReAct prompt expects this framing
+        text = f"Thought: I now can give a great answer\nFinal Answer: {text}"
+    return text, estimate_tokens(prompt), estimate_tokens(text)
+
+def _generation_seconds(text, settings):
+    rate = settings["tokens_per_second"]
+    return estimate_tokens(text) / rate if rate else 0.0
+
+def complete(messages, max_tokens=None, on_chunk=None):
+    """
+    Blocking fake completion, paced by the configured latency and token rate.
+    With `on_chunk`, the text is delivered in word-sized chunks as it is "generated"; if
+    `on_chunk` returns True the generation stops there, like a cancelled stream.
+
+    Returns:
+        tuple: (text, prompt_tokens, completion_tokens, time_to_first_token).
+    """
+    settings = get_settings()
+    text, prompt_tokens, completion_tokens = generate(messages, max_tokens)
+    time.sleep(settings["latency"])
+    if not on_chunk:
+        time.sleep(_generation_seconds(text, settings))
+        return text, prompt_tokens, completion_tokens, settings["latency"]
+    chunks = re.findall(r"\S+\s*|\s+", text)
+    delay = _generation_seconds(text, settings) / max(1, len(chunks))
+    for index, chunk in enumerate(chunks):
+        if on_chunk(chunk):
+            text = "".join(chunks[:index + 1])
+            completion_tokens = estimate_tokens(text)
+            break
+        if delay:
+            time.sleep(delay)
+    return text, prompt_tokens, completion_tokens, settings["latency"]
+
+async def acomplete(messages, max_tokens=None):
+    """Non-blocking counterpart of complete() (sleeps on the event loop)."""
+    settings = get_settings()
+    text, prompt_tokens, completion_tokens = generate(messages, max_tokens)
+    await asyncio.sleep(settings["latency"] + _generation_seconds(text, settings))
+    return text, prompt_tokens, completion_tokens, settings["latency"]
+
+
+def create_crew_llm(model_name, max_tokens=None):
+    """Returns a crewai LLM that answers from this fake backend (for Agent(llm=...))."""
+    from crewai import BaseLLM # Deferred heavy import
+
+    class FakeCrewLLM(BaseLLM):
+        """crewai adapter: every agent call is answered by fake_llm.complete()."""
+
+        def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+            text, _, _, _ = complete(messages, max_tokens=max_tokens)
+            return text
+
+        def supports_function_calling(self):
+            return False
+
+        def supports_stop_words(self):
+            return False
+
+        def get_context_window_size(self):
+            return 128000
+
+    return FakeCrewLLM(model=f"{FAKE_BACKEND}/{model_name}", temperature=0.0)
+
+
+if __name__ == "__main__":
+    # Example usage when running this script directly
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    print("--- Testing fake LLM backend ---")
+    os.environ[BACKEND_ENV_VAR] = FAKE_BACKEND
+    import job_application_agent
+    sample_resume = "Jane Doe\njane@example.com\nEXPERIENCE\nAcme Corp - Engineer\n- Built Python pipelines\nSKILLS\nPython, SQL"
+    sample_jd = "We need a Python engineer with Kubernetes and Kubernetes monitoring experience."
+    analysis, modified = job_application_agent.run_resume_analysis_and_modification(sample_resume, sample_jd)
+    print(f"Analysis:\n{analysis}\n\nModified:\n{modified}")
+    print(f"Telemetry: {job_application_agent.get_telemetry_summary()}")
+    print("--- Test Finished ---")
@@ -0,0 +1,195 @@
+import os
+import atexit
+import asyncio
+import logging
+import threading
+import weakref
+from config import get_env_number
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+DEFAULT_NIM_API_BASE = "https://integrate.api.nvidia.com/v1"
+DEFAULT_POOL_SIZE = 10 # Max simultaneous connections (batch runs use up to DEFAULT_BATCH_WORKERS)
+DEFAULT_KEEPALIVE_EXPIRY = 60.0 # Seconds an idle connection is kept open for reuse
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 300.0 # Long generations can take minutes
+
+
+def get_pool_settings():
+    """
+    Returns the pool configuration, read from the environment.
+
+    Environment variables:
+        JOB_APP_HTTP_POOL_SIZE: Max connections (and keep-alive connections) in the pool.
+        JOB_APP_HTTP_KEEPALIVE_EXPIRY: Idle seconds before a pooled connection is closed.
+        JOB_APP_HTTP_CONNECT_TIMEOUT / JOB_APP_HTTP_READ_TIMEOUT: Timeouts in seconds.
+
+    Returns:
+        dict: pool_size, keepalive_expiry, connect_timeout, read_timeout.
+    """
+    return {
+        "pool_size": max(1, get_env_number("JOB_APP_HTTP_POOL_SIZE", DEFAULT_POOL_SIZE, int)),
+        "keepalive_expiry": get_env_number("JOB_APP_HTTP_KEEPALIVE_EXPIRY", DEFAULT_KEEPALIVE_EXPIRY),
+        "connect_timeout": get_env_number("JOB_APP_HTTP_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT),
+        "read_timeout": get_env_number("JOB_APP_HTTP_READ_TIMEOUT", DEFAULT_READ_TIMEOUT),
+    }
+
+
+def get_nim_api_base():
+    """Returns the NIM endpoint base URL (NVIDIA_NIM_API_BASE, as LiteLLM reads it)."""
+    return os.getenv("NVIDIA_NIM_API_BASE", DEFAULT_NIM_API_BASE)
+
+
+# --- Shared Clients ---
+# One sync client for the whole process (httpx.Client is thread-safe) and one async client
+# per event loop (an AsyncClient's connections belong to the loop that opened them).
+_lock = threading.Lock()
+_client = None
+_async_clients = weakref.WeakKeyDictionary() # event loop -> httpx.AsyncClient
+_installed = False
+
+
+def _client_options():
+    import httpx # Deferred import (comes with litellm/openai)
+    settings = get_pool_settings()
+    return {
+        "limits": httpx.Limits(
+            max_connections=settings["pool_size"],
+            max_keepalive_connections=settings["pool_size"],
+            keepalive_expiry=settings["keepalive_expiry"],
+        ),
+        "timeout": httpx.Timeout(settings["read_timeout"], connect=settings["connect_timeout"]),
+    }
+
+
+def get_client():
+    """Returns the process-wide pooled httpx.Client, creating it on first use."""
+    global _client
+    with _lock:
+        if _client is None or _client.is_closed:
+            import httpx
+            _client = httpx.Client(**_client_options())
+            log.info(f"Created shared HTTP client pool: {get_pool_settings()}")
+        return _client
+
+
+def get_async_client():
+    """Returns the pooled httpx.AsyncClient for the running event loop, creating it on first use."""
+    import httpx
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(**_client_options())
+            _async_clients[loop] = client
+            log.debug(f"Created async HTTP client pool for loop {id(loop):#x}.")
+        return client
+
+
+def install():
+    """
+    Routes LiteLLM's HTTP traffic (crew runs and llm_client calls alike) through the shared
+    sync pool. Idempotent and cheap, so call sites can invoke it right before a request.
+    """
+    global _installed
+    if _installed:
+        return
+    import litellm # Deferred heavy import
+    litellm.client_session = get_client()
+    _installed = True
+    log.info("LiteLLM now uses the shared HTTP client pool.")
+
+
+def install_async():
+    """Points LiteLLM's async session at the running loop's pool. Call from inside the loop."""
+    import litellm
+    client = get_async_client()
+    if litellm.aclient_session is not client:
+        litellm.aclient_session = client
+
+
+def warm_up(url=None):
+    """
+    Opens a pooled (TLS) connection to the NIM endpoint so the first real request does not pay
+    for DNS and the handshake. Any HTTP response counts as success; only the connection matters.
+
+    Returns:
+        bool: True if a connection was established.
+    """
+    target = url or get_nim_api_base()
+    try:
+        get_client().head(target)
+    except Exception as e:
+        log.warning(f"HTTP pool warm-up to {target} failed (connections will open on demand): {e}")
+        return False
+    log.info(f"HTTP pool warmed up ({target}).")
+    return True
+
+
+def close():
+    """Closes the sync pool. Async pools are closed with their event loops."""
+    global _client, _installed
+    with _lock:
+        client, _client = _client, None
+        _installed = False
+    if client is not None:
+        client.close()
+
+
+atexit.register(close)
+
+
+if __name__ == "__main__":
+    # Self-check: repeated calls through the pool must reuse one keep-alive connection
+    import http.server
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    print("--- Testing HTTP pool connection reuse ---")
+
+    client_ports = []
+
+    class StubHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # Required for keep-alive
+
+        def _reply(self):
+            client_ports.append(self.client_address[1]) # A new connection shows up as a new port
+            self.rfile.read(int(self.headers.get("Content-Length") or 0)) # Drain the body to keep the connection usable
+            body = b'{"ok": true}'
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+
+        do_GET = do_POST = do_HEAD = _reply
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        assert warm_up(base_url), "warm-up failed"
+        for _ in range(5):
+            get_client().post(f"{base_url}/chat/completions", json={"messages": []}).raise_for_status()
+        print(f"Sync: {len(client_ports)} requests over {len(set(client_ports))} connection(s).")
+        assert len(set(client_ports)) == 1, "sync requests did not reuse the warmed connection"
+
+        async def _async_calls():
+            ports_before = len(client_ports)
+            for _ in range(5):
+                (await get_async_client().get(base_url)).raise_for_status()
+            await get_async_client().aclose()
+            return client_ports[ports_before:]
+
+        async_ports = asyncio.run(_async_calls())
+        print(f"Async: {len(async_ports)} requests over {len(set(async_ports))} connection(s).")
+        assert len(set(async_ports)) == 1, "async requests did not reuse their connection"
+        print("PASS: connections are reused.")
+    finally:
+        close()
+        server.shutdown()
+    print("--- Test Finished ---")
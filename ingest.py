@@ -0,0 +1,323 @@
+"""
+Headless bulk ingestion of a directory of resumes.
+
+Scans a directory (recursively) for .pdf/.docx resumes and parses them in a process pool with
+utils.parse_resume_document (the logic behind utils.parse_resume). Each one's normalized text
+and structure (resume model and sections) is written to a local store:
+
+    <store>/documents/<content hash>.v<parser version>.json   one per distinct file content
+    <store>/manifest.json                                      source file -> size, mtime, document, status
+
+Re-runs are incremental. Files whose size and modification time match the manifest are skipped,
+and a changed file whose content is already stored is only re-pointed. Entries of files that
+disappeared are dropped, and so are documents nothing refers to any more. Progress and
+throughput (files/sec) are logged while the run goes on.
+
+Usage:
+    python ingest.py RESUME_DIR [--store DIR] [--workers N] [--force] [--json]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from cache import DEFAULT_CACHE_DIR
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+RESUME_EXTENSIONS = (".pdf", ".docx")
+MANIFEST_FILE = "manifest.json"
+DOCUMENTS_DIR = "documents"
+STORE_VERSION = 1 # Bump when the manifest layout changes
+PROGRESS_INTERVAL_SECONDS = 2.0
+MANIFEST_SAVE_EVERY = 200 # Files; an interrupted run keeps everything up to the last save
+MAX_PENDING_PER_WORKER = 4 # Files queued per worker process at a time (bounds memory on huge directories)
+
+
+def default_store_dir():
+    """The store next to the other on-disk data: <JOB_APP_CACHE_DIR or .cache>/resume_store."""
+    return os.path.join(os.getenv("JOB_APP_CACHE_DIR", DEFAULT_CACHE_DIR), "resume_store")
+
+
+def _write_json(path, value):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(value, f)
+    os.replace(tmp_path, path) # Atomic, so readers and concurrent writers never see partial files
+
+
+# --- Store ---
+class ResumeStore:
+    """
+    Local store of ingested resumes: one JSON document per distinct file content and parser
+    version (the parse_resume_document() result), plus a manifest mapping source files to them.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or default_store_dir()
+        self.documents_dir = os.path.join(self.directory, DOCUMENTS_DIR)
+        self.manifest_path = os.path.join(self.directory, MANIFEST_FILE)
+        os.makedirs(self.documents_dir, exist_ok=True)
+
+    def load_manifest(self):
+        """Returns {"version", "files": {absolute source path: entry}}; empty if missing or outdated."""
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == STORE_VERSION and isinstance(manifest.get("files"), dict):
+                return manifest
+            log.info(f"Store manifest has an old layout; re-ingesting everything into {self.directory}.")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            log.warning(f"Could not read the store manifest ({e}); re-ingesting everything.")
+        return {"version": STORE_VERSION, "files": {}}
+
+    def save_manifest(self, manifest):
+        _write_json(self.manifest_path, manifest)
+
+    def document_path(self, document_id):
+        return os.path.join(self.documents_dir, f"{document_id}.json")
+
+    def has_document(self, document_id):
+        return bool(document_id) and os.path.exists(self.document_path(document_id))
+
+    def read_document(self, document_id):
+        """The stored parse_resume_document() result, or None if it is missing or unreadable."""
+        try:
+            with open(self.document_path(document_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def iter_documents(self):
+        """Yields (source path, manifest entry, document) for every successfully ingested file."""
+        for path, entry in sorted(self.load_manifest()["files"].items()):
+            if entry.get("status") == "ok":
+                document = self.read_document(entry["document"])
+                if document is not None:
+                    yield path, entry, document
+
+    def prune(self, manifest):
+        """Deletes the documents no manifest entry refers to; returns how many were deleted."""
+        referenced = {entry.get("document") for entry in manifest["files"].values()}
+        pruned = 0
+        for name in os.listdir(self.documents_dir):
+            if name.endswith(".json") and name[:-len(".json")] not in referenced:
+                try:
+                    os.remove(os.path.join(self.documents_dir, name))
+                    pruned += 1
+                except OSError as e:
+                    log.warning(f"Could not delete stale document {name}: {e}")
+        return pruned
+
+
+# --- Parsing (runs in the worker processes) ---
+def _init_worker():
+    # Whole files are the unit of parallelism here: no nested page pools
+    os.environ["JOB_APP_PARSE_WORKERS"] = "1"
+
+
+def _ingest_file(path, documents_dir, force=False):
+    """
+    Parses one resume and writes its document, unless a document of the same content and parser
+    version is already stored.
+
+    Returns:
+        dict: The file's manifest entry: status ("ok" or "error"), document, reused, pages,
+        truncated, chars, seconds (and error).
+    """
+    import utils # Deferred: keeps `--help` and the pool start-up light
+    started = time.perf_counter()
+    try:
+        content_hash = utils.file_content_hash(path)
+        document_id = f"{content_hash}.v{utils.PARSER_VERSION}"
+        target = os.path.join(documents_dir, f"{document_id}.json")
+        document = None
+        if not force and os.path.exists(target): # Same content as a file ingested before (a copy, or a touched file)
+            with open(target, "r", encoding="utf-8") as f:
+                document = json.load(f)
+            reused = True
+        if document is None:
+            # The store already makes re-runs incremental, so the parsed-resume cache is left alone
+            document = utils.parse_resume_document(path, use_cache=False, store=False, content_hash=content_hash)
+            if document is None:
+                return {"status": "error", "error": "Unsupported or unreadable file (see the log)."}
+            document["parser_version"] = utils.PARSER_VERSION
+            _write_json(target, document)
+            reused = False
+    except Exception as e:
+        log.error(f"Failed to ingest {path}: {e}", exc_info=True)
+        return {"status": "error", "error": str(e)}
+    return {
+        "status": "ok", "document": document_id, "reused": reused, "pages": document["pages"],
+        "truncated": document["truncated"], "chars": len(document["text"]), "seconds": time.perf_counter() - started,
+    }
+
+
+def _iter_results(todo, documents_dir, workers, force):
+    """Yields (path, stat, manifest entry) as files finish; in-process if the pool is unusable."""
+    if workers > 1 and len(todo) > 1:
+        queue = iter(todo)
+        pending = {}
+        pool = None
+        try:
+            # spawn, not fork: a forked child inherits the parent's threads and locks (the logging
+            # handlers, the LLM client pools) and can deadlock on one that was held at fork time
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                       mp_context=multiprocessing.get_context("spawn"))
+            for path, st in itertools.islice(queue, workers * MAX_PENDING_PER_WORKER):
+                pending[pool.submit(_ingest_file, path, documents_dir, force)] = (path, st)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, st = pending[future]
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e: # e.g. the task or its result failed to (un)pickle
+                        log.error(f"Failed to ingest {path}: {e}")
+                        result = {"status": "error", "error": str(e)}
+                    del pending[future]
+                    yield path, st, result
+                    for next_path, next_st in itertools.islice(queue, 1):
+                        pending[pool.submit(_ingest_file, next_path, documents_dir, force)] = (next_path, next_st)
+            return
+        except (BrokenProcessPool, OSError) as e:
+            log.warning(f"Ingestion process pool unusable ({e}); continuing in-process.")
+            todo = list(pending.values()) + list(queue)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+    for path, st in todo:
+        yield path, st, _ingest_file(path, documents_dir, force)
+
+
+# --- Ingestion ---
+def scan_directory(root):
+    """Yields (absolute path, os.stat_result) of the resumes under `root`, in sorted order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith("."))
+        for name in sorted(filenames):
+            # "~$" files are Word's lock files next to open documents
+            if name.lower().endswith(RESUME_EXTENSIONS) and not name.startswith(("~$", ".")):
+                path = os.path.join(dirpath, name)
+                try:
+                    yield path, os.stat(path)
+                except OSError as e:
+                    log.warning(f"Skipping {path}: {e}")
+
+
+def _is_unchanged(entry, st, store, parser_version):
+    """True if the manifest entry still describes the file (failed files are not retried until they change)."""
+    if not entry or entry.get("size") != st.st_size or entry.get("mtime_ns") != st.st_mtime_ns:
+        return False
+    if entry.get("status") == "error":
+        return entry.get("parser_version") == parser_version
+    return entry.get("document", "").endswith(f".v{parser_version}") and store.has_document(entry["document"])
+
+
+def ingest_directory(root, store_dir=None, workers=None, force=False, progress_interval=PROGRESS_INTERVAL_SECONDS):
+    """
+    Ingests every new or changed resume under `root` into the store.
+
+    Args:
+        root (str): Directory to scan (recursively).
+        store_dir (str): Store directory (default: default_store_dir()).
+        workers (int): Worker processes (default: CPU count; 1 = in-process).
+        force (bool): Re-parse every file, even unchanged ones.
+        progress_interval (float): Seconds between progress log lines.
+
+    Returns:
+        dict: Run summary: store, scanned, unchanged, parsed, reused (content already stored),
+        failed (paths), removed, pruned, seconds, files_per_second (over the files processed).
+    """
+    from utils import PARSER_VERSION
+    root = os.path.abspath(root)
+    if not os.path.isdir(root):
+        raise NotADirectoryError(f"Not a directory: {root}")
+    store = ResumeStore(store_dir)
+    manifest = store.load_manifest()
+    files = manifest["files"]
+    workers = max(1, workers or os.cpu_count() or 1)
+    started = time.perf_counter()
+
+    todo, seen = [], set()
+    for path, st in scan_directory(root):
+        seen.add(path)
+        if force or not _is_unchanged(files.get(path), st, store, PARSER_VERSION):
+            todo.append((path, st))
+    removed = [path for path in files if path.startswith(root + os.sep) and path not in seen]
+    for path in removed:
+        del files[path]
+    log.info(f"Found {len(seen)} resumes in {root}: {len(todo)} new or changed, {len(removed)} removed.")
+
+    summary = {"store": store.directory, "scanned": len(seen), "unchanged": len(seen) - len(todo),
+               "parsed": 0, "reused": 0, "failed": [], "removed": len(removed)}
+    last_report = time.perf_counter()
+    try: # An interrupted run keeps the progress it has made
+        for done, (path, st, entry) in enumerate(_iter_results(todo, store.documents_dir, workers, force), start=1):
+            entry.update(size=st.st_size, mtime_ns=st.st_mtime_ns, parser_version=PARSER_VERSION, ingested_at=time.time())
+            files[path] = entry
+            if entry["status"] != "ok":
+                summary["failed"].append(path)
+            elif entry["reused"]:
+                summary["reused"] += 1
+            else:
+                summary["parsed"] += 1
+            if done % MANIFEST_SAVE_EVERY == 0:
+                store.save_manifest(manifest)
+            now = time.perf_counter()
+            if now - last_report >= progress_interval or done == len(todo):
+                last_report = now
+                log.info(f"Ingested {done}/{len(todo)} files ({done / max(now - started, 1e-9):.1f} files/s, {len(summary['failed'])} failed).")
+    finally:
+        store.save_manifest(manifest)
+    summary["pruned"] = store.prune(manifest)
+    summary["seconds"] = time.perf_counter() - started
+    summary["files_per_second"] = len(todo) / summary["seconds"] if todo else 0.0
+    return summary
+
+
+def _print_report(summary):
+    print(f"Store: {summary['store']}")
+    print(f"Scanned {summary['scanned']} resumes in {summary['seconds']:.2f}s: {summary['unchanged']} unchanged, "
+          f"{summary['parsed']} parsed, {summary['reused']} already stored, {len(summary['failed'])} failed, "
+          f"{summary['removed']} removed ({summary['pruned']} documents pruned).")
+    print(f"Throughput: {summary['files_per_second']:.1f} files/s")
+    for path in summary["failed"]:
+        print(f"  FAILED: {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parse a directory of PDF/DOCX resumes into a local store (incremental).")
+    parser.add_argument("directory", help="Directory to scan for .pdf/.docx resumes (recursively).")
+    parser.add_argument("--store", default=None, help="Store directory (default: <JOB_APP_CACHE_DIR or .cache>/resume_store).")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count; 1 = in-process).")
+    parser.add_argument("--force", action="store_true", help="Re-parse every file, even unchanged ones.")
+    parser.add_argument("--json", action="store_true", help="Print the run summary as JSON instead of a report.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    try:
+        summary = ingest_directory(args.directory, store_dir=args.store, workers=args.workers, force=args.force)
+    except NotADirectoryError as e:
+        log.error(str(e))
+        return 2
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        _print_report(summary)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
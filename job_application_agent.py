@@ -2,16 +2,55 @@ import os
 import logging
 import json # For parsing plan if needed
 import re # For potentially cleaning output
-from crewai import Agent, Task, Crew, Process
-from langchain_nvidia_ai_endpoints import ChatNVIDIA
+import asyncio
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+# crewai and langchain_nvidia_ai_endpoints are heavy imports; they are deferred to first use (see get_llm/warm_up)
 # Import the updated function from config.py
 from config import load_api_key
+from cache import TieredCache, make_cache_key
+import llm_client
+import fake_llm
+import http_pool
+import rate_limiter
+import telemetry
+import resume_sections
+import resume_model
+import resume_diff
+from singleflight import SingleFlight
+from stream_parser import MarkerStreamParser
+import output_repair
+import structured_output
+import token_budget
 
 # Configure logging
 log = logging.getLogger(__name__)
 
 # --- Constants ---
 DEFAULT_MODEL_NAME = "nvidia/llama-3.1-nemotron-70b-instruct" # Keep the updated model
+DEFAULT_TEMPERATURE = 0.5 # Keep temperature low
+DEFAULT_MAX_TOKENS = 2048 # Used when adaptive budgets are off (JOB_APP_ADAPTIVE_MAX_TOKENS=0); see token_budget
+DEFAULT_BATCH_WORKERS = 4 # Concurrent crew runs for batch tailoring
+DEFAULT_SECTION_WORKERS = 6 # Concurrent section rewrites in per-section modification mode
+MAX_LOCAL_HEADER_LINES = 3 # Headers up to this many lines are marked locally instead of by the modifier
+CHAT_SUMMARY_MAX_TOKENS = 200 # Rolling summary of older chat turns (see chat_session)
+STREAM_FORMAT_RETRIES = 1 # Streamed generations cancelled for breaking the marker contract are restarted this often
+# Part of the response cache key: bump it whenever a task description, expected output or the marker
+# rules change, so responses cached for the old prompts are not served for the new ones.
+PROMPT_VERSION = 1
+# How the analysis and modification stages of the initial run are scheduled:
+# "parallel" runs them concurrently (the modifier does not read the analysis),
+# "sequential" runs the analysis first and hands its text to the modifier.
+EXECUTION_MODES = ("parallel", "sequential")
+DEFAULT_EXECUTION_MODE = "parallel"
+# How the analyzer and modifier format their output: "markers" (=== ... === blocks and @@...@@ line
+# markers) or "json" (one schema-validated JSON object, see structured_output). JOB_APP_OUTPUT_MODE sets the default.
+OUTPUT_MODES = ("markers", "json")
+DEFAULT_OUTPUT_MODE = os.getenv("JOB_APP_OUTPUT_MODE", "").strip().lower() or "markers"
 ANALYSIS_START_MARKER = "=== ANALYSIS START ==="
 ANALYSIS_END_MARKER = "=== ANALYSIS END ==="
 MODIFICATION_START_MARKER = "=== MODIFIED RESUME START ==="
@@ -51,45 +90,119 @@ FMT_BULLET = "@@BULLET@@"
 FMT_NORMAL = "@@NORMAL@@" # Default paragraph
 
 
-# --- Load API Key ---
-LOADED_API_KEY = load_api_key()
-if not LOADED_API_KEY:
-    log.critical("NVIDIA_NIM_API_KEY could not be loaded. Application cannot function without it.")
-    raise ValueError("NVIDIA_NIM_API_KEY could not be loaded. Please check your .env file or environment variables.")
-else:
-    # Ensure the key is available as an environment variable for LangChain/CrewAI
-    os.environ["NVIDIA_NIM_API_KEY"] = LOADED_API_KEY
-    log.info("NVIDIA_NIM_API_KEY set in environment for this process.")
-
-
-# --- Initialize LLM ---
-try:
-    # Use the API key directly from the loaded variable for clarity
-    llm = ChatNVIDIA(
-        model=DEFAULT_MODEL_NAME, # Use the updated model name constant
-        nvidia_api_key=LOADED_API_KEY, # Pass the key explicitly
-        max_tokens=2048, # Keep slightly increased
-        temperature=0.5 # Keep temperature low
-    )
-    log.info(f"Successfully initialized ChatNVIDIA with model: {DEFAULT_MODEL_NAME}")
-except Exception as e:
-    log.critical(f"Failed to initialize ChatNVIDIA LLM: {e}", exc_info=True)
-    # Provide a more user-friendly error message if initialization fails
-    raise RuntimeError(f"Could not initialize the AI model (ChatNVIDIA). Please check API key validity, model access ({DEFAULT_MODEL_NAME}), and network connection. Error: {e}")
+# --- Lazy Initialization ---
+# Nothing expensive happens at import time: the API key, the ChatNVIDIA client and the crewai
+# import are all set up on first use, or ahead of time by warm_up() on a background thread.
+_init_lock = threading.RLock()
+_api_key = None
+_llms = {} # max_tokens -> ChatNVIDIA (budgets are rounded, so there are only a few)
+
+def get_api_key():
+    """Loads the NVIDIA API key once and exports it for LangChain/CrewAI. Returns None if missing."""
+    global _api_key
+    with _init_lock:
+        if _api_key is None:
+            api_key = load_api_key()
+            if not api_key:
+                log.critical("NVIDIA_NIM_API_KEY could not be loaded. Application cannot function without it.")
+                return None
+            # Ensure the key is available as an environment variable for LangChain/CrewAI
+            os.environ["NVIDIA_NIM_API_KEY"] = api_key
+            log.info("NVIDIA_NIM_API_KEY set in environment for this process.")
+            _api_key = api_key
+        return _api_key
+
+def requires_api_key():
+    """False when the offline fake backend (JOB_APP_LLM_BACKEND=fake) answers instead of NIM."""
+    return not fake_llm.is_enabled()
+
+def _active_model_name():
+    """Model name as recorded in cache keys and telemetry; fake runs never share entries with NIM runs."""
+    return f"{fake_llm.cache_tag()}/{DEFAULT_MODEL_NAME}" if fake_llm.is_enabled() else DEFAULT_MODEL_NAME
+
+def _require_api_key():
+    """Like get_api_key(), but raises if the key is unavailable."""
+    if not requires_api_key():
+        return None
+    api_key = get_api_key()
+    if not api_key:
+        raise ValueError("NVIDIA_NIM_API_KEY could not be loaded. Please check your .env file or environment variables.")
+    return api_key
+
+def get_llm(max_tokens=None):
+    """Returns the shared ChatNVIDIA instance for the given generation budget, creating it on first use."""
+    max_tokens = max_tokens or DEFAULT_MAX_TOKENS
+    if fake_llm.is_enabled():
+        return fake_llm.create_crew_llm(DEFAULT_MODEL_NAME, max_tokens=max_tokens)
+    with _init_lock:
+        llm = _llms.get(max_tokens)
+        if llm is None:
+            api_key = _require_api_key()
+            from langchain_nvidia_ai_endpoints import ChatNVIDIA # Deferred heavy import
+            try:
+                # Use the API key directly from the loaded variable for clarity
+                llm = _llms[max_tokens] = ChatNVIDIA(
+                    model=DEFAULT_MODEL_NAME, # Use the updated model name constant
+                    nvidia_api_key=api_key, # Pass the key explicitly
+                    max_tokens=max_tokens,
+                    temperature=DEFAULT_TEMPERATURE
+                )
+                log.info(f"Successfully initialized ChatNVIDIA with model: {DEFAULT_MODEL_NAME} (max_tokens={max_tokens})")
+            except Exception as e:
+                log.critical(f"Failed to initialize ChatNVIDIA LLM: {e}", exc_info=True)
+                # Provide a more user-friendly error message if initialization fails
+                raise RuntimeError(f"Could not initialize the AI model (ChatNVIDIA). Please check API key validity, model access ({DEFAULT_MODEL_NAME}), and network connection. Error: {e}")
+        return llm
+
+def warm_up():
+    """
+    Performs the deferred imports and builds the LLM ahead of the first run.
+    Meant to be called from a background thread once the GUI is visible.
+
+    Returns:
+        bool: True if the agent backend is ready, False if warm-up failed (it is retried on first use).
+    """
+    started = time.perf_counter()
+    try:
+        import crewai # noqa: F401 - importing is the point (populates sys.modules)
+        get_llm()
+        if requires_api_key():
+            http_pool.install()
+            http_pool.warm_up() # Opens the TLS connection now, off the critical path of the first run
+    except Exception as e:
+        log.warning(f"Agent warm-up failed (will retry on first use): {e}")
+        return False
+    log.info(f"Agent backend warmed up in {time.perf_counter() - started:.2f}s.")
+    return True
+
+def __getattr__(name):
+    # Backwards compatibility for the attributes that used to be created at import time
+    if name == "LOADED_API_KEY":
+        return get_api_key()
+    if name == "llm":
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # --- Define Agents ---
+# Agents are created per crew run: crewai agents keep per-execution state, so one
+# instance must not be shared between crews running at the same time. Each agent's LLM
+# gets the generation budget of the task it is created for (`max_tokens`).
+
 # Resume Analyzer (no changes needed)
-resume_analyzer = Agent(
-    role='Resume Analyzer',
-    goal='Analyze a given resume against a job description, identifying key skills, experiences, and qualifications present in the resume and highlighting gaps or areas for improvement based on the job requirements.',
-    backstory=(
-        "You are an expert Human Resources professional with extensive experience in recruitment "
-        "and talent acquisition. You have a keen eye for detail and understand how to match candidate "
-        "profiles with job requirements effectively. Your task is to provide a clear, concise analysis "
-        "comparing a resume to a specific job description."
-    ),
-    verbose=True, allow_delegation=False, llm=llm
-)
+def create_resume_analyzer(max_tokens=None):
+    """Creates the Resume Analyzer agent."""
+    from crewai import Agent # Deferred heavy import
+    return Agent(
+        role='Resume Analyzer',
+        goal='Analyze a given resume against a job description, identifying key skills, experiences, and qualifications present in the resume and highlighting gaps or areas for improvement based on the job requirements.',
+        backstory=(
+            "You are an expert Human Resources professional with extensive experience in recruitment "
+            "and talent acquisition. You have a keen eye for detail and understand how to match candidate "
+            "profiles with job requirements effectively. Your task is to provide a clear, concise analysis "
+            "comparing a resume to a specific job description."
+        ),
+        verbose=True, allow_delegation=False, llm=get_llm(max_tokens)
+    )
 
 # Resume Modifier (no changes needed in definition)
 """
@@ -156,117 +269,159 @@ resume_modifier = Agent(
 )
 """
 
-resume_modifier = Agent(
-    role='Impact-Driven Resume Strategist',
-    goal='Enhance resume bullet points with measurable impact while maintaining authenticity and relevance to the job description',
-    backstory=(
-        "As a former Fortune 500 HR Tech Specialist turned resume engineer, you combine hiring manager psychology "
-        "with data-driven impact statements. You specialize in transforming generic responsibilities into "
-        "quantified achievements that demonstrate clear value."
-    ),
-    llm=llm,
-    verbose=True,
-    allow_delegation=False,
-    system_message=(
-        "**Resume Rewriting Protocol v3.0 - Impact Focus**\n\n"
-        "1. BULLET POINT TRANSFORMATION RULES:\n"
-        "   - Every modified bullet MUST follow the 'X-Y-Z' structure:\n"
-        "     * X: Action taken (specific what)\n"
-        "     * Y: Method/approach used (optional)\n"
-        "     * Z: Measurable outcome (required)\n"
-        "   - Example: 'Optimized API response times (Y) by implementing caching (X), reducing latency by 40% (Z)'\n\n"
-        "2. METRIC INTEGRATION STANDARDS:\n"
-        "   - Prefer real metrics from the original resume\n"
-        "   - For estimated metrics, use conservative ranges and mark with [~]\n"
-        "   - Never invent metrics that can't be reasonably inferred\n"
-        "   - Acceptable metric types:\n"
-        "     * Percentage improvements (e.g., 'increased efficiency by 25%')\n"
-        "     * Time savings (e.g., 'reduced processing time by 3 hours weekly')\n"
-        "     * Scale metrics (e.g., 'managed 15+ team members')\n"
-        "     * Business impact (e.g., 'generated $50K in annual savings')\n\n"
-        "3. SECTION-SPECIFIC RULES:\n"
-        "   - PROFESSIONAL EXPERIENCE:\n"
-        "     * Transform 1-2 most relevant bullets per position to impact statements\n"
-        "     * May add 1-2 new bullets ONLY if critical for job requirements\n"
-        "     * Never add fluff phrases like 'showcasing skills'\n"
-        "   - PROJECT EXPERIENCE:\n"
-        "     * Only modify keywords to better match job description\n"
-        "     * Never add new bullets\n"
-        "     * Preserve original structure and content\n\n"
-        "4. QUALITY CONTROL:\n"
-        "   - All new content gets [IMPACT VERIFIED] tag\n"
-        "   - Questionable metrics marked [ESTIMATE]\n"
-        "   - Maintain original @@MARKERS@@ strictly\n"
-        "   - Bold all modifications for transparency"
-    ),
-    examples=[
-        {
-            "input": ("Job requires 'process optimization'. Original: Improved reporting system",
-                     "Finance experience"),
-            "output": "**Reduced monthly reporting time by 30% (Z) by automating Excel workflows with Python (X), enabling faster decision-making (Y)** [IMPACT VERIFIED]"
-        },
-        {
-            "input": ("Job requires 'team leadership'. Original: Managed project team",
-                     "Software development"),
-            "output": "**Led 6-member agile team (X) to deliver 3 full-stack features 2 weeks ahead of schedule (Z) through improved sprint planning (Y)** [ESTIMATE]"
-        },
-        {
-            "input": "Job requires 'AWS'. Original: Cloud administration",
-            "output": "**Managed AWS infrastructure (EC2, S3) supporting 500+ daily users with 99.9% uptime**"
-        }
-    ]
-)
+def create_resume_modifier(max_tokens=None):
+    """Creates the Resume Modifier agent."""
+    from crewai import Agent # Deferred heavy import
+    return Agent(
+        role='Impact-Driven Resume Strategist',
+        goal='Enhance resume bullet points with measurable impact while maintaining authenticity and relevance to the job description',
+        backstory=(
+            "As a former Fortune 500 HR Tech Specialist turned resume engineer, you combine hiring manager psychology "
+            "with data-driven impact statements. You specialize in transforming generic responsibilities into "
+            "quantified achievements that demonstrate clear value."
+        ),
+        llm=get_llm(max_tokens),
+        verbose=True,
+        allow_delegation=False,
+        system_message=(
+            "**Resume Rewriting Protocol v3.0 - Impact Focus**\n\n"
+            "1. BULLET POINT TRANSFORMATION RULES:\n"
+            "   - Every modified bullet MUST follow the 'X-Y-Z' structure:\n"
+            "     * X: Action taken (specific what)\n"
+            "     * Y: Method/approach used (optional)\n"
+            "     * Z: Measurable outcome (required)\n"
+            "   - Example: 'Optimized API response times (Y) by implementing caching (X), reducing latency by 40% (Z)'\n\n"
+            "2. METRIC INTEGRATION STANDARDS:\n"
+            "   - Prefer real metrics from the original resume\n"
+            "   - For estimated metrics, use conservative ranges and mark with [~]\n"
+            "   - Never invent metrics that can't be reasonably inferred\n"
+            "   - Acceptable metric types:\n"
+            "     * Percentage improvements (e.g., 'increased efficiency by 25%')\n"
+            "     * Time savings (e.g., 'reduced processing time by 3 hours weekly')\n"
+            "     * Scale metrics (e.g., 'managed 15+ team members')\n"
+            "     * Business impact (e.g., 'generated $50K in annual savings')\n\n"
+            "3. SECTION-SPECIFIC RULES:\n"
+            "   - PROFESSIONAL EXPERIENCE:\n"
+            "     * Transform 1-2 most relevant bullets per position to impact statements\n"
+            "     * May add 1-2 new bullets ONLY if critical for job requirements\n"
+            "     * Never add fluff phrases like 'showcasing skills'\n"
+            "   - PROJECT EXPERIENCE:\n"
+            "     * Only modify keywords to better match job description\n"
+            "     * Never add new bullets\n"
+            "     * Preserve original structure and content\n\n"
+            "4. QUALITY CONTROL:\n"
+            "   - All new content gets [IMPACT VERIFIED] tag\n"
+            "   - Questionable metrics marked [ESTIMATE]\n"
+            "   - Maintain original @@MARKERS@@ strictly\n"
+            "   - Bold all modifications for transparency"
+        ),
+        examples=[
+            {
+                "input": ("Job requires 'process optimization'. Original: Improved reporting system",
+                         "Finance experience"),
+                "output": "**Reduced monthly reporting time by 30% (Z) by automating Excel workflows with Python (X), enabling faster decision-making (Y)** [IMPACT VERIFIED]"
+            },
+            {
+                "input": ("Job requires 'team leadership'. Original: Managed project team",
+                         "Software development"),
+                "output": "**Led 6-member agile team (X) to deliver 3 full-stack features 2 weeks ahead of schedule (Z) through improved sprint planning (Y)** [ESTIMATE]"
+            },
+            {
+                "input": "Job requires 'AWS'. Original: Cloud administration",
+                "output": "**Managed AWS infrastructure (EC2, S3) supporting 500+ daily users with 99.9% uptime**"
+            }
+        ]
+    )
 
 # Essay Writer (no changes needed)
-essay_writer = Agent(
-    role='Job Application Essay Writer',
-    goal='Generate compelling short essay answers for job application questions based on the candidate\'s resume, the job description, and specific user instructions or prompts. If the resume lacks details, formulate relevant questions to ask the user or generate plausible examples based on the indicated experience level.',
-    backstory=(
-        "You are a skilled writer specializing in professional communication and application materials. "
-        "You can synthesize information from a resume and job description to draft thoughtful responses "
-        "to common application questions (e.g., behavioral questions, situational questions). "
-        "You understand the importance of aligning responses with the candidate's likely experience and the target role. "
-        "If needed, you can prompt the user for specific examples or generate suitable, hypothetical scenarios."
-    ),
-    verbose=True, allow_delegation=False, llm=llm
-)
+def create_essay_writer(max_tokens=None):
+    """Creates the Essay Writer agent."""
+    from crewai import Agent # Deferred heavy import
+    return Agent(
+        role='Job Application Essay Writer',
+        goal='Generate compelling short essay answers for job application questions based on the candidate\'s resume, the job description, and specific user instructions or prompts. If the resume lacks details, formulate relevant questions to ask the user or generate plausible examples based on the indicated experience level.',
+        backstory=(
+            "You are a skilled writer specializing in professional communication and application materials. "
+            "You can synthesize information from a resume and job description to draft thoughtful responses "
+            "to common application questions (e.g., behavioral questions, situational questions). "
+            "You understand the importance of aligning responses with the candidate's likely experience and the target role. "
+            "If needed, you can prompt the user for specific examples or generate suitable, hypothetical scenarios."
+        ),
+        verbose=True, allow_delegation=False, llm=get_llm(max_tokens)
+    )
 
 # Resume Explainer (no changes needed)
-resume_explainer_agent = Agent(
-    role='Resume Discussion Agent',
-    goal=(
-        "Engage in a conversation with the user about their resume, the job description, the analysis performed, and the modifications suggested. "
-        "Answer user questions clearly and concisely based on the provided context. "
-        "Explain *why* certain changes were made, referencing the job description and analysis. "
-        "CRITICAL: Your primary function is EXPLANATION ONLY. Do NOT offer to make changes or modify the resume text in your response, even if asked. Stick strictly to explaining the existing information."
-    ),
-    backstory=(
-        "You are a helpful AI assistant designed to discuss resume improvements. You have access to the original resume, the target job description, "
-        "an analysis comparing the two, and the latest modified version of the resume. Your primary function is to answer the user's questions about this information, "
-        "such as 'What changes did you make?', 'Why was this section added?', 'Does my resume match requirement X?'. "
-        "Maintain a helpful and conversational tone. You DO NOT perform modifications; another agent handles that separately based on user requests in the chat."
-    ),
-    verbose=True,
-    allow_delegation=False,
-    llm=llm
-)
+def create_resume_explainer(max_tokens=None):
+    """Creates the Resume Discussion (explainer) agent."""
+    from crewai import Agent # Deferred heavy import
+    return Agent(
+        role='Resume Discussion Agent',
+        goal=(
+            "Engage in a conversation with the user about their resume, the job description, the analysis performed, and the modifications suggested. "
+            "Answer user questions clearly and concisely based on the provided context. "
+            "Explain *why* certain changes were made, referencing the job description and analysis. "
+            "CRITICAL: Your primary function is EXPLANATION ONLY. Do NOT offer to make changes or modify the resume text in your response, even if asked. Stick strictly to explaining the existing information."
+        ),
+        backstory=(
+            "You are a helpful AI assistant designed to discuss resume improvements. You have access to the original resume, the target job description, "
+            "an analysis comparing the two, and the latest modified version of the resume. Your primary function is to answer the user's questions about this information, "
+            "such as 'What changes did you make?', 'Why was this section added?', 'Does my resume match requirement X?'. "
+            "Maintain a helpful and conversational tone. You DO NOT perform modifications; another agent handles that separately based on user requests in the chat."
+        ),
+        verbose=True,
+        allow_delegation=False,
+        llm=get_llm(max_tokens)
+    )
 
 
 # --- Define Tasks ---
+def _plan_budget(kind, source_text=None):
+    """
+    The generation budget of a task (see token_budget). The task's agent LLM is built with its
+    max_tokens, and the budget is the task callback, so the actual output length refines the estimate.
+    """
+    return token_budget.plan(kind, source_text, default_max_tokens=DEFAULT_MAX_TOKENS)
+
+# Formatting-marker rules shared by the full-resume and per-section modification tasks
+FORMATTING_MARKER_RULES = (
+    f"**CRITICAL FORMATTING MARKERS**: As you generate the modified resume text, you MUST prefix each distinct element or paragraph with ONE of the following markers on the SAME line, followed by a single space, then the text. Use the most appropriate marker for each line/paragraph:\n"
+    f"   - `{FMT_NAME}`: Candidate's Full Name (e.g., `{FMT_NAME} John Doe`)\n"
+    f"   - `{FMT_CONTACT}`: Contact information line(s) (email, phone, LinkedIn, portfolio) (e.g., `{FMT_CONTACT} john.doe@email.com | linkedin.com/in/johndoe`)\n"
+    f"   - `{FMT_HEADING}`: Major section headings (e.g., EDUCATION, PROJECTS, PROFESSIONAL EXPERIENCE, TECHNICAL SKILLS, CONFERENCE & CERTIFICATION) (e.g., `{FMT_HEADING} EDUCATION`)\n"
+    f"   - `{FMT_SUBHEADING_COMPANY}`: Company Name within experience section (e.g., `{FMT_SUBHEADING_COMPANY} Acme Corporation`)\n"
+    f"   - `{FMT_SUBHEADING_TITLE}`: Job Title within experience section (e.g., `{FMT_SUBHEADING_TITLE} Software Engineer`)\n"
+    f"   - `{FMT_SUBHEADING_PROJECT}`: Project Title within projects section (e.g., `{FMT_SUBHEADING_PROJECT} Resume Analyzer Bot`)\n"
+    f"   - `{FMT_DATES}`: Dates associated with education or experience (e.g., `{FMT_DATES} Sep 2021 – Mar 2024`)\n"
+    f"   - `{FMT_BULLET}`: Bullet point description under experience or projects (MUST start with a bullet character like '*' or '-') (e.g., `{FMT_BULLET} - Developed cool features using Python.`)\n"
+    f"   - `{FMT_NORMAL}`: Any other paragraph or line of text not covered above (e.g., degree name, skills list items not part of bullets). (e.g., `{FMT_NORMAL} MS in Business Analytics`)\n"
+    f"   **Each line or paragraph MUST start with exactly one of these markers.**\n"
+)
+
 
 # Analysis Task (no changes needed)
-def create_analysis_task(resume_content, job_description):
-    """Creates the task for the Resume Analyzer agent."""
+def create_analysis_task(resume_content, job_description, agent=None, output_mode="markers"):
+    """Creates the task for the Resume Analyzer agent (`output_mode` "json" asks for a JSON analysis object)."""
+    from crewai import Task # Deferred heavy import
+    budget = _plan_budget("analysis_json" if output_mode == "json" else "analysis")
+    steps = (
+        f"1. Carefully read the provided resume:\n```\n{resume_content}\n```\n"
+        f"2. Carefully read the provided job description:\n```\n{job_description}\n```\n"
+        f"3. Identify the key skills, qualifications, and experiences mentioned in the job description.\n"
+        f"4. Compare the resume against these requirements.\n"
+        f"5. Summarize the strengths of the resume in relation to the job.\n"
+        f"6. Identify specific gaps, missing keywords, or areas where the resume could be tailored "
+        f"   more effectively for this specific job description.\n"
+        f"7. Present your analysis clearly, focusing on actionable insights for improvement.\n"
+    )
+    if output_mode == "json":
+        return Task(
+            description=steps + f"8. {structured_output.format_instructions(include_analysis=True, include_resume=False)}",
+            expected_output='A single JSON object: {"analysis": {...}}',
+            agent=agent or create_resume_analyzer(budget.max_tokens), callback=budget, human_input=False
+        )
     return Task(
         description=(
-            f"1. Carefully read the provided resume:\n```\n{resume_content}\n```\n"
-            f"2. Carefully read the provided job description:\n```\n{job_description}\n```\n"
-            f"3. Identify the key skills, qualifications, and experiences mentioned in the job description.\n"
-            f"4. Compare the resume against these requirements.\n"
-            f"5. Summarize the strengths of the resume in relation to the job.\n"
-            f"6. Identify specific gaps, missing keywords, or areas where the resume could be tailored "
-            f"   more effectively for this specific job description.\n"
-            f"7. Present your analysis clearly, focusing on actionable insights for improvement.\n"
+            steps +
             f"8. **ABSOLUTELY CRITICAL**: Your response MUST start *immediately* with the start marker '{ANALYSIS_START_MARKER}' on the first line, followed by the analysis content, and end *immediately* with the end marker '{ANALYSIS_END_MARKER}' on the last line. "
             f"   There MUST be NO text, characters, spaces, or newlines before the start marker or after the end marker. "
             f"   Do NOT include *any* conversational phrases, thoughts, greetings, apologies, or explanations outside the markers. The markers and the analysis between them must be the *entirety* of your response."
@@ -277,14 +432,20 @@ def create_analysis_task(resume_content, job_description):
             "[Detailed analysis report content here]\n"
             f"{ANALYSIS_END_MARKER}"
         ),
-        agent=resume_analyzer, human_input=False
+        agent=agent or create_resume_analyzer(budget.max_tokens), callback=budget, human_input=False
     )
 
 # *** MODIFIED TASK FOR RESUME MODIFIER ***
-def create_modification_task(resume_content, job_description, analysis_context=None, user_feedback=None):
-    """Creates the task for the Resume Modifier agent with formatting markers."""
+def create_modification_task(resume_content, job_description, analysis_context=None, user_feedback=None, agent=None, output_mode="markers"):
+    """
+    Creates the task for the Resume Modifier agent with formatting markers (or, with `output_mode`
+    "json", a JSON list of typed resume elements).
+    """
+    from crewai import Task # Deferred heavy import
+    budget = _plan_budget("modification_json" if output_mode == "json" else "modification", resume_content)
     description = (
-        f"You are a Resume Modifier AI. Your ONLY task is to rewrite the provided resume based on the context, adding specific formatting markers.\n"
+        f"You are a Resume Modifier AI. Your ONLY task is to rewrite the provided resume based on the context, "
+        f"{'returning it as structured JSON' if output_mode == 'json' else 'adding specific formatting markers'}.\n"
         f"1. Original resume:\n```\n{resume_content}\n```\n"
         f"2. Target job description:\n```\n{job_description}\n```\n"
     )
@@ -292,21 +453,19 @@ def create_modification_task(resume_content, job_description, analysis_context=N
     if user_feedback: description += f"4. Incorporate these specific user instructions for modification:\n```\n{user_feedback}\n```\n"
     else: description += "4. No specific user instructions provided this time. Modify based on analysis and JD alignment.\n"
     description += (
-        f"5. Modify the original resume text to better align with the job description, incorporating keywords and "
-        f"   highlighting relevant experiences based on the analysis and user instructions (if any).\n"
-        f"6. Focus on enhancing clarity, impact, and relevance.\n"
-        f"7. Ensure the tone remains professional and the information accurate (do not invent experiences).\n"
-        f"8. **CRITICAL FORMATTING MARKERS**: As you generate the modified resume text, you MUST prefix each distinct element or paragraph with ONE of the following markers on the SAME line, followed by a single space, then the text. Use the most appropriate marker for each line/paragraph:\n"
-        f"   - `{FMT_NAME}`: Candidate's Full Name (e.g., `{FMT_NAME} John Doe`)\n"
-        f"   - `{FMT_CONTACT}`: Contact information line(s) (email, phone, LinkedIn, portfolio) (e.g., `{FMT_CONTACT} john.doe@email.com | linkedin.com/in/johndoe`)\n"
-        f"   - `{FMT_HEADING}`: Major section headings (e.g., EDUCATION, PROJECTS, PROFESSIONAL EXPERIENCE, TECHNICAL SKILLS, CONFERENCE & CERTIFICATION) (e.g., `{FMT_HEADING} EDUCATION`)\n"
-        f"   - `{FMT_SUBHEADING_COMPANY}`: Company Name within experience section (e.g., `{FMT_SUBHEADING_COMPANY} Acme Corporation`)\n"
-        f"   - `{FMT_SUBHEADING_TITLE}`: Job Title within experience section (e.g., `{FMT_SUBHEADING_TITLE} Software Engineer`)\n"
-        f"   - `{FMT_SUBHEADING_PROJECT}`: Project Title within projects section (e.g., `{FMT_SUBHEADING_PROJECT} Resume Analyzer Bot`)\n"
-        f"   - `{FMT_DATES}`: Dates associated with education or experience (e.g., `{FMT_DATES} Sep 2021 – Mar 2024`)\n"
-        f"   - `{FMT_BULLET}`: Bullet point description under experience or projects (MUST start with a bullet character like '*' or '-') (e.g., `{FMT_BULLET} - Developed cool features using Python.`)\n"
-        f"   - `{FMT_NORMAL}`: Any other paragraph or line of text not covered above (e.g., degree name, skills list items not part of bullets). (e.g., `{FMT_NORMAL} MS in Business Analytics`)\n"
-        f"   **Each line or paragraph MUST start with exactly one of these markers.**\n"
+        "5. Modify the original resume text to better align with the job description, incorporating keywords and "
+        "   highlighting relevant experiences based on the analysis and user instructions (if any).\n"
+        "6. Focus on enhancing clarity, impact, and relevance.\n"
+        "7. Ensure the tone remains professional and the information accurate (do not invent experiences).\n"
+    )
+    if output_mode == "json":
+        return Task(
+            description=description + f"8. {structured_output.format_instructions(include_analysis=False, include_resume=True)}",
+            expected_output='A single JSON object: {"resume": [{"type": ..., "text": ...}, ...]}',
+            agent=agent or create_resume_modifier(budget.max_tokens), callback=budget, human_input=False
+        )
+    description += (
+        f"8. {FORMATTING_MARKER_RULES}"
         f"9. **ABSOLUTELY CRITICAL OUTPUT ENCLOSURE**: Your *entire* response, including the text with the formatting markers, MUST be enclosed *exactly* like this: {MODIFICATION_START_MARKER}\\n[Formatted text with markers here]\\n{MODIFICATION_END_MARKER}. "
         f"   There MUST be NO text, characters, spaces, or newlines before the start marker or after the end marker. "
         f"   Do NOT include *any* conversational phrases, thoughts, greetings, apologies, or explanations outside the main markers."
@@ -329,13 +488,81 @@ def create_modification_task(resume_content, job_description, analysis_context=N
             f"{FMT_BULLET} - Achieved another thing.\n"
             f"{MODIFICATION_END_MARKER}"
         ),
-        agent=resume_modifier, human_input=False
+        agent=agent or create_resume_modifier(budget.max_tokens), callback=budget, human_input=False
+    )
+
+
+# Section-scoped modification task (rewrites one marked section instead of the whole resume)
+def create_section_modification_task(section_text, job_description, user_feedback, section_label=None, agent=None):
+    """Creates a task that rewrites a single marked resume section according to the user's feedback."""
+    from crewai import Task # Deferred heavy import
+    budget = _plan_budget("section", section_text)
+    description = (
+        f"You are a Resume Modifier AI. Your ONLY task is to rewrite ONE section of an already formatted resume.\n"
+        f"1. The section{f' ({section_label})' if section_label else ''}, with its formatting markers:\n```\n{section_text}\n```\n"
+        f"2. Target job description:\n```\n{job_description}\n```\n"
+        f"3. Apply these specific user instructions, as far as they concern this section:\n```\n{user_feedback}\n```\n"
+        f"4. Change only what the instructions ask for; keep every other line of the section exactly as it is.\n"
+        f"5. Keep the tone professional and the information accurate (do not invent experiences).\n"
+        f"6. **CRITICAL FORMATTING MARKERS**: Every line MUST keep starting with exactly one of the markers used in the section "
+        f"({FMT_NAME}, {FMT_CONTACT}, {FMT_HEADING}, {FMT_SUBHEADING_COMPANY}, {FMT_SUBHEADING_TITLE}, {FMT_SUBHEADING_PROJECT}, {FMT_DATES}, {FMT_BULLET}, {FMT_NORMAL}), "
+        f"followed by a single space and the text. Keep the section's first line (its heading/company/project line) and its markers.\n"
+        f"7. **ABSOLUTELY CRITICAL OUTPUT ENCLOSURE**: Output ONLY the rewritten section, enclosed *exactly* like this: {MODIFICATION_START_MARKER}\\n[Rewritten section]\\n{MODIFICATION_END_MARKER}. "
+        f"   Do NOT output any other part of the resume, and no text before the start marker or after the end marker."
+    )
+    return Task(
+        description=description,
+        expected_output=(
+            f"Only the rewritten section, every line prefixed by its formatting marker, enclosed within the main start/end markers.\n"
+            f"{MODIFICATION_START_MARKER}\n"
+            f"{FMT_SUBHEADING_COMPANY} Example Corp\n"
+            f"{FMT_SUBHEADING_TITLE} Software Engineer\n"
+            f"{FMT_BULLET} - Rephrased bullet.\n"
+            f"{MODIFICATION_END_MARKER}"
+        ),
+        agent=agent or create_resume_modifier(budget.max_tokens), callback=budget, human_input=False
+    )
+
+
+# Per-section tailoring task (used by the per-section modification mode)
+def create_section_tailoring_task(section_text, job_description, section_label=None, analysis_context=None, agent=None):
+    """Creates a task that tailors one plain-text resume section and adds the formatting markers."""
+    from crewai import Task # Deferred heavy import
+    budget = _plan_budget("section", section_text)
+    description = (
+        f"You are a Resume Modifier AI. Your ONLY task is to rewrite ONE section of a resume, adding specific formatting markers.\n"
+        f"1. The original section{f' ({section_label})' if section_label else ''}:\n```\n{section_text}\n```\n"
+        f"2. Target job description:\n```\n{job_description}\n```\n"
+    )
+    if analysis_context: description += f"3. Consider this analysis:\n```\n{analysis_context}\n```\n"
+    else: description += "3. No analysis provided. Modify based on JD alignment.\n"
+    description += (
+        f"4. Modify the section to better align with the job description, incorporating keywords and highlighting relevant experience.\n"
+        f"5. Ensure the tone remains professional and the information accurate (do not invent experiences). Do NOT add a section heading or content from other sections.\n"
+        f"6. {FORMATTING_MARKER_RULES}"
+        f"7. **ABSOLUTELY CRITICAL OUTPUT ENCLOSURE**: Output ONLY the rewritten section, enclosed *exactly* like this: {MODIFICATION_START_MARKER}\\n[Formatted section here]\\n{MODIFICATION_END_MARKER}. "
+        f"   There MUST be NO text before the start marker or after the end marker."
+    )
+    return Task(
+        description=description,
+        expected_output=(
+            f"Only the rewritten section, every line prefixed by a formatting marker, enclosed within the main start/end markers.\n"
+            f"{MODIFICATION_START_MARKER}\n"
+            f"{FMT_SUBHEADING_COMPANY} Example Corp\n"
+            f"{FMT_SUBHEADING_TITLE} Software Engineer\n"
+            f"{FMT_DATES} Jan 2023 - Present\n"
+            f"{FMT_BULLET} - Did something important.\n"
+            f"{MODIFICATION_END_MARKER}"
+        ),
+        agent=agent or create_resume_modifier(budget.max_tokens), callback=budget, human_input=False
     )
 
 
 # Essay Task (no changes needed)
-def create_essay_task(resume_content, job_description, essay_question, user_input=None, experience_level=None):
+def create_essay_task(resume_content, job_description, essay_question, user_input=None, experience_level=None, agent=None):
     """Creates the task for the Essay Writer agent."""
+    from crewai import Task # Deferred heavy import
+    budget = _plan_budget("essay")
     description = (
         f"You are an Essay Writer AI. Your ONLY task is to EITHER write an essay answering the question OR ask a clarifying question.\n"
         f"Essay Question: '{essay_question}'\n\n"
@@ -363,26 +590,47 @@ def create_essay_task(resume_content, job_description, essay_question, user_inpu
             f"Example 1: {ESSAY_START_MARKER}\n[Essay text here]\n{ESSAY_END_MARKER}\n"
             "Example 2: QUESTION: [Your question here]"
         ),
-        agent=essay_writer, human_input=False
+        agent=agent or create_essay_writer(budget.max_tokens), callback=budget, human_input=False
     )
 
 # Explanation Task (no changes needed)
-def create_explanation_task(user_query, original_resume, job_description, analysis, modified_resume):
-    """Creates the task for the Resume Explainer Agent."""
+def create_explanation_task(user_query, original_resume, job_description, analysis, modified_resume, agent=None, resume_changes=None, chat_context=None):
+    """
+    Creates the task for the Resume Explainer Agent. With `resume_changes` (a resume_diff prompt
+    text), the diff replaces the two full resumes in the context. With `chat_context` (from a
+    chat_session.ChatSession), its document digests and conversation history replace everything.
+    """
+    from crewai import Task # Deferred heavy import
+    budget = _plan_budget("explanation")
     # Note: Explanation agent is allowed to be more conversational, no strict markers needed,
     # but still needs to avoid offering modifications.
+    if chat_context:
+        resume_context = f"1. Chat Context (document digests and the conversation so far):\n```\n{chat_context}\n```\n\n"
+        changes_instruction = "explain *what* was changed (see 'Changes made to the resume') and *why*, referencing the analysis and job description digests and the earlier conversation"
+    elif resume_changes:
+        resume_context = (
+            f"1. Changes made to the resume (original -> modified, per section):\n```\n{resume_changes}\n```\n"
+            f"2. Job Description:\n```\n{job_description}\n```\n"
+            f"3. Analysis Performed:\n```\n{analysis}\n```\n\n"
+        )
+        changes_instruction = "explain *what* was changed (see 'Changes made to the resume') and *why*, referencing the 'Analysis Performed' and 'Job Description'"
+    else:
+        resume_context = (
+            f"1. Original Resume:\n```\n{original_resume}\n```\n"
+            f"2. Job Description:\n```\n{job_description}\n```\n"
+            f"3. Analysis Performed:\n```\n{analysis}\n```\n"
+            f"4. Modified Resume:\n```\n{modified_resume}\n```\n\n"
+        )
+        changes_instruction = "explain *what* was changed in the 'Modified Resume' compared to the 'Original Resume' and *why*, referencing the 'Analysis Performed' and 'Job Description'"
     return Task(
         description=(
             f"The user is asking about their resume and the changes made. \n"
             f"User's Query: '{user_query}'\n\n"
             f"Use the following context to answer the user's query:\n"
-            f"1. Original Resume:\n```\n{original_resume}\n```\n"
-            f"2. Job Description:\n```\n{job_description}\n```\n"
-            f"3. Analysis Performed:\n```\n{analysis}\n```\n"
-            f"4. Modified Resume:\n```\n{modified_resume}\n```\n\n"
+            f"{resume_context}"
             f"Instructions:\n"
             f"- Directly address the user's query ('{user_query}').\n"
-            f"- If asked about changes, explain *what* was changed in the 'Modified Resume' compared to the 'Original Resume' and *why*, referencing the 'Analysis Performed' and 'Job Description'.\n"
+            f"- If asked about changes, {changes_instruction}.\n"
             f"- If asked about specific parts of the resume or analysis, provide relevant information from the context.\n"
             f"- Maintain a helpful, clear, and conversational tone.\n"
             f"- Keep the answer concise and focused on the user's question.\n"
@@ -395,43 +643,298 @@ def create_explanation_task(user_query, original_resume, job_description, analys
             "'Based on the analysis and the job description's focus on X, I modified the skills section to include keywords like Y and Z, and expanded on Project A to better highlight your experience with tool B mentioned in the requirements.' "
             "The output should NOT contain any modified resume text or offers to make changes."
         ),
-        agent=resume_explainer_agent, human_input=False
+        agent=agent or create_resume_explainer(budget.max_tokens), callback=budget, human_input=False
     )
 
 
-# --- Crew Definitions ---
-# Crew for the initial analysis and modification run
-resume_improvement_crew = Crew(
-    agents=[resume_analyzer, resume_modifier],
-    tasks=[], # Tasks are set dynamically
-    process=Process.sequential,
-    verbose=True
-)
+# Task sets shared by the sync (crew) and async (direct) runners
+def _create_improvement_tasks(resume_content, job_description, output_mode="markers"):
+    """Creates the independent [analysis, modification] task pair for the initial (parallel) run."""
+    analysis_task = create_analysis_task(resume_content, job_description, output_mode=output_mode)
+    # Pass analysis_context=None for the initial modification
+    modification_task = create_modification_task(resume_content, job_description, analysis_context=None, user_feedback=None, output_mode=output_mode)
+    return [analysis_task, modification_task]
+
+def _create_feedback_modification_task(resume_content, job_description, analysis_context, user_feedback, output_mode="markers"):
+    """Creates the modification task that incorporates chat feedback."""
+    # Clean up analysis context if it still has markers
+    clean_analysis = extract_content(analysis_context, ANALYSIS_START_MARKER, ANALYSIS_END_MARKER) or analysis_context
+    # Create the modification task with the feedback (this task now includes marker instructions)
+    return create_modification_task(resume_content, job_description, clean_analysis, user_feedback, output_mode=output_mode)
+
+def _create_explanation_task_from_context(user_query, original_resume, job_description, analysis, modified_resume, chat_context=None):
+    """Creates the explanation task after stripping the main markers from the context."""
+    if chat_context:
+        return create_explanation_task(user_query, None, None, None, None, chat_context=chat_context)
+    # Clean up context from markers before sending to explainer agent
+    # Use the main markers here, not the internal formatting ones
+    clean_analysis = extract_content(analysis, ANALYSIS_START_MARKER, ANALYSIS_END_MARKER) or analysis
+    clean_modified_resume = extract_content(modified_resume, MODIFICATION_START_MARKER, MODIFICATION_END_MARKER) or modified_resume
+    diff = _resume_diff(original_resume, modified_resume, job_description)
+    resume_changes = diff.to_prompt_text() if diff is not None else None
+    return create_explanation_task(user_query, original_resume, job_description, clean_analysis, clean_modified_resume, resume_changes=resume_changes)
+
+def _resume_diff(original_resume, modified_resume, job_description):
+    """The cached section/bullet diff of the modified resume, or None if it has no usable marked block."""
+    if not modified_resume or modified_resume.startswith(("(", "Error")):
+        return None
+    block = extract_content(modified_resume, MODIFICATION_START_MARKER, MODIFICATION_END_MARKER) or modified_resume
+    return resume_diff.diff_resumes(original_resume, block, job_description)
 
-# Crew for generating essay answers
-essay_writing_crew = Crew(
-    agents=[essay_writer],
-    tasks=[], # Task set dynamically
-    process=Process.sequential,
-    verbose=True
-)
+def _answer_from_resume_diff(user_query, original_resume, job_description, modified_resume):
+    """Answers 'what did you change?' questions locally from the resume diff (None if the LLM is needed)."""
+    if not resume_diff.is_change_summary_question(user_query):
+        return None
+    diff = _resume_diff(original_resume, modified_resume, job_description)
+    if diff is None:
+        return None
+    log.info("Answering change-summary question from the local resume diff.")
+    telemetry.annotate(explanation="local_diff")
+    return diff.summary()
 
-# Crew for handling explanations in the chat window
-explanation_crew = Crew(
-    agents=[resume_explainer_agent],
-    tasks=[], # Task set dynamically
-    process=Process.sequential,
-    verbose=True
-)
+def _plan_section_edit(current_modified_block, user_feedback):
+    """
+    Returns (sections, target_indices) when the feedback only concerns a few sections of the
+    current marked resume, or None when the whole resume has to be regenerated.
+    """
+    if not current_modified_block or current_modified_block.startswith(("(", "Error")):
+        return None
+    block = extract_content(current_modified_block, MODIFICATION_START_MARKER, MODIFICATION_END_MARKER) or current_modified_block
+    sections = resume_sections.split_marked_sections(block)
+    if len(sections) < 2:
+        return None
+    targets = resume_sections.find_sections_for_feedback(sections, user_feedback)
+    if not targets:
+        return None
+    log.info(f"Feedback scoped to {len(targets)} of {len(sections)} sections: {[sections[i].label for i in targets]}")
+    return sections, targets
 
-# Crew specifically for modifying the resume based on feedback (used by chat)
-# Note: This reuses the resume_modifier agent but runs it in isolation.
-feedback_modification_crew = Crew(
-    agents=[resume_modifier],
-    tasks=[], # Task set dynamically
-    process=Process.sequential,
-    verbose=True
-)
+def _create_section_edit_tasks(sections, targets, job_description, user_feedback):
+    """Creates one section modification task per targeted section."""
+    return [create_section_modification_task(sections[i].text, job_description, user_feedback, sections[i].label) for i in targets]
+
+def _plan_sectioned_modification(resume_content):
+    """
+    Splits the plain resume into sections (from its shared resume model) and returns (sections,
+    indices of the sections the modifier has to tailor). Headings and short headers are marked
+    locally instead.
+    """
+    sections = resume_model.parse(resume_content, marked=False).to_sections()
+    targets = [
+        i for i, section in enumerate(sections)
+        if section.kind in ("entry", "section") or (section.kind == "header" and len(section.lines) > MAX_LOCAL_HEADER_LINES)
+    ]
+    log.info(f"Per-section modification: {len(sections)} sections, {len(targets)} to tailor.")
+    return sections, targets
+
+def _create_section_tailoring_tasks(sections, targets, job_description, analysis_context=None):
+    """Creates one tailoring task per targeted section."""
+    return [create_section_tailoring_task(sections[i].text, job_description, sections[i].label, analysis_context) for i in targets]
+
+
+# --- Crew Execution ---
+def _crew_total_tokens(crew_result):
+    """Total tokens a crew run reported (None if unknown), used to settle the rate limiter's estimate."""
+    return getattr(getattr(crew_result, "token_usage", None), "total_tokens", None)
+
+def _task_max_tokens(task):
+    """The generation budget a task was planned with (DEFAULT_MAX_TOKENS for tasks without one)."""
+    budget = getattr(task, "callback", None)
+    return getattr(budget, "max_tokens", None) or DEFAULT_MAX_TOKENS
+
+def _report_task_output(task, result):
+    """Hands a direct (streamed/async) call's result to the task callback, as a crew does with its TaskOutput."""
+    if callable(getattr(task, "callback", None)):
+        try:
+            task.callback(result)
+        except Exception as e:
+            log.warning(f"Task callback failed: {e}")
+
+def _fresh_tasks(tasks):
+    """
+    New Task objects with the same definition as `tasks` (all tasks here are built from description,
+    expected_output, agent and callback), bound to copies of their agents (crewai's Agent.copy(),
+    which shares the LLM client). One copy per distinct agent, so shared agents stay shared.
+    """
+    from crewai import Task # Deferred heavy import
+    agent_copies = {}
+    fresh = []
+    for task in tasks:
+        if id(task.agent) not in agent_copies:
+            agent_copies[id(task.agent)] = task.agent.copy()
+        fresh.append(Task(
+            description=task.description, expected_output=task.expected_output,
+            agent=agent_copies[id(task.agent)], callback=task.callback, human_input=False
+        ))
+    return fresh
+
+def _kickoff_crew(tasks, crew_label):
+    """
+    Runs the given tasks on a fresh sequential Crew and returns the raw output string.
+    A new crew per call means concurrent runs never share task lists or agent state.
+    Returns None if the crew result has an unexpected format.
+    """
+    from crewai import Crew, Process # Deferred heavy import
+    http_pool.install() # Crew LLM calls go through LiteLLM; share its keep-alive pool
+    attempts = []
+
+    def kickoff():
+        # A retry runs copies of the tasks and agents on a new crew, so nothing the failed attempt
+        # left on them (task outputs, the agents' executors and token counters) carries over
+        attempt_tasks = _fresh_tasks(tasks) if attempts else tasks
+        attempts.append(attempt_tasks)
+        agents = []
+        for task in attempt_tasks:
+            if task.agent not in agents:
+                agents.append(task.agent)
+        return Crew(agents=agents, tasks=attempt_tasks, process=Process.sequential, verbose=True).kickoff()
+
+    # The crew is admitted (and retried on 429/timeouts) by the shared rate limiter as a whole,
+    # reserving one request and the full generation budget per task.
+    estimated_tokens = sum(rate_limiter.estimate_tokens(task.description, _task_max_tokens(task)) for task in tasks)
+    crew_result = rate_limiter.call(kickoff, estimated_tokens=estimated_tokens, requests=len(tasks), usage=_crew_total_tokens)
+    log.info(f"{crew_label} crew finished.")
+    usage = getattr(crew_result, "token_usage", None)
+    if usage is not None:
+        telemetry.record_llm_call(
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+            calls=getattr(usage, "successful_requests", None) or len(tasks),
+        )
+
+    # Process the result (might be a string or an object)
+    if hasattr(crew_result, 'raw') and isinstance(crew_result.raw, str):
+        return crew_result.raw
+    if isinstance(crew_result, str):
+        log.warning(f"{crew_label} crew kickoff returned string directly.")
+        return crew_result
+    log.error(f"Unexpected result type from {crew_label} crew: {type(crew_result)}")
+    return None
+
+
+# --- Sync Dispatch ---
+def _execute_tasks(tasks, label, on_chunk=None, output_format=None):
+    """
+    Runs tasks for the sync run_* functions and returns the raw output of the last task.
+    With `on_chunk`, the tasks are streamed straight from the LLM and every token chunk is
+    passed to the callback as it arrives; otherwise they run on an isolated crew.
+    `output_format` ("analysis", "resume" or "essay") lets a stream stop at its end marker and
+    be cancelled (and restarted) as soon as it breaks the marker contract.
+    """
+    if on_chunk is None:
+        return _kickoff_crew(tasks, label)
+    return _stream_tasks(tasks, label, on_chunk, output_format)
+
+def _stream_parser(output_format):
+    """A fresh incremental marker checker for a streamed output of the given format (None: unchecked)."""
+    if output_format == "analysis":
+        return MarkerStreamParser(ANALYSIS_START_MARKER, ANALYSIS_END_MARKER)
+    if output_format == "resume":
+        return MarkerStreamParser(MODIFICATION_START_MARKER, MODIFICATION_END_MARKER, line_pattern=resume_sections.MARKER_PATTERN)
+    if output_format == "essay":
+        return MarkerStreamParser(ESSAY_START_MARKER, ESSAY_END_MARKER, alternative_prefixes=("QUESTION:",))
+    return None
+
+def _stream_task(task, context, label, on_chunk, output_format):
+    """Streams one task; a generation that breaks the marker contract is cancelled and restarted."""
+    messages = _task_messages(task, context)
+    for attempt in range(STREAM_FORMAT_RETRIES + 1):
+        parser = _stream_parser(output_format)
+        result = llm_client.stream_complete(
+            messages,
+            model=DEFAULT_MODEL_NAME,
+            max_tokens=_task_max_tokens(task),
+            temperature=DEFAULT_TEMPERATURE,
+            api_key=_require_api_key(),
+            on_chunk=on_chunk,
+            monitor=parser.feed if parser else None,
+        )
+        if parser is None or parser.violation is None:
+            if result.stopped_early:
+                log.info(f"{label}: stream stopped at the end marker.")
+            _report_task_output(task, result)
+            return result.text
+        log.warning(f"{label}: cancelled the stream after {len(result.text)} characters ({parser.violation}).")
+        telemetry.annotate(stream_abort=parser.violation)
+        if attempt < STREAM_FORMAT_RETRIES:
+            telemetry.record_retry()
+            on_chunk("\n\n[Output did not follow the required format; retrying...]\n\n")
+    return result.text # Left to the local repair / re-wrap path
+
+def _stream_tasks(tasks, label, on_chunk, output_format=None):
+    """Streaming counterpart of _ainvoke_tasks (same sequential context hand-off)."""
+    outputs = []
+    for task in tasks:
+        context = "\n\n----------\n\n".join(outputs) if outputs else None
+        if outputs:
+            on_chunk("\n\n") # Keep consecutive task outputs visually separate
+        outputs.append(_stream_task(task, context, label, on_chunk, output_format))
+    log.info(f"{label} streamed run finished.")
+    return outputs[-1] if outputs else None
+
+
+def _execute_task_groups(task_groups, label, max_workers=DEFAULT_SECTION_WORKERS, on_result=None):
+    """
+    Runs independent task lists concurrently, each on its own isolated crew, and returns their
+    raw outputs in the order of `task_groups` (None for a group that failed).
+    `on_result(index, raw_output)` is called from the calling thread as each group finishes.
+    """
+    raw_outputs = [None] * len(task_groups)
+    if not task_groups:
+        return raw_outputs
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(task_groups))), thread_name_prefix="task-group") as executor:
+        # Each group runs in its own copy of this context, so its calls count towards this run's telemetry
+        future_to_index = {
+            executor.submit(contextvars.copy_context().run, _kickoff_crew, tasks, f"{label} [{index + 1}/{len(task_groups)}]"): index
+            for index, tasks in enumerate(task_groups)
+        }
+        for future in as_completed(future_to_index):
+            index = future_to_index[future]
+            try:
+                raw_outputs[index] = future.result()
+            except Exception as e:
+                log.error(f"{label} group {index + 1} failed: {e}", exc_info=True)
+            if on_result:
+                on_result(index, raw_outputs[index])
+    return raw_outputs
+
+
+# --- Direct (Async) Execution ---
+def _task_messages(task, context=None):
+    """Renders a Task and its agent's persona as chat messages for a direct LLM call."""
+    agent = task.agent
+    system_prompt = f"You are {agent.role}. {agent.backstory}\nYour personal goal is: {agent.goal}"
+    user_prompt = (
+        f"Current Task: {task.description}\n\n"
+        f"This is the expected criteria for your final answer: {task.expected_output}"
+    )
+    if context:
+        user_prompt += f"\n\nThis is the context you're working with:\n{context}"
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+async def _ainvoke_tasks(tasks, label):
+    """
+    Async counterpart of _kickoff_crew. Runs the tasks in order with non-blocking LLM calls,
+    handing earlier outputs to later tasks as context (as Process.sequential does), and
+    returns the last task's output.
+    """
+    outputs = []
+    for task in tasks:
+        context = "\n\n----------\n\n".join(outputs) if outputs else None
+        result = await llm_client.acomplete(
+            _task_messages(task, context),
+            model=DEFAULT_MODEL_NAME,
+            max_tokens=_task_max_tokens(task),
+            temperature=DEFAULT_TEMPERATURE,
+            api_key=_require_api_key(),
+        )
+        _report_task_output(task, result)
+        outputs.append(result.text)
+    log.info(f"{label} async run finished.")
+    return outputs[-1] if outputs else None
 
 
 # --- Helper Function for Extraction ---
@@ -497,113 +1000,690 @@ def clean_raw_output(raw_output):
     return cleaned_output
 
 
-# --- Main Execution Functions ---
+# --- Output Repair ---
+# Tier 1 fixes malformed output locally (truncated/missing main markers, unmarked resume lines).
+# Tier 2, used only when extraction still fails, is one small "re-wrap only" LLM call that puts
+# the existing output into the required format instead of rerunning the whole crew.
+_EXTRACTION_FAILURE_PREFIXES = (
+    "(Modification block could not be extracted",
+    "(Modification block extraction failed",
+    "(Modification markers missing",
+    "(Analysis could not be extracted",
+    "(Analysis extraction failed",
+    "(No markers found",
+    "Error: AI failed to generate essay in the expected format",
+)
+REWRAP_MAX_INPUT_CHARS = 24000 # Longer outputs are not worth re-wrapping
+
+def _repair_enclosure(text, start_marker, end_marker, boundary_markers=(), wrap_marked=False):
+    """Tier-1 repair of one main marker pair; returns the text unchanged if it cannot be fixed."""
+    repaired = output_repair.repair_marker_pair(text, start_marker, end_marker, boundary_markers)
+    if repaired is None and wrap_marked:
+        repaired = output_repair.wrap_marked_lines(text, start_marker, end_marker)
+    if repaired is not None and repaired != text:
+        telemetry.annotate(repair="local")
+        return repaired
+    return text
+
+def _repair_analysis_modification_markers(text):
+    """Tier-1 repair of both the modification and the analysis marker pairs."""
+    text = _repair_enclosure(text, MODIFICATION_START_MARKER, MODIFICATION_END_MARKER, (ANALYSIS_START_MARKER, ANALYSIS_END_MARKER), wrap_marked=True)
+    return _repair_enclosure(text, ANALYSIS_START_MARKER, ANALYSIS_END_MARKER, (MODIFICATION_START_MARKER, MODIFICATION_END_MARKER))
+
+def _repair_line_markers(block):
+    """Tier-1 repair of resume lines that lack a formatting marker."""
+    repaired_block, fixed = output_repair.ensure_line_markers(block)
+    if fixed:
+        telemetry.annotate(repair="local")
+    return repaired_block
+
+def _is_extraction_failure(result):
+    """True if a processed result (or any element of a result tuple) is an extraction placeholder."""
+    if isinstance(result, tuple):
+        return any(_is_extraction_failure(item) for item in result)
+    return isinstance(result, str) and result.startswith(_EXTRACTION_FAILURE_PREFIXES)
+
+def _rewrap_format(kind):
+    """Describes the required output format for a re-wrap call of the given kind."""
+    resume_format = (
+        f"{MODIFICATION_START_MARKER}\n[the resume, every line starting with exactly one of "
+        f"{FMT_NAME}, {FMT_CONTACT}, {FMT_HEADING}, {FMT_SUBHEADING_COMPANY}, {FMT_SUBHEADING_TITLE}, "
+        f"{FMT_SUBHEADING_PROJECT}, {FMT_DATES}, {FMT_BULLET}, {FMT_NORMAL}]\n{MODIFICATION_END_MARKER}"
+    )
+    if kind == "analysis_modification":
+        return f"{ANALYSIS_START_MARKER}\n[the analysis]\n{ANALYSIS_END_MARKER}\n\n{resume_format}"
+    if kind == "essay":
+        return f"{ESSAY_START_MARKER}\n[the essay]\n{ESSAY_END_MARKER}"
+    return resume_format
 
-# Function to run the initial analysis and modification sequence
-def run_resume_analysis_and_modification(resume_content, job_description):
-    """Runs the sequential process of analyzing and then modifying the resume."""
-    log.info("Starting resume analysis and modification process...")
-    analysis_result = "(Analysis failed)" # Default error values
-    modified_resume_text = "(Modification failed)"
+def _rewrap_request(raw_result_string, kind):
+    """
+    Builds (chat messages, token_budget.Budget) for a re-wrap call, or None if the output is not
+    worth re-wrapping. The budget is sized to the text being re-wrapped.
+    """
+    cleaned = clean_raw_output(raw_result_string) if raw_result_string else ""
+    if not cleaned.strip() or cleaned.startswith("(Agent Error:") or len(cleaned) > REWRAP_MAX_INPUT_CHARS:
+        return None
+    messages = [
+        {"role": "system", "content": "You are a formatting assistant. You re-wrap text in a required format without changing its wording."},
+        {"role": "user", "content": (
+            f"The text below does not follow the required output format.\n"
+            f"Required format:\n{_rewrap_format(kind)}\n\n"
+            f"Re-output the SAME content in exactly that format. Do not add, remove or rephrase anything, "
+            f"and output nothing before the first marker or after the last one.\n\n"
+            f"Text:\n```\n{cleaned}\n```"
+        )},
+    ]
+    return messages, _plan_budget("rewrap", cleaned)
 
+def _process_with_repair(raw_result_string, process, kind):
+    """
+    Runs `process` on the raw output; if extraction still fails after the local repairs, makes
+    one re-wrap call and processes its output instead (keeping the original result if that fails too).
+    """
+    result = process(raw_result_string)
+    if not _is_extraction_failure(result):
+        return result
+    request = _rewrap_request(raw_result_string, kind)
+    if request is None:
+        return result
+    messages, budget = request
+    log.warning(f"Extraction failed for {kind} output; trying a re-wrap call instead of a full rerun.")
+    telemetry.record_retry()
     try:
-        # Create the tasks for the crew
-        analysis_task = create_analysis_task(resume_content, job_description)
-        # Pass analysis_context=None for the initial modification
-        modification_task = create_modification_task(resume_content, job_description, analysis_context=None, user_feedback=None)
-        resume_improvement_crew.tasks = [analysis_task, modification_task]
-
-        # Execute the crew
-        crew_result = resume_improvement_crew.kickoff()
-        log.info("Resume improvement crew finished.")
-
-        # Process the result (might be a string or an object)
-        raw_result_string = ""
-        if hasattr(crew_result, 'raw') and isinstance(crew_result.raw, str):
-            raw_result_string = crew_result.raw
-        elif isinstance(crew_result, str):
-            raw_result_string = crew_result
-            log.warning("crew.kickoff() returned string directly.")
-        else:
-            log.error(f"Unexpected result type from crew.kickoff(): {type(crew_result)}")
-            error_msg = "Error: Unexpected result format from AI agents."
-            return error_msg, error_msg # Return error for both
-
-        log.debug(f"Raw crew result string (analysis+modification):\n{raw_result_string[:500]}...")
-
-        # ** Clean the raw output first **
-        cleaned_result_string = clean_raw_output(raw_result_string)
-        if cleaned_result_string.startswith("(Agent Error:"): # Check if cleaning detected only filler
-             log.error("Agent output cleaning failed.")
-             return cleaned_result_string, cleaned_result_string # Return the specific error
-
-        log.debug(f"Cleaned crew result string:\n{cleaned_result_string[:500]}...")
-
-        # --- Extraction Logic on Cleaned String ---
-        analysis_result = None
-        modified_resume_text = None # This will store the text *with* the formatting markers now
-        modification_start_index = cleaned_result_string.find(MODIFICATION_START_MARKER)
-        modification_end_index = -1
-        analysis_start_index = cleaned_result_string.find(ANALYSIS_START_MARKER)
-        analysis_end_index = -1
-
-        # 1. Try to find modification markers (enclosing the formatted text)
-        if modification_start_index != -1:
-            modification_end_index = cleaned_result_string.find(MODIFICATION_END_MARKER, modification_start_index + len(MODIFICATION_START_MARKER))
-            if modification_end_index != -1:
-                # Extract the content *including* the inner formatting markers
-                modified_resume_text = cleaned_result_string[modification_start_index + len(MODIFICATION_START_MARKER):modification_end_index].strip()
-                log.info("Successfully extracted modification block (with formatting markers) using main markers.")
-                # If modification found, assume text before it is analysis
-                analysis_part = cleaned_result_string[:modification_start_index].strip()
-                # Try to extract analysis from this part using markers
-                analysis_result = extract_content(analysis_part, ANALYSIS_START_MARKER, ANALYSIS_END_MARKER)
-                if analysis_result is None:
-                    log.warning("Modification markers found, but analysis markers missing in the preceding text. Using preceding text as analysis (fallback).")
-                    # Fallback: Use the text before modification as analysis, wrap it for consistency
-                    if analysis_part: # Only wrap if there's content
-                         analysis_result = f"{ANALYSIS_START_MARKER}\n{analysis_part}\n{ANALYSIS_END_MARKER}"
-                    else:
-                         analysis_result = "(Analysis part before modification was empty)"
-                         log.warning("Analysis part before modification markers was empty.")
+        rewrapped = llm_client.complete(messages, model=DEFAULT_MODEL_NAME, max_tokens=budget.max_tokens, temperature=0.0, api_key=_require_api_key())
+    except Exception as e:
+        log.error(f"Re-wrap call failed: {e}", exc_info=True)
+        return result
+    budget(rewrapped)
+    return _accept_rewrap(result, process(rewrapped.text), kind)
+
+async def _aprocess_with_repair(raw_result_string, process, kind):
+    """Async counterpart of _process_with_repair."""
+    result = process(raw_result_string)
+    if not _is_extraction_failure(result):
+        return result
+    request = _rewrap_request(raw_result_string, kind)
+    if request is None:
+        return result
+    messages, budget = request
+    log.warning(f"Extraction failed for {kind} output; trying a re-wrap call instead of a full rerun.")
+    telemetry.record_retry()
+    try:
+        rewrapped = await llm_client.acomplete(messages, model=DEFAULT_MODEL_NAME, max_tokens=budget.max_tokens, temperature=0.0, api_key=_require_api_key())
+    except Exception as e:
+        log.error(f"Re-wrap call failed: {e}", exc_info=True)
+        return result
+    budget(rewrapped)
+    return _accept_rewrap(result, process(rewrapped.text), kind)
+
+def _accept_rewrap(original_result, rewrapped_result, kind):
+    if _is_extraction_failure(rewrapped_result):
+        log.warning(f"Re-wrap call did not fix the {kind} output.")
+        return original_result
+    log.info(f"Re-wrap call repaired the {kind} output.")
+    telemetry.annotate(repair="rewrap")
+    return rewrapped_result
+
+
+# --- Response Cache ---
+# Identical (task kind, inputs, model, temperature, max_tokens) runs are answered from here
+# instead of the NIM endpoint. Set JOB_APP_DISABLE_CACHE=1 to always call the model.
+response_cache = TieredCache(
+    "responses",
+    enabled=os.getenv("JOB_APP_DISABLE_CACHE", "").strip().lower() not in ("1", "true", "yes")
+)
+
+# Arguments that do not affect the output and are left out of the cache key
+_UNCACHED_ARGUMENTS = ("on_chunk",)
+
+# Concurrent identical runs (double-clicks, duplicate batch items) share one execution
+in_flight_runs = SingleFlight("agent runs")
+
+def _normalize_input(value):
+    """Line endings and trailing whitespace never change the answer, so they never split a key."""
+    if not isinstance(value, str):
+        return value
+    return "\n".join(line.rstrip() for line in value.replace("\r\n", "\n").replace("\r", "\n").strip().split("\n"))
+
+def _is_cacheable_result(result):
+    """Only successful outputs are cached; placeholders and error strings must be retried."""
+    if isinstance(result, (tuple, list)):
+        return bool(result) and all(_is_cacheable_result(item) for item in result)
+    return isinstance(result, str) and bool(result.strip()) and not result.startswith(("(", "Error"))
+
+def _cached_run(kind):
+    """
+    Decorator that serves repeat calls of a run_* (or async arun_*) function from `response_cache`.
+    Calls that miss the cache while an identical call is running attach to it via `in_flight_runs`
+    instead of starting a second crew (an attached caller's on_chunk is not called).
+    Every call is also recorded as one telemetry run of the given kind.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def lookup(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            inputs = {name: _normalize_input(value) for name, value in bound.arguments.items() if name not in _UNCACHED_ARGUMENTS}
+            cache_key = make_cache_key(kind, PROMPT_VERSION, inputs, _active_model_name(), DEFAULT_TEMPERATURE, token_budget.budget_mode(DEFAULT_MAX_TOKENS))
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                log.info(f"Response cache hit for {kind} ({cache_key[:12]}).")
+                cached = tuple(cached) if isinstance(cached, list) else cached # JSON turns tuples into lists
+            return cache_key, cached
+
+        def store(cache_key, result):
+            successful = _is_cacheable_result(result)
+            telemetry.annotate(success=successful) # run_* report failures as placeholder/error strings
+            truncated = telemetry.current_field("truncated")
+            if successful and truncated:
+                # Repaired output of a task that hit its budget; the next run gets a larger budget
+                log.info(f"Not caching the {kind} result: a {truncated} task hit its max_tokens budget.")
+            elif successful:
+                response_cache.put(cache_key, list(result) if isinstance(result, tuple) else result)
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with telemetry.track_run(kind, _active_model_name()):
+                    cache_key, cached = lookup(args, kwargs)
+                    telemetry.annotate(cache="hit" if cached is not None else "miss")
+                    if cached is not None:
+                        return cached
+                    result, shared = await in_flight_runs.ado(cache_key, lambda: func(*args, **kwargs))
+                    if shared:
+                        telemetry.annotate(cache="coalesced", success=_is_cacheable_result(result))
+                        return result
+                    store(cache_key, result)
+                    return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with telemetry.track_run(kind, _active_model_name()):
+                cache_key, cached = lookup(args, kwargs)
+                telemetry.annotate(cache="hit" if cached is not None else "miss")
+                if cached is not None:
+                    return cached
+                result, shared = in_flight_runs.do(cache_key, lambda: func(*args, **kwargs))
+                if shared:
+                    telemetry.annotate(cache="coalesced", success=_is_cacheable_result(result))
+                    return result
+                store(cache_key, result)
+                return result
+        return wrapper
+    return decorator
+
+def get_cache_stats():
+    """Returns hit/miss counters for the response cache."""
+    return response_cache.stats()
+
+def get_coalescing_stats():
+    """Returns how many run_* calls executed and how many attached to an identical in-flight call."""
+    return in_flight_runs.stats()
+
+def get_rate_limiter_stats():
+    """Returns the shared rate limiter's counters and current concurrency limit."""
+    return rate_limiter.get_limiter().stats()
+
+def get_token_budget_stats():
+    """Returns the per-task-kind output-length estimates behind the adaptive max_tokens budgets."""
+    return token_budget.get_model().stats()
+
+def get_telemetry_summary():
+    """Returns per-run-kind latency/token percentiles and counters (see telemetry.summary)."""
+    return telemetry.summary()
+
+
+# --- Output Processing (shared by sync and async runners) ---
+def _process_analysis_modification_output(raw_result_string):
+    """Extracts (analysis, modified resume block) from the raw analysis+modification output."""
+    if raw_result_string is None:
+        telemetry.annotate(extraction="failure")
+        error_msg = "Error: Unexpected result format from AI agents."
+        return error_msg, error_msg # Return error for both
+
+    log.debug(f"Raw crew result string (analysis+modification):\n{raw_result_string[:500]}...")
+
+    # ** Clean the raw output first **
+    cleaned_result_string = clean_raw_output(raw_result_string)
+    if cleaned_result_string.startswith("(Agent Error:"): # Check if cleaning detected only filler
+         log.error("Agent output cleaning failed.")
+         telemetry.annotate(extraction="failure")
+         return cleaned_result_string, cleaned_result_string # Return the specific error
+
+    # Tier-1 repair of truncated or missing main markers
+    cleaned_result_string = _repair_analysis_modification_markers(cleaned_result_string)
+    log.debug(f"Cleaned crew result string:\n{cleaned_result_string[:500]}...")
+
+    # --- Extraction Logic on Cleaned String ---
+    analysis_result = None
+    modified_resume_text = None # This will store the text *with* the formatting markers now
+    modification_start_index = cleaned_result_string.find(MODIFICATION_START_MARKER)
+    modification_end_index = -1
+    analysis_start_index = cleaned_result_string.find(ANALYSIS_START_MARKER)
+    analysis_end_index = -1
+
+    # 1. Try to find modification markers (enclosing the formatted text)
+    if modification_start_index != -1:
+        modification_end_index = cleaned_result_string.find(MODIFICATION_END_MARKER, modification_start_index + len(MODIFICATION_START_MARKER))
+        if modification_end_index != -1:
+            # Extract the content *including* the inner formatting markers
+            modified_resume_text = _repair_line_markers(cleaned_result_string[modification_start_index + len(MODIFICATION_START_MARKER):modification_end_index].strip())
+            log.info("Successfully extracted modification block (with formatting markers) using main markers.")
+            # If modification found, assume text before it is analysis
+            analysis_part = cleaned_result_string[:modification_start_index].strip()
+            # Try to extract analysis from this part using markers
+            analysis_result = extract_content(analysis_part, ANALYSIS_START_MARKER, ANALYSIS_END_MARKER)
+            if analysis_result is None:
+                log.warning("Modification markers found, but analysis markers missing in the preceding text. Using preceding text as analysis (fallback).")
+                telemetry.annotate(extraction="fallback")
+                # Fallback: Use the text before modification as analysis, wrap it for consistency
+                if analysis_part: # Only wrap if there's content
+                     analysis_result = f"{ANALYSIS_START_MARKER}\n{analysis_part}\n{ANALYSIS_END_MARKER}"
                 else:
-                    log.info("Successfully extracted analysis using markers from text before modification.")
+                     analysis_result = "(Analysis part before modification was empty)"
+                     log.warning("Analysis part before modification markers was empty.")
             else:
-                log.warning("Found modification start marker but no end marker in cleaned output.")
-                # Modification extraction failed here
-
-        # 2. If modification wasn't found (or markers were incomplete), try finding analysis markers in the whole cleaned string
-        if modified_resume_text is None:
-            log.info("Modification block not extracted. Attempting to extract analysis from full cleaned output.")
-            analysis_result = extract_content(cleaned_result_string, ANALYSIS_START_MARKER, ANALYSIS_END_MARKER)
-            if analysis_result is not None:
-                log.info("Successfully extracted analysis using markers (modification likely failed or missing markers).")
-                modified_resume_text = "(Modification block could not be extracted - check markers)" # Set modification placeholder
-            else:
-                log.warning("Could not extract analysis OR modification block using markers from the full cleaned output.")
-                analysis_result = "(Analysis could not be extracted - check markers)"
-                modified_resume_text = "(Modification block could not be extracted - check markers)"
-                # Add more details for debugging
-                if len(cleaned_result_string) < 200: # If output is short, maybe it's just an error message
-                     analysis_result = f"(No markers found in cleaned output: {cleaned_result_string})"
-                     modified_resume_text = f"(No markers found in cleaned output: {cleaned_result_string})"
-
-
-        # Final checks and defaults
-        if analysis_result is None: analysis_result = "(Analysis extraction failed)"
-        if modified_resume_text is None: modified_resume_text = "(Modification block extraction failed)"
-
-        # Basic check for error keywords in results
-        if "error" in analysis_result.lower() or "exception" in analysis_result.lower():
-            log.warning(f"Analysis result seems to contain an error message: {analysis_result[:100]}...")
-        if "error" in modified_resume_text.lower() or "exception" in modified_resume_text.lower():
-            log.warning(f"Modification result seems to contain an error message: {modified_resume_text[:100]}...")
-
-        log.info(f"Final Analysis Result Length: {len(analysis_result)}")
-        log.info(f"Final Modification Block Length: {len(modified_resume_text)}")
-        # Return the analysis (with markers) and the modified resume block (with internal formatting markers)
-        return analysis_result, modified_resume_text
+                log.info("Successfully extracted analysis using markers from text before modification.")
+                telemetry.annotate(extraction="markers")
+        else:
+            log.warning("Found modification start marker but no end marker in cleaned output.")
+            # Modification extraction failed here
+
+    # 2. If modification wasn't found (or markers were incomplete), try finding analysis markers in the whole cleaned string
+    if modified_resume_text is None:
+        log.info("Modification block not extracted. Attempting to extract analysis from full cleaned output.")
+        analysis_result = extract_content(cleaned_result_string, ANALYSIS_START_MARKER, ANALYSIS_END_MARKER)
+        if analysis_result is not None:
+            log.info("Successfully extracted analysis using markers (modification likely failed or missing markers).")
+            telemetry.annotate(extraction="partial")
+            modified_resume_text = "(Modification block could not be extracted - check markers)" # Set modification placeholder
+        else:
+            log.warning("Could not extract analysis OR modification block using markers from the full cleaned output.")
+            telemetry.annotate(extraction="failure")
+            analysis_result = "(Analysis could not be extracted - check markers)"
+            modified_resume_text = "(Modification block could not be extracted - check markers)"
+            # Add more details for debugging
+            if len(cleaned_result_string) < 200: # If output is short, maybe it's just an error message
+                 analysis_result = f"(No markers found in cleaned output: {cleaned_result_string})"
+                 modified_resume_text = f"(No markers found in cleaned output: {cleaned_result_string})"
+
+
+    # Final checks and defaults
+    if analysis_result is None: analysis_result = "(Analysis extraction failed)"
+    if modified_resume_text is None: modified_resume_text = "(Modification block extraction failed)"
+
+    # Basic check for error keywords in results
+    if "error" in analysis_result.lower() or "exception" in analysis_result.lower():
+        log.warning(f"Analysis result seems to contain an error message: {analysis_result[:100]}...")
+    if "error" in modified_resume_text.lower() or "exception" in modified_resume_text.lower():
+        log.warning(f"Modification result seems to contain an error message: {modified_resume_text[:100]}...")
+
+    log.info(f"Final Analysis Result Length: {len(analysis_result)}")
+    log.info(f"Final Modification Block Length: {len(modified_resume_text)}")
+    # Return the analysis (with markers) and the modified resume block (with internal formatting markers)
+    return analysis_result, modified_resume_text
+
+
+def _process_feedback_modification_output(raw_result_string):
+    """Extracts the modified resume block from the raw feedback-modification output."""
+    if raw_result_string is None:
+        return "Error: Unexpected result format from AI agent."
+
+    log.debug(f"Raw feedback modification result string:\n{raw_result_string[:500]}...")
+
+    # ** Clean the raw output first **
+    cleaned_result_string = clean_raw_output(raw_result_string)
+    if cleaned_result_string.startswith("(Agent Error:"): # Check if cleaning detected only filler
+         log.error("Agent output cleaning failed (feedback mod).")
+         return cleaned_result_string # Return the specific error
+
+    log.debug(f"Cleaned feedback modification result string:\n{cleaned_result_string[:500]}...")
+
+    # Tier-1 repair of truncated or missing main markers
+    cleaned_result_string = _repair_enclosure(cleaned_result_string, MODIFICATION_START_MARKER, MODIFICATION_END_MARKER, wrap_marked=True)
+    # Extract the modified resume block *with formatting markers* using the main markers
+    modified_resume_block = extract_content(cleaned_result_string, MODIFICATION_START_MARKER, MODIFICATION_END_MARKER)
+    if modified_resume_block is not None:
+        modified_resume_block = _repair_line_markers(modified_resume_block)
+
+    if modified_resume_block is not None:
+        log.info("Successfully extracted modified resume block (with formatting markers) from feedback run.")
+        # Basic check for errors within the block
+        if "error" in modified_resume_block.lower() or "exception" in modified_resume_block.lower():
+             log.warning(f"Feedback modification block seems to contain an error message: {modified_resume_block[:100]}...")
+        return modified_resume_block # Return the block with internal markers
+    else:
+        # Fallback if main markers are missing in the cleaned string
+        log.warning("Could not find main start/end markers in cleaned modification feedback output.")
+        # Check if the cleaned output *looks* like it contains the formatting markers
+        if any(marker in cleaned_result_string for marker in [FMT_NAME, FMT_HEADING, FMT_BULLET]):
+            log.warning("Cleaned output seems to contain formatting markers but lacks main enclosure. Returning cleaned string.")
+            return cleaned_result_string # Return the full cleaned string as a fallback
+        else:
+            log.warning("Cleaned output does not look like formatted resume text. Returning full cleaned result string as error/unexpected output.")
+            return f"(Modification markers missing in cleaned agent output: {cleaned_result_string[:100]}...)"
+
+
+def _process_json_analysis_modification_output(raw_result_string):
+    """
+    JSON-mode counterpart of _process_analysis_modification_output: one parse of the (joined)
+    stage outputs into (analysis text, marked resume block). Output that is not valid JSON goes
+    through the marker extraction instead (models sometimes fall back to it, and so do re-wraps).
+    """
+    try:
+        document = structured_output.parse_document(raw_result_string, require_resume=True)
+    except structured_output.StructuredOutputError as e:
+        log.warning(f"JSON output rejected ({e}); trying marker extraction instead.")
+        return _process_analysis_modification_output(raw_result_string)
+    if document["repaired"]:
+        telemetry.annotate(repair="local")
+    modified_resume_text = structured_output.elements_to_marked_text(document["resume"])
+    if document["analysis"] is None:
+        log.warning("JSON output has a resume but no analysis.")
+        telemetry.annotate(extraction="partial")
+        return "(Analysis could not be extracted - missing in JSON output)", modified_resume_text
+    telemetry.annotate(extraction="json")
+    log.info(f"Parsed JSON output: {len(document['resume'])} resume elements.")
+    return structured_output.analysis_to_text(document["analysis"]), modified_resume_text
+
+def _process_json_feedback_modification_output(raw_result_string):
+    """JSON-mode counterpart of _process_feedback_modification_output (marker fallback as above)."""
+    try:
+        document = structured_output.parse_document(raw_result_string, require_resume=True)
+    except structured_output.StructuredOutputError as e:
+        log.warning(f"JSON output rejected ({e}); trying marker extraction instead.")
+        return _process_feedback_modification_output(raw_result_string)
+    if document["repaired"]:
+        telemetry.annotate(repair="local")
+    return structured_output.elements_to_marked_text(document["resume"])
+
+def _analysis_modification_processor(output_mode):
+    return _process_json_analysis_modification_output if output_mode == "json" else _process_analysis_modification_output
+
+def _feedback_modification_processor(output_mode):
+    return _process_json_feedback_modification_output if output_mode == "json" else _process_feedback_modification_output
+
+
+def _process_section_output(raw_result_string):
+    """Returns the rewritten marked section from a section-edit output, or None if it is unusable."""
+    if raw_result_string is None:
+        return None
+    cleaned_result_string = clean_raw_output(raw_result_string)
+    if cleaned_result_string.startswith("(Agent Error:"):
+        return None
+    cleaned_result_string = _repair_enclosure(cleaned_result_string, MODIFICATION_START_MARKER, MODIFICATION_END_MARKER)
+    section_text = extract_content(cleaned_result_string, MODIFICATION_START_MARKER, MODIFICATION_END_MARKER) or cleaned_result_string
+    first_line = next((line for line in section_text.splitlines() if line.strip()), "")
+    if not resume_sections.MARKER_PATTERN.match(first_line):
+        log.warning(f"Section edit output does not start with a formatting marker: {first_line[:100]}")
+        return None
+    return _repair_line_markers(section_text.strip())
+
+def _splice_section_outputs(sections, targets, raw_outputs):
+    """Replaces the targeted sections with their rewrites; returns the full block, or None if any rewrite is unusable."""
+    section_texts = [section.text for section in sections]
+    for index, raw_output in zip(targets, raw_outputs):
+        rewritten = _process_section_output(raw_output)
+        if rewritten is None:
+            log.warning(f"Section edit for '{sections[index].label}' produced no usable output.")
+            return None
+        section_texts[index] = rewritten
+    return resume_sections.join_sections(section_texts)
+
+
+def _process_analysis_output(raw_result_string):
+    """Extracts the analysis from the raw output of an analysis task run on its own."""
+    if raw_result_string is None:
+        return "Error: Unexpected result format from AI agent."
+    cleaned_result_string = clean_raw_output(raw_result_string)
+    if cleaned_result_string.startswith("(Agent Error:"):
+        return cleaned_result_string
+    cleaned_result_string = _repair_enclosure(cleaned_result_string, ANALYSIS_START_MARKER, ANALYSIS_END_MARKER)
+    analysis_result = extract_content(cleaned_result_string, ANALYSIS_START_MARKER, ANALYSIS_END_MARKER)
+    if analysis_result is None:
+        log.warning("Analysis markers missing in analysis output. Using the cleaned output as analysis (fallback).")
+        return f"{ANALYSIS_START_MARKER}\n{cleaned_result_string}\n{ANALYSIS_END_MARKER}"
+    return analysis_result
+
+def _stitch_sectioned_outputs(sections, targets, raw_outputs):
+    """
+    Stitches tailored sections and locally marked ones back together in original order.
+    A section whose rewrite is unusable keeps its original text (marked locally).
+    """
+    rewrites = dict(zip(targets, raw_outputs))
+    section_texts = []
+    for index, section in enumerate(sections):
+        rewritten = _process_section_output(rewrites[index]) if index in rewrites else None
+        if index in rewrites and rewritten is None:
+            log.warning(f"Tailoring of section '{section.label}' failed; keeping the original text.")
+        section_texts.append(rewritten or resume_sections.mark_plain_section(section))
+    return resume_sections.join_sections(section_texts)
+
+
+def _process_essay_output(raw_result_string):
+    """Returns the essay text (or the agent's clarifying QUESTION) from the raw essay output."""
+    if raw_result_string is None:
+        return "Error: Unexpected result format from AI agent."
+
+    log.debug(f"Raw essay result string:\n{raw_result_string[:500]}...")
+
+    # ** Clean the raw output first **
+    cleaned_result_string = clean_raw_output(raw_result_string)
+    if cleaned_result_string.startswith("(Agent Error:"): # Check if cleaning detected only filler
+         log.error("Agent output cleaning failed (essay).")
+         return cleaned_result_string # Return the specific error
+
+    log.debug(f"Cleaned essay result string:\n{cleaned_result_string[:500]}...")
+
+
+    # Check if the agent returned a question (check cleaned string)
+    if cleaned_result_string.strip().startswith("QUESTION:"):
+        log.info("Agent returned a question.")
+        return cleaned_result_string.strip() # Return the question directly
+
+    # Otherwise, try to extract the essay using markers from the cleaned string (after tier-1 repair)
+    cleaned_result_string = _repair_enclosure(cleaned_result_string, ESSAY_START_MARKER, ESSAY_END_MARKER)
+    essay_text = extract_content(cleaned_result_string, ESSAY_START_MARKER, ESSAY_END_MARKER)
+
+    if essay_text is not None:
+        log.info("Successfully extracted essay.")
+        return essay_text
+    else:
+        # Handle failure to follow format
+        log.error(f"Essay agent failed to follow output format (markers/QUESTION prefix missing in cleaned output). Cleaned Output: {cleaned_result_string}")
+        # Provide a user-friendly error
+        return "Error: AI failed to generate essay in the expected format. Please try again or rephrase."
+
+
+def _process_explanation_output(raw_result_string):
+    """Returns the cleaned explanation text from the raw explainer output."""
+    if raw_result_string is None:
+        return "Error: Could not get explanation from AI."
+    explanation_text = raw_result_string.strip()
+
+    log.debug(f"Raw explanation result string:\n{explanation_text}")
 
+    # Clean filler from explanation output as well
+    cleaned_explanation = clean_raw_output(explanation_text)
+    log.debug(f"Cleaned explanation result string:\n{cleaned_explanation}")
+
+    # Remove the check that was truncating explanations
+    # if MODIFICATION_START_MARKER in cleaned_explanation:
+    #      log.warning("Explanation agent might have included resume text (marker found). Returning empty string.")
+    #      return "(Explanation potentially corrupted, contained modification markers)"
+
+    return cleaned_explanation # Return cleaned explanation
+
+
+# --- Analysis/Modification Stages ---
+def _join_stage_outputs(raw_analysis, raw_modification):
+    """Joins the stage outputs into one string for _process_analysis_modification_output."""
+    if raw_analysis:
+        # Repair the analysis enclosure on its own, so a missing end marker cannot swallow modifier output
+        raw_analysis = _repair_enclosure(raw_analysis, ANALYSIS_START_MARKER, ANALYSIS_END_MARKER)
+    present = [raw for raw in (raw_analysis, raw_modification) if raw]
+    return "\n\n".join(present) if present else None
+
+def _analysis_context_from_raw(raw_analysis):
+    """Returns the analysis text (without markers) to hand to the modifier, or None."""
+    if not raw_analysis:
+        return None
+    try:
+        document = structured_output.parse_document(raw_analysis, require_analysis=True)
+        return structured_output.analysis_to_text(document["analysis"])
+    except structured_output.StructuredOutputError:
+        pass # Marker output (or broken JSON): handled below
+    cleaned = clean_raw_output(raw_analysis)
+    if cleaned.startswith("(Agent Error:"):
+        return None
+    cleaned = _repair_enclosure(cleaned, ANALYSIS_START_MARKER, ANALYSIS_END_MARKER)
+    return extract_content(cleaned, ANALYSIS_START_MARKER, ANALYSIS_END_MARKER) or cleaned
+
+def _validate_execution_mode(execution_mode):
+    if execution_mode not in EXECUTION_MODES:
+        raise ValueError(f"Unknown execution mode {execution_mode!r}; expected one of {EXECUTION_MODES}.")
+
+def _validate_output_mode(output_mode):
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode {output_mode!r}; expected one of {OUTPUT_MODES}.")
+
+def _run_improvement_stages(resume_content, job_description, execution_mode, on_chunk=None, output_mode="markers"):
+    """
+    Runs the analysis and modification stages and returns their joined raw output.
+    In parallel mode the analysis runs on a background crew while the modification runs (and
+    streams) on the calling thread, so the run takes about as long as the slower stage.
+    """
+    # JSON output has no markers for the stream parser to follow
+    analysis_format, resume_format = ("analysis", "resume") if output_mode == "markers" else (None, None)
+    if execution_mode == "sequential":
+        analysis_task = create_analysis_task(resume_content, job_description, output_mode=output_mode)
+        raw_analysis = _execute_tasks([analysis_task], "Resume analysis", on_chunk, analysis_format)
+        if on_chunk:
+            on_chunk("\n\n") # Keep the two stages visually separate
+        modification_task = create_modification_task(resume_content, job_description, analysis_context=_analysis_context_from_raw(raw_analysis), output_mode=output_mode)
+        raw_modification = _execute_tasks([modification_task], "Resume modification", on_chunk, resume_format)
+        return _join_stage_outputs(raw_analysis, raw_modification)
+
+    analysis_task, modification_task = _create_improvement_tasks(resume_content, job_description, output_mode)
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="analysis") as executor:
+        # Run in a copy of this context so the analysis crew's calls count towards this run's telemetry
+        analysis_future = executor.submit(contextvars.copy_context().run, _kickoff_crew, [analysis_task], "Resume analysis")
+        raw_modification = _execute_tasks([modification_task], "Resume modification", on_chunk, resume_format)
+        raw_analysis = analysis_future.result()
+    return _join_stage_outputs(raw_analysis, raw_modification)
+
+async def _arun_improvement_stages(resume_content, job_description, execution_mode, output_mode="markers"):
+    """Async counterpart of _run_improvement_stages."""
+    if execution_mode == "sequential":
+        analysis_task = create_analysis_task(resume_content, job_description, output_mode=output_mode)
+        raw_analysis = await _ainvoke_tasks([analysis_task], "Resume analysis")
+        modification_task = create_modification_task(resume_content, job_description, analysis_context=_analysis_context_from_raw(raw_analysis), output_mode=output_mode)
+        raw_modification = await _ainvoke_tasks([modification_task], "Resume modification")
+        return _join_stage_outputs(raw_analysis, raw_modification)
+
+    analysis_task, modification_task = _create_improvement_tasks(resume_content, job_description, output_mode)
+    raw_analysis, raw_modification = await asyncio.gather(
+        _ainvoke_tasks([analysis_task], "Resume analysis"),
+        _ainvoke_tasks([modification_task], "Resume modification"),
+    )
+    return _join_stage_outputs(raw_analysis, raw_modification)
+
+
+# --- Per-Section Modification ---
+def _run_sectioned_analysis_and_modification(resume_content, job_description, on_chunk=None, execution_mode=DEFAULT_EXECUTION_MODE):
+    """
+    Runs the analysis and one tailoring task per resume section concurrently and returns
+    (analysis, stitched modified block), or None if the resume has too few sections to split.
+    In sequential mode the analysis runs first and every section task receives its text.
+    """
+    sections, targets = _plan_sectioned_modification(resume_content)
+    if len(targets) < 2:
+        log.info("Resume has too few sections for per-section modification; using the full modification run.")
+        return None
+    analysis_task = create_analysis_task(resume_content, job_description)
+    raw_analysis = None
+    analysis_context = None
+    if execution_mode == "sequential":
+        raw_analysis = _kickoff_crew([analysis_task], "Resume analysis")
+        analysis_context = _analysis_context_from_raw(raw_analysis)
+        task_groups = []
+    else:
+        task_groups = [[analysis_task]]
+    first_section_group = len(task_groups)
+    task_groups += [[task] for task in _create_section_tailoring_tasks(sections, targets, job_description, analysis_context)]
+
+    def report_section(index, raw_output):
+        if on_chunk and index >= first_section_group:
+            on_chunk((_process_section_output(raw_output) or f"({sections[targets[index - first_section_group]].label}: kept as is)") + "\n")
+
+    raw_outputs = _execute_task_groups(task_groups, "Per-section modification", on_result=report_section)
+    if first_section_group:
+        raw_analysis = raw_outputs[0]
+    telemetry.annotate(extraction="sections")
+    return _process_analysis_output(raw_analysis), _stitch_sectioned_outputs(sections, targets, raw_outputs[first_section_group:])
+
+async def _arun_sectioned_analysis_and_modification(resume_content, job_description, execution_mode=DEFAULT_EXECUTION_MODE):
+    """Async counterpart of _run_sectioned_analysis_and_modification."""
+    sections, targets = _plan_sectioned_modification(resume_content)
+    if len(targets) < 2:
+        log.info("Resume has too few sections for per-section modification; using the full modification run.")
+        return None
+    analysis_task = create_analysis_task(resume_content, job_description)
+    analysis_context = None
+    if execution_mode == "sequential":
+        raw_analysis = await _ainvoke_tasks([analysis_task], "Resume analysis")
+        analysis_context = _analysis_context_from_raw(raw_analysis)
+        task_groups = []
+    else:
+        task_groups = [[analysis_task]]
+    first_section_group = len(task_groups)
+    task_groups += [[task] for task in _create_section_tailoring_tasks(sections, targets, job_description, analysis_context)]
+    semaphore = asyncio.Semaphore(DEFAULT_SECTION_WORKERS)
+
+    async def run_group(tasks):
+        async with semaphore:
+            try:
+                return await _ainvoke_tasks(tasks, "Per-section modification")
+            except Exception as e:
+                log.error(f"Per-section modification group failed: {e}", exc_info=True)
+                return None
+
+    raw_outputs = await asyncio.gather(*(run_group(tasks) for tasks in task_groups))
+    if first_section_group:
+        raw_analysis = raw_outputs[0]
+    telemetry.annotate(extraction="sections")
+    return _process_analysis_output(raw_analysis), _stitch_sectioned_outputs(sections, targets, raw_outputs[first_section_group:])
+
+
+# --- Main Execution Functions ---
+
+# Function to run the initial analysis and modification sequence
+@_cached_run("analysis_modification")
+def run_resume_analysis_and_modification(resume_content, job_description, per_section=False, execution_mode=DEFAULT_EXECUTION_MODE, on_chunk=None, output_mode=DEFAULT_OUTPUT_MODE):
+    """
+    Analyzes and modifies the resume. `execution_mode` is "parallel" (both stages at once; the
+    default) or "sequential" (the modifier receives the analysis). See EXECUTION_MODES.
+    Pass `on_chunk` to receive the modification output token by token while it is generated.
+    With `per_section=True` the resume sections are tailored concurrently (alongside the analysis)
+    and stitched back in order; `on_chunk` then receives each tailored section as it completes.
+    `output_mode` "json" has the agents answer in JSON instead of markers (see OUTPUT_MODES);
+    the result has the same shape either way. Per-section tailoring always uses markers.
+    """
+    log.info(f"Starting resume analysis and modification process ({execution_mode})...")
+    try:
+        _validate_execution_mode(execution_mode)
+        _validate_output_mode(output_mode)
+        telemetry.annotate(execution_mode=execution_mode)
+        if per_section:
+            sectioned_result = _run_sectioned_analysis_and_modification(resume_content, job_description, on_chunk, execution_mode)
+            if sectioned_result is not None:
+                return sectioned_result
+        telemetry.annotate(output_mode=output_mode)
+        raw_result_string = _run_improvement_stages(resume_content, job_description, execution_mode, on_chunk, output_mode)
+        return _process_with_repair(raw_result_string, _analysis_modification_processor(output_mode), "analysis_modification")
     except Exception as e:
         log.error(f"Error during resume analysis/modification crew execution: {e}", exc_info=True)
         error_msg = f"Error during analysis/modification: {e}"
@@ -612,172 +1692,253 @@ def run_resume_analysis_and_modification(resume_content, job_description):
 
 
 # Function to run only the modification task, incorporating user feedback from chat
-def run_resume_modification_with_feedback(resume_content, job_description, analysis_context, user_feedback):
-    """Runs only the modification task, incorporating user feedback."""
+@_cached_run("feedback_modification")
+def run_resume_modification_with_feedback(resume_content, job_description, analysis_context, user_feedback, current_modified_block=None, on_chunk=None, output_mode=DEFAULT_OUTPUT_MODE):
+    """
+    Runs only the modification task, incorporating user feedback. `on_chunk` enables streaming.
+    Given the latest marked resume (`current_modified_block`), feedback that concerns only a few
+    sections regenerates just those sections and splices them back into that block.
+    `output_mode` applies to the full regeneration (section edits always use markers).
+    """
     log.info("Starting resume modification process with user feedback...")
     if not user_feedback:
         log.warning("Modification requested but no feedback provided.")
         return "(No feedback provided for modification)"
 
     try:
-        # Clean up analysis context if it still has markers
-        clean_analysis = extract_content(analysis_context, ANALYSIS_START_MARKER, ANALYSIS_END_MARKER) or analysis_context
-
-        # Create the modification task with the feedback (this task now includes marker instructions)
-        modification_task = create_modification_task(
-            resume_content, job_description, clean_analysis, user_feedback
-        )
-        # Use the dedicated crew for this
-        feedback_modification_crew.tasks = [modification_task]
-
-        # Execute the crew
-        crew_result = feedback_modification_crew.kickoff()
-        log.info("Modification with feedback finished.")
-
-        # Process result
-        raw_result_string = ""
-        if hasattr(crew_result, 'raw') and isinstance(crew_result.raw, str):
-            raw_result_string = crew_result.raw
-        elif isinstance(crew_result, str):
-            raw_result_string = crew_result
-            log.warning("Feedback crew kickoff returned string directly.")
-        else:
-            log.error(f"Unexpected result type from feedback crew: {type(crew_result)}")
-            return "Error: Unexpected result format from AI agent."
-
-        log.debug(f"Raw feedback modification result string:\n{raw_result_string[:500]}...")
-
-        # ** Clean the raw output first **
-        cleaned_result_string = clean_raw_output(raw_result_string)
-        if cleaned_result_string.startswith("(Agent Error:"): # Check if cleaning detected only filler
-             log.error("Agent output cleaning failed (feedback mod).")
-             return cleaned_result_string # Return the specific error
-
-        log.debug(f"Cleaned feedback modification result string:\n{cleaned_result_string[:500]}...")
-
-        # Extract the modified resume block *with formatting markers* using the main markers
-        modified_resume_block = extract_content(cleaned_result_string, MODIFICATION_START_MARKER, MODIFICATION_END_MARKER)
-
-        if modified_resume_block is not None:
-            log.info("Successfully extracted modified resume block (with formatting markers) from feedback run.")
-            # Basic check for errors within the block
-            if "error" in modified_resume_block.lower() or "exception" in modified_resume_block.lower():
-                 log.warning(f"Feedback modification block seems to contain an error message: {modified_resume_block[:100]}...")
-            return modified_resume_block # Return the block with internal markers
-        else:
-            # Fallback if main markers are missing in the cleaned string
-            log.warning("Could not find main start/end markers in cleaned modification feedback output.")
-            # Check if the cleaned output *looks* like it contains the formatting markers
-            if any(marker in cleaned_result_string for marker in [FMT_NAME, FMT_HEADING, FMT_BULLET]):
-                log.warning("Cleaned output seems to contain formatting markers but lacks main enclosure. Returning cleaned string.")
-                return cleaned_result_string # Return the full cleaned string as a fallback
-            else:
-                log.warning("Cleaned output does not look like formatted resume text. Returning full cleaned result string as error/unexpected output.")
-                return f"(Modification markers missing in cleaned agent output: {cleaned_result_string[:100]}...)"
-
+        plan = _plan_section_edit(current_modified_block, user_feedback)
+        if plan is not None:
+            sections, targets = plan
+            section_tasks = _create_section_edit_tasks(sections, targets, job_description, user_feedback)
+            if on_chunk is None: # Independent rewrites: run them concurrently, as the async path does
+                raw_outputs = _execute_task_groups([[task] for task in section_tasks], "Section edit")
+            else: # One ordered stream, so the sections are streamed one after another
+                raw_outputs = []
+                for task in section_tasks:
+                    if raw_outputs:
+                        on_chunk("\n\n") # Keep consecutive section rewrites visually separate
+                    raw_outputs.append(_execute_tasks([task], "Section edit", on_chunk, "resume"))
+            merged_block = _splice_section_outputs(sections, targets, raw_outputs)
+            if merged_block is not None:
+                telemetry.annotate(feedback_scope="section")
+                return merged_block
+            log.warning("Section-scoped edit failed; regenerating the whole resume instead.")
+        _validate_output_mode(output_mode)
+        telemetry.annotate(feedback_scope="full", output_mode=output_mode)
+        modification_task = _create_feedback_modification_task(resume_content, job_description, analysis_context, user_feedback, output_mode)
+        raw_result_string = _execute_tasks([modification_task], "Feedback modification", on_chunk, "resume" if output_mode == "markers" else None)
+        return _process_with_repair(raw_result_string, _feedback_modification_processor(output_mode), "modification")
     except Exception as e:
         log.error(f"Error during resume modification with feedback: {e}", exc_info=True)
         return f"Error during modification with feedback: {e}"
 
 
 # Essay generation function (no changes needed for formatting markers)
-def run_essay_generation(resume_content, job_description, essay_question, user_input=None, experience_level=None):
-    """Runs the essay generation task."""
+@_cached_run("essay")
+def run_essay_generation(resume_content, job_description, essay_question, user_input=None, experience_level=None, on_chunk=None):
+    """Runs the essay generation task. `on_chunk` enables streaming."""
     log.info("Starting essay generation process...")
     try:
         task = create_essay_task(resume_content, job_description, essay_question, user_input, experience_level)
-        essay_writing_crew.tasks = [task]
-
-        # Execute the crew
-        crew_result = essay_writing_crew.kickoff()
-        log.info("Essay writing crew execution finished.")
-
-        # Process result
-        raw_result_string = ""
-        if hasattr(crew_result, 'raw') and isinstance(crew_result.raw, str):
-            raw_result_string = crew_result.raw
-        elif isinstance(crew_result, str):
-            raw_result_string = crew_result
-            log.warning("Essay crew kickoff returned string directly.")
-        else:
-            log.error(f"Unexpected result type from essay crew: {type(crew_result)}")
-            return "Error: Unexpected result format from AI agent."
+        raw_result_string = _execute_tasks([task], "Essay writing", on_chunk, "essay")
+        return _process_with_repair(raw_result_string, _process_essay_output, "essay")
+    except Exception as e:
+        log.error(f"Error during essay generation crew execution: {e}", exc_info=True)
+        return f"Error during essay generation: {e}"
 
-        log.debug(f"Raw essay result string:\n{raw_result_string[:500]}...")
 
-        # ** Clean the raw output first **
-        cleaned_result_string = clean_raw_output(raw_result_string)
-        if cleaned_result_string.startswith("(Agent Error:"): # Check if cleaning detected only filler
-             log.error("Agent output cleaning failed (essay).")
-             return cleaned_result_string # Return the specific error
+# Explanation function (no changes needed for formatting markers)
+@_cached_run("explanation")
+def run_explanation(user_query, original_resume, job_description, analysis, modified_resume, on_chunk=None, chat_context=None):
+    """
+    Runs the explanation task to answer user queries about the resume. `on_chunk` enables streaming;
+    `chat_context` (ChatSession.context()) replaces the full documents in the prompt.
+    """
+    log.info(f"Starting explanation process for query: {user_query}")
+    try:
+        local_answer = _answer_from_resume_diff(user_query, original_resume, job_description, modified_resume)
+        if local_answer:
+            if on_chunk:
+                on_chunk(local_answer)
+            return local_answer
+        task = _create_explanation_task_from_context(user_query, original_resume, job_description, analysis, modified_resume, chat_context)
+        raw_result_string = _execute_tasks([task], "Explanation", on_chunk)
+        return _process_explanation_output(raw_result_string)
+    except Exception as e:
+        log.error(f"Error during explanation crew execution: {e}", exc_info=True)
+        return f"Error getting explanation: {e}"
 
-        log.debug(f"Cleaned essay result string:\n{cleaned_result_string[:500]}...")
 
+def summarize_chat_turns(previous_summary, turns):
+    """
+    ChatSession summarizer: folds older (user, agent) turns into the rolling conversation summary
+    with one small completion. Runs on the session's background thread; errors propagate so the
+    session can fall back to its local summary.
+    """
+    transcript = "\n".join(f"User: {user}\nAgent: {agent}" for user, agent in turns)
+    messages = [{"role": "user", "content": (
+        "Update the running summary of a chat between a job seeker and a resume assistant.\n"
+        f"Current summary:\n```\n{previous_summary or '(none)'}\n```\n"
+        f"New turns to add:\n```\n{transcript}\n```\n"
+        f"Return only the updated summary, at most {CHAT_SUMMARY_MAX_TOKENS // 2} words. Keep the user's requests, "
+        "the decisions and changes made, and open questions; drop pleasantries."
+    )}]
+    result = llm_client.complete(messages, model=DEFAULT_MODEL_NAME, max_tokens=CHAT_SUMMARY_MAX_TOKENS, temperature=0.0, api_key=_require_api_key())
+    return result.text.strip()
+
+
+# --- Async Execution Functions ---
+# Same contracts as the run_* functions above, but the LLM calls are awaited on the event loop
+# (no crew, no worker thread), so many requests can be in flight on a single loop.
+
+@_cached_run("analysis_modification")
+async def arun_resume_analysis_and_modification(resume_content, job_description, per_section=False, execution_mode=DEFAULT_EXECUTION_MODE, output_mode=DEFAULT_OUTPUT_MODE):
+    """Async counterpart of run_resume_analysis_and_modification."""
+    log.info(f"Starting async resume analysis and modification process ({execution_mode})...")
+    try:
+        _validate_execution_mode(execution_mode)
+        _validate_output_mode(output_mode)
+        telemetry.annotate(execution_mode=execution_mode)
+        if per_section:
+            sectioned_result = await _arun_sectioned_analysis_and_modification(resume_content, job_description, execution_mode)
+            if sectioned_result is not None:
+                return sectioned_result
+        telemetry.annotate(output_mode=output_mode)
+        raw_result_string = await _arun_improvement_stages(resume_content, job_description, execution_mode, output_mode)
+        return await _aprocess_with_repair(raw_result_string, _analysis_modification_processor(output_mode), "analysis_modification")
+    except Exception as e:
+        log.error(f"Error during async resume analysis/modification: {e}", exc_info=True)
+        error_msg = f"Error during analysis/modification: {e}"
+        return error_msg, error_msg
 
-        # Check if the agent returned a question (check cleaned string)
-        if cleaned_result_string.strip().startswith("QUESTION:"):
-            log.info("Agent returned a question.")
-            return cleaned_result_string.strip() # Return the question directly
 
-        # Otherwise, try to extract the essay using markers from the cleaned string
-        essay_text = extract_content(cleaned_result_string, ESSAY_START_MARKER, ESSAY_END_MARKER)
+@_cached_run("feedback_modification")
+async def arun_resume_modification_with_feedback(resume_content, job_description, analysis_context, user_feedback, current_modified_block=None, output_mode=DEFAULT_OUTPUT_MODE):
+    """Async counterpart of run_resume_modification_with_feedback (section rewrites run concurrently)."""
+    log.info("Starting async resume modification process with user feedback...")
+    if not user_feedback:
+        log.warning("Modification requested but no feedback provided.")
+        return "(No feedback provided for modification)"
+    try:
+        plan = _plan_section_edit(current_modified_block, user_feedback)
+        if plan is not None:
+            sections, targets = plan
+            raw_outputs = await asyncio.gather(*(
+                _ainvoke_tasks([task], "Section edit")
+                for task in _create_section_edit_tasks(sections, targets, job_description, user_feedback)
+            ))
+            merged_block = _splice_section_outputs(sections, targets, raw_outputs)
+            if merged_block is not None:
+                telemetry.annotate(feedback_scope="section")
+                return merged_block
+            log.warning("Section-scoped edit failed; regenerating the whole resume instead.")
+        _validate_output_mode(output_mode)
+        telemetry.annotate(feedback_scope="full", output_mode=output_mode)
+        modification_task = _create_feedback_modification_task(resume_content, job_description, analysis_context, user_feedback, output_mode)
+        raw_result_string = await _ainvoke_tasks([modification_task], "Feedback modification")
+        return await _aprocess_with_repair(raw_result_string, _feedback_modification_processor(output_mode), "modification")
+    except Exception as e:
+        log.error(f"Error during async resume modification with feedback: {e}", exc_info=True)
+        return f"Error during modification with feedback: {e}"
 
-        if essay_text is not None:
-            log.info("Successfully extracted essay.")
-            return essay_text
-        else:
-            # Handle failure to follow format
-            log.error(f"Essay agent failed to follow output format (markers/QUESTION prefix missing in cleaned output). Cleaned Output: {cleaned_result_string}")
-            # Provide a user-friendly error
-            return "Error: AI failed to generate essay in the expected format. Please try again or rephrase."
 
+@_cached_run("essay")
+async def arun_essay_generation(resume_content, job_description, essay_question, user_input=None, experience_level=None):
+    """Async counterpart of run_essay_generation."""
+    log.info("Starting async essay generation process...")
+    try:
+        task = create_essay_task(resume_content, job_description, essay_question, user_input, experience_level)
+        raw_result_string = await _ainvoke_tasks([task], "Essay writing")
+        return await _aprocess_with_repair(raw_result_string, _process_essay_output, "essay")
     except Exception as e:
-        log.error(f"Error during essay generation crew execution: {e}", exc_info=True)
+        log.error(f"Error during async essay generation: {e}", exc_info=True)
         return f"Error during essay generation: {e}"
 
 
-# Explanation function (no changes needed for formatting markers)
-def run_explanation(user_query, original_resume, job_description, analysis, modified_resume):
-    """Runs the explanation task to answer user queries about the resume."""
-    log.info(f"Starting explanation process for query: {user_query}")
+@_cached_run("explanation")
+async def arun_explanation(user_query, original_resume, job_description, analysis, modified_resume, chat_context=None):
+    """Async counterpart of run_explanation."""
+    log.info(f"Starting async explanation process for query: {user_query}")
     try:
-        # Clean up context from markers before sending to explainer agent
-        # Use the main markers here, not the internal formatting ones
-        clean_analysis = extract_content(analysis, ANALYSIS_START_MARKER, ANALYSIS_END_MARKER) or analysis
-        clean_modified_resume = extract_content(modified_resume, MODIFICATION_START_MARKER, MODIFICATION_END_MARKER) or modified_resume
-
-        # Create and run the explanation task
-        task = create_explanation_task(user_query, original_resume, job_description, clean_analysis, clean_modified_resume)
-        explanation_crew.tasks = [task]
-        crew_result = explanation_crew.kickoff()
-        log.info("Explanation crew finished.")
-
-        # Process result
-        explanation_text = ""
-        if hasattr(crew_result, 'raw') and isinstance(crew_result.raw, str):
-            explanation_text = crew_result.raw.strip()
-        elif isinstance(crew_result, str):
-            explanation_text = crew_result.strip()
-            log.warning("Explanation crew kickoff returned string directly.")
-        else:
-            log.error(f"Unexpected result type from explanation crew: {type(crew_result)}")
-            return "Error: Could not get explanation from AI."
+        local_answer = _answer_from_resume_diff(user_query, original_resume, job_description, modified_resume)
+        if local_answer:
+            return local_answer
+        task = _create_explanation_task_from_context(user_query, original_resume, job_description, analysis, modified_resume, chat_context)
+        raw_result_string = await _ainvoke_tasks([task], "Explanation")
+        return _process_explanation_output(raw_result_string)
+    except Exception as e:
+        log.error(f"Error during async explanation: {e}", exc_info=True)
+        return f"Error getting explanation: {e}"
 
-        log.debug(f"Raw explanation result string:\n{explanation_text}")
 
-        # Clean filler from explanation output as well
-        cleaned_explanation = clean_raw_output(explanation_text)
-        log.debug(f"Cleaned explanation result string:\n{cleaned_explanation}")
+# --- Batch Execution ---
+def run_batch_resume_tailoring(resume_content, job_descriptions, max_workers=DEFAULT_BATCH_WORKERS):
+    """
+    Tailors one resume against many job descriptions concurrently.
+    Each job description runs on its own isolated crew; at most `max_workers` run at once.
 
-        # Remove the check that was truncating explanations
-        # if MODIFICATION_START_MARKER in cleaned_explanation:
-        #      log.warning("Explanation agent might have included resume text (marker found). Returning empty string.")
-        #      return "(Explanation potentially corrupted, contained modification markers)"
+    Args:
+        resume_content (str): The original resume text.
+        job_descriptions (list): Job description strings to tailor against.
+        max_workers (int): Upper bound on concurrent crew runs.
 
-        return cleaned_explanation # Return cleaned explanation
-    except Exception as e:
-        log.error(f"Error during explanation crew execution: {e}", exc_info=True)
-        return f"Error getting explanation: {e}"
+    Yields:
+        tuple: (index, job_description, analysis, modified_resume_block) in completion order,
+               where index is the position of the job description in the input list.
+    """
+    job_descriptions = list(job_descriptions)
+    if not job_descriptions:
+        log.warning("Batch tailoring requested with no job descriptions.")
+        return
+    max_workers = max(1, min(int(max_workers or 1), len(job_descriptions)))
+    log.info(f"Starting batch tailoring of {len(job_descriptions)} job description(s) with {max_workers} worker(s)...")
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="batch-tailor")
+    try:
+        futures = {
+            executor.submit(run_resume_analysis_and_modification, resume_content, job_description): index
+            for index, job_description in enumerate(job_descriptions)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                analysis, modified_resume_block = future.result()
+            except Exception as e: # run_* already catches crew errors; this guards anything unexpected
+                log.error(f"Batch item {index} failed: {e}", exc_info=True)
+                analysis = modified_resume_block = f"Error during analysis/modification: {e}"
+            log.info(f"Batch item {index + 1}/{len(job_descriptions)} finished.")
+            yield index, job_descriptions[index], analysis, modified_resume_block
+    finally:
+        # If the caller stops iterating early, drop work that has not started yet
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def arun_batch_resume_tailoring(resume_content, job_descriptions, max_concurrency=DEFAULT_BATCH_WORKERS):
+    """
+    Async counterpart of run_batch_resume_tailoring: all runs share the current event loop,
+    with at most `max_concurrency` LLM calls in flight.
+
+    Yields:
+        tuple: (index, job_description, analysis, modified_resume_block) in completion order.
+    """
+    job_descriptions = list(job_descriptions)
+    if not job_descriptions:
+        log.warning("Async batch tailoring requested with no job descriptions.")
+        return
+    semaphore = asyncio.Semaphore(max(1, int(max_concurrency or 1)))
+
+    async def run_one(index, job_description):
+        async with semaphore:
+            return index, await arun_resume_analysis_and_modification(resume_content, job_description)
+
+    pending = [asyncio.ensure_future(run_one(index, jd)) for index, jd in enumerate(job_descriptions)]
+    try:
+        for next_done in asyncio.as_completed(pending):
+            index, (analysis, modified_resume_block) = await next_done
+            yield index, job_descriptions[index], analysis, modified_resume_block
+    finally:
+        for future in pending:
+            future.cancel()
 
 
 # --- Example Usage (if run directly) ---
@@ -831,5 +1992,14 @@ if __name__ == '__main__':
     essay_with_input = run_essay_generation(dummy_resume, dummy_jd, dummy_essay_q, user_input=dummy_user_essay_input)
     print("\nEssay (With Input):") ; print(essay_with_input)
 
+    print("\n--- Testing Batch Tailoring ---")
+    dummy_jds = [dummy_jd, "Hiring a Data Engineer with Spark, Airflow and strong SQL skills."]
+    for index, jd, batch_analysis, batch_block in run_batch_resume_tailoring(dummy_resume, dummy_jds, max_workers=2):
+        print(f"\nBatch result {index} (JD: {jd[:40]}...):") ; print(batch_block[:300])
+
+    print("\n--- Testing Async Essay Generation ---")
+    essay_async = asyncio.run(arun_essay_generation(dummy_resume, dummy_jd, dummy_essay_q, experience_level=dummy_exp))
+    print("\nEssay (Async):") ; print(essay_async)
+
     print("\n--- Agent tests finished. ---")
 
@@ -0,0 +1,225 @@
+import os
+import time
+import logging
+import http_pool
+import telemetry
+import fake_llm
+import rate_limiter
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+# LiteLLM provider prefix for NVIDIA NIM (the same route crewai uses under the hood)
+NIM_PROVIDER = "nvidia_nim"
+
+
+class CompletionResult:
+    """Text and usage information for a single chat completion."""
+
+    def __init__(self, text, prompt_tokens=None, completion_tokens=None, latency=None, time_to_first_token=None, stopped_early=False):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.latency = latency # Seconds from request start to full response
+        self.time_to_first_token = time_to_first_token # Seconds; only known for streamed calls
+        self.stopped_early = stopped_early # A streamed generation cancelled by its monitor
+
+    def __repr__(self):
+        return (f"CompletionResult(chars={len(self.text)}, prompt_tokens={self.prompt_tokens}, "
+                f"completion_tokens={self.completion_tokens}, latency={self.latency}, "
+                f"time_to_first_token={self.time_to_first_token})")
+
+
+def _litellm():
+    """Imports litellm on first use (it is a heavy import) and routes it through the shared HTTP pool."""
+    import litellm
+    http_pool.install()
+    return litellm
+
+
+def _build_request(messages, model, max_tokens, temperature, api_key):
+    """Builds the keyword arguments for a LiteLLM completion call against NIM."""
+    return {
+        "model": f"{NIM_PROVIDER}/{model}",
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "api_key": api_key or os.getenv("NVIDIA_NIM_API_KEY"),
+    }
+
+
+def _to_result(response, started):
+    """Converts a LiteLLM (OpenAI-shaped) response into a CompletionResult."""
+    text = response.choices[0].message.content or ""
+    usage = getattr(response, "usage", None)
+    return CompletionResult(
+        text,
+        prompt_tokens=getattr(usage, "prompt_tokens", None),
+        completion_tokens=getattr(usage, "completion_tokens", None),
+        latency=time.perf_counter() - started,
+    )
+
+
+def _fake_result(output, started, streamed=False, stopped_early=False):
+    """Converts a fake_llm (text, prompt_tokens, completion_tokens, ttft) tuple into a CompletionResult."""
+    text, prompt_tokens, completion_tokens, time_to_first_token = output
+    return CompletionResult(
+        text,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        latency=time.perf_counter() - started,
+        time_to_first_token=time_to_first_token if streamed else None,
+        stopped_early=stopped_early,
+    )
+
+
+def _record(result):
+    """Reports a finished call's usage to the telemetry record of the surrounding run."""
+    telemetry.record_llm_call(result.prompt_tokens, result.completion_tokens, result.time_to_first_token)
+
+
+def _estimate_tokens(messages, max_tokens):
+    return rate_limiter.estimate_tokens("".join(str(message.get("content", "")) for message in messages), max_tokens)
+
+
+def _total_tokens(result):
+    """Actual usage of a call, used to settle the rate limiter's token estimate (None if unreported)."""
+    if result.prompt_tokens is None and result.completion_tokens is None:
+        return None
+    return (result.prompt_tokens or 0) + (result.completion_tokens or 0)
+
+
+def _complete_once(messages, model, max_tokens, temperature, api_key):
+    started = time.perf_counter()
+    if fake_llm.is_enabled():
+        return _fake_result(fake_llm.complete(messages, max_tokens), started)
+    response = _litellm().completion(**_build_request(messages, model, max_tokens, temperature, api_key))
+    return _to_result(response, started)
+
+
+async def _acomplete_once(messages, model, max_tokens, temperature, api_key):
+    started = time.perf_counter()
+    if fake_llm.is_enabled():
+        return _fake_result(await fake_llm.acomplete(messages, max_tokens), started)
+    litellm = _litellm()
+    http_pool.install_async() # Reuse this event loop's keep-alive connections
+    response = await litellm.acompletion(**_build_request(messages, model, max_tokens, temperature, api_key))
+    return _to_result(response, started)
+
+
+def complete(messages, model, max_tokens, temperature, api_key=None):
+    """
+    Runs a blocking chat completion through the shared rate limiter (rate-limited calls are retried).
+
+    Args:
+        messages (list): OpenAI-style chat messages ({"role": ..., "content": ...}).
+        model (str): NIM model name (without provider prefix).
+        max_tokens (int): Generation cap.
+        temperature (float): Sampling temperature.
+        api_key (str): NIM API key; falls back to NVIDIA_NIM_API_KEY.
+
+    Returns:
+        CompletionResult: The generated text and usage.
+    """
+    result = rate_limiter.call(
+        lambda: _complete_once(messages, model, max_tokens, temperature, api_key),
+        estimated_tokens=_estimate_tokens(messages, max_tokens), usage=_total_tokens
+    )
+    _record(result)
+    log.debug(f"Completion finished: {result}")
+    return result
+
+
+async def acomplete(messages, model, max_tokens, temperature, api_key=None):
+    """Non-blocking counterpart of complete(); awaits the HTTP call on the running event loop."""
+    result = await rate_limiter.acall(
+        lambda: _acomplete_once(messages, model, max_tokens, temperature, api_key),
+        estimated_tokens=_estimate_tokens(messages, max_tokens), usage=_total_tokens
+    )
+    _record(result)
+    log.debug(f"Async completion finished: {result}")
+    return result
+
+
+def stream_complete(messages, model, max_tokens, temperature, api_key=None, on_chunk=None, monitor=None):
+    """
+    Runs a streaming chat completion, calling `on_chunk(text)` for every token chunk as it arrives.
+    The call is admitted by the shared rate limiter but not retried (chunks may already be shown).
+
+    Args:
+        messages, model, max_tokens, temperature, api_key: As for complete().
+        on_chunk (callable): Receives each non-empty text delta. Called on the calling thread.
+        monitor (callable): Also receives each delta; returning True cancels the rest of the
+            generation (e.g. a stream_parser.MarkerStreamParser's feed).
+
+    Returns:
+        CompletionResult: The full generated text, usage (if the provider reports it) and timings.
+    """
+    with rate_limiter.slot(_estimate_tokens(messages, max_tokens)) as lease:
+        result = _stream_once(messages, model, max_tokens, temperature, api_key, on_chunk, monitor)
+        lease.actual_tokens = _total_tokens(result)
+    _record(result)
+    log.debug(f"Streamed completion finished: {result}")
+    return result
+
+
+def _close_stream(stream):
+    """Closes an abandoned LiteLLM stream so its pooled connection is released instead of draining the generation."""
+    for target in (stream, getattr(stream, "completion_stream", None)):
+        close = getattr(target, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                log.debug(f"Closing the cancelled stream failed: {e}")
+            return
+
+
+def _stream_once(messages, model, max_tokens, temperature, api_key, on_chunk, monitor=None):
+    started = time.perf_counter()
+    stopped = []
+
+    def deliver(delta):
+        """Passes a delta on; returns True once the monitor wants the generation cancelled."""
+        if on_chunk:
+            on_chunk(delta)
+        if monitor and monitor(delta):
+            stopped.append(True)
+            return True
+        return False
+
+    if fake_llm.is_enabled():
+        output = fake_llm.complete(messages, max_tokens, on_chunk=deliver)
+        return _fake_result(output, started, streamed=True, stopped_early=bool(stopped))
+
+    request = _build_request(messages, model, max_tokens, temperature, api_key)
+    request["stream"] = True
+    request["stream_options"] = {"include_usage": True} # Usage arrives on the final chunk
+
+    parts = []
+    usage = None
+    first_token_at = None
+    stream = _litellm().completion(**request)
+    for chunk in stream:
+        usage = getattr(chunk, "usage", None) or usage
+        choices = getattr(chunk, "choices", None)
+        delta = getattr(choices[0].delta, "content", None) if choices else None
+        if not delta:
+            continue
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+        parts.append(delta)
+        if deliver(delta):
+            _close_stream(stream)
+            log.info(f"Cancelled streamed generation after {len(parts)} chunks.")
+            break
+
+    return CompletionResult(
+        "".join(parts),
+        prompt_tokens=getattr(usage, "prompt_tokens", None),
+        completion_tokens=getattr(usage, "completion_tokens", None),
+        latency=time.perf_counter() - started,
+        time_to_first_token=(first_token_at - started) if first_token_at is not None else None,
+        stopped_early=bool(stopped),
+    )
@@ -14,6 +14,7 @@ import re # For chat keyword detection
 import utils
 import job_application_agent as agent_runner # Contains all agent functions now
 import config
+import chat_session
 # Removed import form_filler
 
 # --- Configuration & Setup ---
@@ -55,6 +56,8 @@ class JobAppHelperGUI:
         self.user_data = {} # Store as dict (can be used for other purposes if needed)
         self.gui_queue = queue.Queue() # Thread communication
         self.is_task_running = False # Flag to prevent multiple simultaneous tasks
+        self.stream_output = tk.BooleanVar(value=True) # Show AI output token by token while it is generated
+        self.per_section_modification = tk.BooleanVar(value=False) # Tailor resume sections concurrently
 
         # Basic Info Fields REMOVED
         # self.basic_info_vars = { ... }
@@ -64,15 +67,22 @@ class JobAppHelperGUI:
         self.create_widgets()
 
         # Check API Key (critical)
-        if not agent_runner.LOADED_API_KEY:
+        if agent_runner.requires_api_key() and not agent_runner.get_api_key():
              messagebox.showerror("API Key Error", "NVIDIA API Key not found or failed to load. Please ensure a valid key is in your .env file in the application directory.")
              self.root.quit()
              return
 
         # Start queue listener
         self.root.after(100, self.process_gui_queue)
+        # Import crewai/langchain and build the LLM once the window is up, off the GUI thread
+        self.root.after(200, self.start_agent_warm_up)
         log.info("Application initialized.")
 
+    def start_agent_warm_up(self):
+        """Warms the agent backend in a background thread so the first AI run does not pay for it."""
+        thread = threading.Thread(target=agent_runner.warm_up, name="agent-warm-up", daemon=True)
+        thread.start()
+
     def create_widgets(self):
         """Creates and arranges all the GUI elements."""
         log.debug("Creating widgets...")
@@ -122,6 +132,8 @@ class JobAppHelperGUI:
         self.save_mod_button = ttk.Button(action_frame, text="Save Formatted Resume", command=self.save_modified_resume, state=tk.DISABLED); self.save_mod_button.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=3)
         self.chat_button = ttk.Button(action_frame, text="Discuss/Modify via Chat", command=self.open_chat_window, state=tk.DISABLED); self.chat_button.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=3)
         self.essay_button = ttk.Button(action_frame, text="Generate Essay Answer", command=self.open_essay_window); self.essay_button.grid(row=3, column=0, sticky=(tk.W, tk.E), pady=3)
+        ttk.Checkbutton(action_frame, text="Stream AI output", variable=self.stream_output).grid(row=4, column=0, sticky=tk.W, pady=(6, 0))
+        ttk.Checkbutton(action_frame, text="Tailor sections in parallel (long resumes)", variable=self.per_section_modification).grid(row=5, column=0, sticky=tk.W)
 
         # Status Bar
         self.status_label = ttk.Label(main_frame, text="Ready", anchor=tk.W, relief=tk.SUNKEN, padding=(5, 2)); self.status_label.grid(row=5, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(5, 0), padx=5)
@@ -156,6 +168,29 @@ class JobAppHelperGUI:
         except Exception as e:
             log.error(f"Unexpected error updating text widget: {e}", exc_info=True)
 
+    def append_text_widget(self, widget, content):
+        """Safely appends text to the end of a text widget (used for streamed output)."""
+        if not widget or not content:
+            return
+        try:
+            current_state = str(widget.cget("state"))
+            widget.config(state=tk.NORMAL)
+            widget.insert(tk.END, content)
+            widget.see(tk.END)
+            widget.config(state=current_state)
+        except tk.TclError as e:
+            log.warning(f"Error appending to text widget (likely destroyed): {e}")
+
+    def make_stream_callback(self, append_chunk):
+        """
+        Returns an on_chunk callback for the agent functions. It runs on the worker thread,
+        so chunks are handed to `append_chunk` on the GUI thread via gui_queue.
+        Returns None when streaming is switched off.
+        """
+        if not self.stream_output.get():
+            return None
+        return lambda chunk: self.gui_queue.put(("stream_chunk", append_chunk, chunk))
+
     def load_user_data(self):
         """Loads user data from the JSON file (if any other data is stored there)."""
         log.info(f"Attempting to load user data from {USER_DATA_FILE}")
@@ -326,13 +361,23 @@ class JobAppHelperGUI:
         if not job_desc:
             messagebox.showerror("Input Missing", "Please paste the job description first.")
             return
-        if self.run_ai_task_in_thread(self._execute_analysis_modification, original_resume, job_desc):
+        on_chunk = self.make_stream_callback(self.append_modified_resume_chunk)
+        per_section = self.per_section_modification.get()
+        if self.run_ai_task_in_thread(self._execute_analysis_modification, original_resume, job_desc, on_chunk, per_section):
             log.info("Started analysis and modification thread.")
+            if on_chunk:
+                self.update_text_widget(self.modified_resume_text_area, "--- AI OUTPUT (streaming) ---:\n")
 
-    def _execute_analysis_modification(self, original_resume, job_desc):
+    def append_modified_resume_chunk(self, chunk):
+        """Appends a streamed chunk to the Modified Resume / Analysis area."""
+        self.append_text_widget(self.modified_resume_text_area, chunk)
+
+    def _execute_analysis_modification(self, original_resume, job_desc, on_chunk=None, per_section=False):
         log.info("Executing analysis and modification task...")
         try:
-            analysis, modification_block = agent_runner.run_resume_analysis_and_modification(original_resume, job_desc)
+            analysis, modification_block = agent_runner.run_resume_analysis_and_modification(
+                original_resume, job_desc, per_section=per_section, on_chunk=on_chunk
+            )
             self.gui_queue.put(("analysis_modification_complete", analysis, modification_block))
         except Exception as e:
             log.error(f"Error in analysis/modification thread: {e}", exc_info=True)
@@ -405,8 +450,12 @@ class JobAppHelperGUI:
                     self._update_gui_post_feedback(modification_block)
                     self.enable_ai_buttons()
                 elif msg_type == "essay_complete":
-                    _, result = message
+                    _, result, essay_window_instance = message
                     log.info(f"Essay generation result received (handled by EssayWindow): {result[:50]}...")
+                    if essay_window_instance and essay_window_instance.window.winfo_exists():
+                        essay_window_instance._update_gui_post_essay(result)
+                    else:
+                        log.warning("Essay window closed before the essay could be displayed.")
                     self.enable_ai_buttons()
                 elif msg_type == "explanation_complete":
                      _, explanation_text, chat_window_instance = message
@@ -419,6 +468,9 @@ class JobAppHelperGUI:
                     _, error_message = message
                     self._show_error_message(error_message)
                     self.enable_ai_buttons()
+                elif msg_type == "stream_chunk":
+                    _, append_chunk, chunk = message
+                    append_chunk(chunk)
                 elif msg_type == "set_status":
                     _, status_message = message
                     self.set_status(status_message)
@@ -482,6 +534,9 @@ class ChatWindow:
         self.main_app = main_app
         self.analysis_context = analysis_context
         self.modification_context = modification_context
+        self.is_streaming = False # True while an agent answer is being streamed into the chat log
+        self.session = None # chat_session.ChatSession, created with the first message
+        self.pending_query = None # The user message whose answer is outstanding (recorded as a turn on reply)
         self.window = tk.Toplevel(parent)
         self.window.title("Discuss/Modify Resume")
         self.window.geometry("650x550")
@@ -533,6 +588,21 @@ class ChatWindow:
         except Exception as e:
              log.error(f"Unexpected error appending message: {e}", exc_info=True)
 
+    def begin_stream(self):
+        """Starts an 'Agent:' message whose body is filled in chunk by chunk."""
+        self.append_message("Agent", "", "agent")
+        try:
+            self.chat_log.mark_set("stream_start", "end-1c")
+            self.chat_log.mark_gravity("stream_start", tk.LEFT)
+            self.is_streaming = True
+        except tk.TclError as e:
+            log.error(f"Error starting streamed chat message: {e}")
+
+    def append_stream_chunk(self, chunk):
+        """Appends a streamed chunk to the current agent message."""
+        if not self.is_streaming or not self.window.winfo_exists(): return
+        self.main_app.append_text_widget(self.chat_log, chunk)
+
     def submit_chat_message_thread_event(self, event=None):
         self.submit_chat_message_thread()
         return "break"
@@ -549,7 +619,8 @@ class ChatWindow:
         original_resume = self.main_app.resume_content_original.get()
         job_desc = self.main_app.jd_text.get("1.0", tk.END).strip()
         analysis = self.analysis_context
-        modified_resume = self.modification_context
+        # The latest version (chat edits update the main window), so "what changed?" stays current
+        modified_resume = self.main_app.resume_content_modified.get() or self.modification_context
         if not original_resume or not job_desc:
              err_msg = "Missing original resume or job description context. Cannot process chat."
              self.append_message("Error", err_msg, "error")
@@ -562,6 +633,12 @@ class ChatWindow:
              self.append_message("Error", err_msg, "error")
              log.error(err_msg)
              return
+        # Explanations get a bounded context (digests + recent turns + rolling summary), not the full documents
+        if self.session is None:
+            self.session = chat_session.ChatSession(original_resume, job_desc, analysis, modified_resume, summarizer=agent_runner.summarize_chat_turns)
+        else:
+            self.session.update_documents(original_resume, job_desc, analysis, modified_resume)
+        self.pending_query = user_query
         is_explanation_request = False
         query_lower = user_query.lower().strip()
         question_starters = ("what", "why", "how", "explain", "did you", "can you tell me", "tell me about", "is there", "does it", "do you")
@@ -576,32 +653,39 @@ class ChatWindow:
                 log.info("Chat request identified as MODIFICATION (keywords found, not a question).")
         self.submit_button.config(state=tk.DISABLED)
         task_started = False
-        if is_explanation_request:
-             self.append_message("Agent", "Thinking...", "agent")
-             log.info("Routing chat request to explanation agent.")
-             task_started = self.main_app.run_ai_task_in_thread(
-                 self._execute_explanation, user_query, original_resume, job_desc, analysis, modified_resume, self
-             )
-        elif is_modification_request:
+        if is_modification_request:
              self.append_message("Agent", "Processing modification request...", "info")
              log.info("Routing chat request to modification agent.")
+             on_chunk = self.main_app.make_stream_callback(self.main_app.append_modified_resume_chunk)
+             # The latest marked resume lets the agent rewrite only the sections the feedback is about
+             current_block = self.main_app.resume_content_modified.get() if is_mod_valid else None
              task_started = self.main_app.run_ai_task_in_thread(
-                 self._execute_modification_feedback, user_query, original_resume, job_desc, analysis, self
+                 self._execute_modification_feedback, user_query, original_resume, job_desc, analysis, self, on_chunk, current_block
              )
+             if task_started and on_chunk:
+                 self.main_app.update_text_widget(self.main_app.modified_resume_text_area, "--- AI OUTPUT (streaming) ---:\n")
         else:
-             self.append_message("Agent", "Thinking...", "agent")
-             log.info("Chat request intent unclear, defaulting to EXPLANATION.")
+             if is_explanation_request:
+                 log.info("Routing chat request to explanation agent.")
+             else:
+                 log.info("Chat request intent unclear, defaulting to EXPLANATION.")
+             on_chunk = self.main_app.make_stream_callback(self.append_stream_chunk)
+             if not on_chunk:
+                 self.append_message("Agent", "Thinking...", "agent")
              task_started = self.main_app.run_ai_task_in_thread(
-                 self._execute_explanation, user_query, original_resume, job_desc, analysis, modified_resume, self
+                 self._execute_explanation, user_query, original_resume, job_desc, analysis, modified_resume, self, on_chunk, self.session.context()
              )
+             if task_started and on_chunk:
+                 self.begin_stream()
         if not task_started:
+            self.pending_query = None
             self.submit_button.config(state=tk.NORMAL)
 
-    def _execute_explanation(self, user_query, original_resume, job_description, analysis, modified_resume, chat_window_instance):
+    def _execute_explanation(self, user_query, original_resume, job_description, analysis, modified_resume, chat_window_instance, on_chunk=None, chat_context=None):
         log.info("Executing explanation task...")
         explanation_result = "Error: Could not get explanation."
         try:
-            explanation_result = agent_runner.run_explanation(user_query, original_resume, job_description, analysis, modified_resume)
+            explanation_result = agent_runner.run_explanation(user_query, original_resume, job_description, analysis, modified_resume, on_chunk=on_chunk, chat_context=chat_context)
         except Exception as e:
             log.error(f"Error in explanation thread: {e}", exc_info=True)
             explanation_result = f"Sorry, an error occurred while getting the explanation: {e}"
@@ -609,12 +693,13 @@ class ChatWindow:
         finally:
             self.main_app.gui_queue.put(("explanation_complete", explanation_result, chat_window_instance))
 
-    def _execute_modification_feedback(self, user_feedback, original_resume, job_desc, analysis_context, chat_window_instance):
+    def _execute_modification_feedback(self, user_feedback, original_resume, job_desc, analysis_context, chat_window_instance, on_chunk=None, current_block=None):
         log.info("Executing modification task based on chat feedback...")
         modification_result = "Error: Could not perform modification."
         try:
             modification_result = agent_runner.run_resume_modification_with_feedback(
-                original_resume, job_desc, analysis_context, user_feedback
+                original_resume, job_desc, analysis_context, user_feedback,
+                current_modified_block=current_block, on_chunk=on_chunk
             )
             if modification_result is None or modification_result.startswith(("Error:", "(", "Modification markers missing")):
                  log.warning(f"Modification agent returned an issue: {modification_result}")
@@ -640,7 +725,22 @@ class ChatWindow:
         tag = "agent"
         if response.startswith(("Error:", "Sorry,", "(Agent Error:")): tag = "error"
         elif response.startswith(("OK, I've applied", "Processing modification")): tag = "info"
-        self.append_message("Agent", response or "(No response received)", tag)
+        if self.is_streaming:
+            # Replace the raw streamed text with the final cleaned answer
+            self.is_streaming = False
+            try:
+                self.chat_log.config(state=tk.NORMAL)
+                self.chat_log.delete("stream_start", tk.END)
+                self.chat_log.insert(tk.END, response or "(No response received)", (tag,) if tag == "error" else ())
+                self.chat_log.config(state=tk.DISABLED)
+                self.chat_log.see(tk.END)
+            except tk.TclError as e:
+                log.error(f"Error finalizing streamed chat message: {e}")
+        else:
+            self.append_message("Agent", response or "(No response received)", tag)
+        if self.pending_query and self.session and response and tag != "error":
+            self.session.add_turn(self.pending_query, response)
+        self.pending_query = None
         self.submit_button.config(state=tk.NORMAL)
 
     def close_window(self):
@@ -660,6 +760,7 @@ class EssayWindow:
         self.window.protocol("WM_DELETE_WINDOW", self.close_window)
         self.generated_essay = tk.StringVar()
         self.agent_question = tk.StringVar()
+        self.essay_stream_started = False # Cleared per run; first streamed chunk replaces the placeholder
         main_frame = ttk.Frame(self.window, padding="10")
         main_frame.pack(fill=tk.BOTH, expand=True)
         main_frame.columnconfigure(0, weight=1)
@@ -708,19 +809,29 @@ class EssayWindow:
         self.copy_button.config(state=tk.DISABLED)
         self.update_essay_output("Generating essay...") # AttributeError was here
         self.agent_question.set("")
+        self.essay_stream_started = False
+        on_chunk = self.main_app.make_stream_callback(self.append_essay_chunk)
         task_started = self.main_app.run_ai_task_in_thread(
-            self._execute_essay_generation, resume_content, job_desc, essay_question, user_input, experience
+            self._execute_essay_generation, resume_content, job_desc, essay_question, user_input, experience, on_chunk
         )
         if not task_started:
             self.generate_button.config(state=tk.NORMAL)
             self.update_essay_output("")
 
-    def _execute_essay_generation(self, resume_content, job_desc, essay_question, user_input, experience):
+    def append_essay_chunk(self, chunk):
+        """Appends a streamed chunk to the essay output area."""
+        if not self.window.winfo_exists(): return
+        if not self.essay_stream_started:
+            self.essay_stream_started = True
+            self.update_essay_output("")
+        self.main_app.append_text_widget(self.essay_output_text, chunk)
+
+    def _execute_essay_generation(self, resume_content, job_desc, essay_question, user_input, experience, on_chunk=None):
         log.info("Executing essay generation task...")
         try:
-            result = agent_runner.run_essay_generation(resume_content, job_desc, essay_question, user_input or None, experience)
-            self.main_app.gui_queue.put(("essay_complete", result))
-            self.window.after(0, self._update_gui_post_essay, result)
+            result = agent_runner.run_essay_generation(resume_content, job_desc, essay_question, user_input or None, experience, on_chunk=on_chunk)
+            # Queued (not window.after) so the final text lands after any streamed chunks
+            self.main_app.gui_queue.put(("essay_complete", result, self))
         except Exception as e:
             log.error(f"Error in essay generation thread: {e}", exc_info=True)
             self.main_app.gui_queue.put(("task_error", f"Essay generation error: {e}"))
@@ -0,0 +1,117 @@
+import logging
+from resume_sections import (
+    MARKER_PATTERN, BULLET_PATTERN, FMT_BULLET, FMT_HEADING, FMT_NORMAL, looks_like_heading
+)
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+MIN_PARTIAL_MARKER_CHARS = 3 # Shortest truncated marker tail that is still recognized (e.g. "===")
+
+
+def _strip_partial_marker(text, marker):
+    """Removes a truncated copy of `marker` (any prefix of it) from the end of `text`."""
+    stripped = text.rstrip()
+    for length in range(len(marker) - 1, MIN_PARTIAL_MARKER_CHARS - 1, -1):
+        if stripped.endswith(marker[:length]):
+            return stripped[:-length].rstrip()
+    return stripped
+
+
+def repair_marker_pair(text, start_marker, end_marker, boundary_markers=()):
+    """
+    Returns `text` with a complete start/end marker pair around the block, fixing locally what
+    LLMs most often get wrong: a missing or truncated end marker (output cut off, or the next
+    block started early) and a missing start marker.
+
+    Args:
+        text (str): Cleaned agent output.
+        start_marker, end_marker (str): The pair to repair.
+        boundary_markers (tuple): Markers of neighbouring blocks; the repaired block never crosses them.
+
+    Returns:
+        str: The repaired text (unchanged if the pair was already complete), or None if neither
+        marker is present.
+    """
+    start = text.find(start_marker)
+    end = text.find(end_marker, start + len(start_marker) if start != -1 else 0)
+    if start != -1 and end != -1:
+        return text
+
+    if start != -1:
+        # End marker missing: the block runs until the next neighbouring block, or to the end of the text
+        body_start = start + len(start_marker)
+        stops = [index for index in (text.find(marker, body_start) for marker in boundary_markers) if index != -1]
+        stop = min(stops) if stops else len(text)
+        body = _strip_partial_marker(text[body_start:stop], end_marker)
+        log.info(f"Repaired missing end marker '{end_marker}'.")
+        return f"{text[:body_start]}{body}\n{end_marker}\n{text[stop:]}".rstrip()
+
+    if end != -1:
+        # Start marker missing: the block starts after the previous neighbouring block, or at the beginning
+        starts = [index + len(marker) for marker in boundary_markers for index in [text.rfind(marker, 0, end)] if index != -1]
+        begin = max(starts) if starts else 0
+        log.info(f"Repaired missing start marker '{start_marker}'.")
+        return f"{text[:begin]}\n{start_marker}\n{text[begin:end].strip()}\n{text[end:]}".strip()
+
+    return None
+
+
+def wrap_marked_lines(text, start_marker, end_marker):
+    """
+    Encloses the formatting-marked lines of an output that has no enclosing markers at all
+    (e.g. filler or commentary around a correctly formatted resume). Returns None if there are
+    no marked lines.
+    """
+    lines = text.splitlines()
+    marked = [index for index, line in enumerate(lines) if MARKER_PATTERN.match(line)]
+    if not marked:
+        return None
+    first, last = marked[0], marked[-1]
+    # Keep unmarked continuation lines directly after the last marked line
+    while last + 1 < len(lines) and lines[last + 1].strip():
+        last += 1
+    log.info(f"Wrapped {len(marked)} marked lines in '{start_marker}'/'{end_marker}'.")
+    body = "\n".join(lines[first:last + 1])
+    return "\n".join(lines[:first] + [start_marker, body, end_marker] + lines[last + 1:])
+
+
+def ensure_line_markers(block):
+    """
+    Prefixes every non-empty line of a resume block that lacks a formatting marker:
+    bullets get FMT_BULLET, heading-like lines FMT_HEADING and anything else FMT_NORMAL.
+
+    Returns:
+        tuple: (repaired block, number of lines fixed).
+    """
+    fixed = 0
+    repaired_lines = []
+    for line in block.splitlines():
+        if not line.strip() or MARKER_PATTERN.match(line):
+            repaired_lines.append(line)
+            continue
+        if BULLET_PATTERN.match(line):
+            marker = FMT_BULLET
+        elif looks_like_heading(line):
+            marker = FMT_HEADING
+        else:
+            marker = FMT_NORMAL
+        repaired_lines.append(f"{marker} {line.strip()}")
+        fixed += 1
+    if fixed:
+        log.info(f"Added missing formatting markers to {fixed} line(s).")
+    return "\n".join(repaired_lines), fixed
+
+
+if __name__ == "__main__":
+    # Example usage when running this script directly
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    print("--- Testing output repair ---")
+    start, end = "=== MODIFIED RESUME START ===", "=== MODIFIED RESUME END ==="
+    truncated = f"{start}\n@@NAME@@ Jane Doe\n@@BULLET@@ - Built things\n=== MODIFIED RES"
+    print(repair_marker_pair(truncated, start, end))
+    print(repair_marker_pair("@@NAME@@ Jane Doe\n" + end, start, end))
+    print(wrap_marked_lines("Sure! Here you go:\n@@NAME@@ Jane Doe\n@@HEADING@@ SKILLS\n\nHope this helps!", start, end))
+    print(ensure_line_markers("@@HEADING@@ EXPERIENCE\n- Built things\nEDUCATION\nState University"))
+    print("--- Test Finished ---")
@@ -0,0 +1,457 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from config import get_env_number
+import telemetry
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+DEFAULT_REQUESTS_PER_MINUTE = 40 # NVIDIA's hosted NIM trial limit
+DEFAULT_TOKENS_PER_MINUTE = 0 # 0 = no token budget
+DEFAULT_INITIAL_CONCURRENCY = 4
+DEFAULT_MAX_CONCURRENCY = 10 # Matches http_pool.DEFAULT_POOL_SIZE
+DEFAULT_MAX_RETRIES = 3 # Retries of an overloaded call before the error is returned to the caller
+BURST_SECONDS = 10.0 # A bucket holds this many seconds' worth of its rate, so bursts stay small
+BACKOFF_BASE = 1.0 # Seconds; doubled per retry
+BACKOFF_MAX = 30.0
+ASYNC_POLL_INTERVAL = 0.05 # Seconds between slot checks for coroutines waiting on the shared limiter
+CHARS_PER_TOKEN = 4 # Rough prompt-size estimate, settled against the reported usage afterwards
+OVERLOAD_STATUS_CODES = (429, 503)
+
+
+def is_enabled():
+    """False if JOB_APP_DISABLE_RATE_LIMIT is set (e.g. for local benchmarks against the fake backend)."""
+    return os.getenv("JOB_APP_DISABLE_RATE_LIMIT", "").strip().lower() not in ("1", "true", "yes")
+
+
+def get_limiter_settings():
+    """
+    Returns the limiter configuration, read from the environment.
+
+    Environment variables:
+        JOB_APP_RATE_LIMIT_RPM: Requests per minute (0 = unlimited).
+        JOB_APP_RATE_LIMIT_TPM: Prompt + completion tokens per minute (0 = unlimited).
+        JOB_APP_INITIAL_CONCURRENCY / JOB_APP_MAX_CONCURRENCY: Start and ceiling of the adaptive concurrency limit.
+        JOB_APP_RATE_LIMIT_RETRIES: Retries of a call rejected with 429/503 or a timeout.
+
+    Returns:
+        dict: requests_per_minute, tokens_per_minute, initial_concurrency, max_concurrency, max_retries.
+    """
+    max_concurrency = max(1, get_env_number("JOB_APP_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY, int))
+    return {
+        "requests_per_minute": max(0.0, get_env_number("JOB_APP_RATE_LIMIT_RPM", DEFAULT_REQUESTS_PER_MINUTE)),
+        "tokens_per_minute": max(0.0, get_env_number("JOB_APP_RATE_LIMIT_TPM", DEFAULT_TOKENS_PER_MINUTE)),
+        "initial_concurrency": min(max_concurrency, max(1, get_env_number("JOB_APP_INITIAL_CONCURRENCY", DEFAULT_INITIAL_CONCURRENCY, int))),
+        "max_concurrency": max_concurrency,
+        "max_retries": max(0, get_env_number("JOB_APP_RATE_LIMIT_RETRIES", DEFAULT_MAX_RETRIES, int)),
+    }
+
+
+def estimate_tokens(prompt_text, max_tokens=0):
+    """Tokens to reserve for a request: the prompt estimate plus the full generation cap."""
+    return len(prompt_text or "") // CHARS_PER_TOKEN + (max_tokens or 0)
+
+
+# --- Error Classification ---
+def _status_code(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_overload_error(error):
+    """True for errors that mean 'slow down': HTTP 429/503, provider rate-limit errors and timeouts."""
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError)):
+        return True
+    if _status_code(error) in OVERLOAD_STATUS_CODES:
+        return True
+    name = type(error).__name__.lower()
+    if "ratelimit" in name or "timeout" in name: # litellm.RateLimitError, litellm.Timeout, httpx.ReadTimeout, ...
+        return True
+    message = str(error).lower()
+    return "rate limit" in message or "too many requests" in message
+
+
+def _retry_after(error):
+    """Seconds from a Retry-After header on the error's response, if the provider sent one."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or getattr(error, "litellm_response_headers", None)
+    try:
+        value = headers.get("retry-after") if headers is not None else None
+        return min(BACKOFF_MAX, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+# --- Building Blocks ---
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute, burst_seconds=BURST_SECONDS):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, amount=1):
+        """Takes `amount` if available. Returns 0.0 on success, otherwise the seconds until it will be."""
+        with self._lock:
+            self._refill()
+            needed = min(amount, self.capacity) # Oversized requests wait for a full bucket, then run into debt
+            if self._tokens >= needed:
+                self._tokens -= amount
+                return 0.0
+            return (needed - self._tokens) / self.rate
+
+    def acquire(self, amount=1):
+        """Blocks until `amount` is available and takes it. Returns the seconds waited."""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(amount)
+            if not wait:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def aacquire(self, amount=1):
+        """Non-blocking counterpart of acquire()."""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(amount)
+            if not wait:
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def adjust(self, amount):
+        """Charges (positive) or refunds (negative) tokens after the fact, e.g. estimated vs actual usage."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - amount)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD concurrency limit. Every success adds 1/limit, so the limit grows by one slot per
+    limit's worth of successes. An overload halves it, at most once per round of in-flight
+    requests: requests sent before the last cut are already accounted for, so a burst of 429s
+    does not collapse the limit to the minimum.
+    """
+
+    def __init__(self, initial=DEFAULT_INITIAL_CONCURRENCY, minimum=1, maximum=DEFAULT_MAX_CONCURRENCY, decrease_factor=0.5):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.decrease_factor = decrease_factor
+        self._limit = float(min(max(initial, self.minimum), self.maximum))
+        self._in_flight = 0
+        self._last_decrease = float("-inf")
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def try_acquire(self):
+        with self._condition:
+            if self._in_flight < int(self._limit):
+                self._in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    async def aacquire(self):
+        # The limiter is shared by threads and event loops, so coroutines poll instead of awaiting a Condition
+        while not self.try_acquire():
+            await asyncio.sleep(ASYNC_POLL_INTERVAL)
+
+    def release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        with self._condition:
+            before = int(self._limit)
+            self._limit = min(self.maximum, self._limit + 1.0 / self._limit)
+            if int(self._limit) > before:
+                self._condition.notify_all()
+
+    def on_overload(self, sent_at):
+        """Shrinks the limit for an overload of a request sent at `sent_at` (monotonic). Returns True if it shrank."""
+        with self._condition:
+            if sent_at < self._last_decrease:
+                return False
+            before = self._limit
+            self._limit = max(float(self.minimum), self._limit * self.decrease_factor)
+            self._last_decrease = time.monotonic()
+        log.warning(f"Provider overloaded: concurrency limit {int(before)} -> {int(self._limit)}.")
+        return True
+
+
+class Lease:
+    """One admitted call. Set `actual_tokens` once the usage is known to settle the token estimate."""
+
+    def __init__(self, estimated_tokens):
+        self.estimated_tokens = estimated_tokens
+        self.actual_tokens = None
+
+
+# --- Limiter ---
+class RateLimiter:
+    """
+    Client-side limiter shared by every LLM call in the process: request and token buckets
+    (per-minute budgets) in front of an adaptive concurrency limit, plus bounded retries with
+    jittered exponential backoff for overloaded calls.
+    """
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE,
+                 initial_concurrency=DEFAULT_INITIAL_CONCURRENCY, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 max_retries=DEFAULT_MAX_RETRIES):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.concurrency = AdaptiveConcurrency(initial_concurrency, maximum=max_concurrency)
+        self.max_retries = max_retries
+        self._stats_lock = threading.Lock()
+        self._stats = {"calls": 0, "overloads": 0, "retries": 0, "throttled_seconds": 0.0}
+
+    def _count(self, field, amount=1):
+        with self._stats_lock:
+            self._stats[field] += amount
+
+    def _settle(self, lease):
+        if self.tokens is not None and lease.actual_tokens is not None:
+            self.tokens.adjust(lease.actual_tokens - lease.estimated_tokens)
+
+    def _finish(self, lease, sent_at, error):
+        """Feeds the outcome of one admitted call back into the concurrency limit."""
+        self._settle(lease)
+        if error is None:
+            self.concurrency.on_success()
+        elif is_overload_error(error):
+            self._count("overloads")
+            self.concurrency.on_overload(sent_at)
+
+    @contextmanager
+    def slot(self, estimated_tokens=0, requests=1):
+        """
+        Admits one call (or one crew run of `requests` calls): waits for a concurrency slot and the
+        request/token budget, then yields a Lease. Overload errors raised inside shrink the
+        concurrency limit; a clean exit grows it. Nothing is retried here.
+        """
+        started = time.perf_counter()
+        self.concurrency.acquire()
+        try:
+            if self.requests is not None:
+                self.requests.acquire(requests)
+            if self.tokens is not None:
+                self.tokens.acquire(estimated_tokens)
+            self._count("calls")
+            self._count("throttled_seconds", time.perf_counter() - started)
+            lease = Lease(estimated_tokens)
+            sent_at = time.monotonic()
+            try:
+                yield lease
+            except Exception as e:
+                self._finish(lease, sent_at, e)
+                raise
+            self._finish(lease, sent_at, None)
+        finally:
+            self.concurrency.release()
+
+    @asynccontextmanager
+    async def aslot(self, estimated_tokens=0, requests=1):
+        """Non-blocking counterpart of slot()."""
+        started = time.perf_counter()
+        await self.concurrency.aacquire()
+        try:
+            if self.requests is not None:
+                await self.requests.aacquire(requests)
+            if self.tokens is not None:
+                await self.tokens.aacquire(estimated_tokens)
+            self._count("calls")
+            self._count("throttled_seconds", time.perf_counter() - started)
+            lease = Lease(estimated_tokens)
+            sent_at = time.monotonic()
+            try:
+                yield lease
+            except Exception as e:
+                self._finish(lease, sent_at, e)
+                raise
+            self._finish(lease, sent_at, None)
+        finally:
+            self.concurrency.release()
+
+    def _backoff(self, attempt, error):
+        """Retry delay: the provider's Retry-After if given, else exponential backoff with jitter."""
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return retry_after
+        ceiling = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+        return ceiling / 2 + random.uniform(0, ceiling / 2) # Jitter spreads retries of a throttled burst apart
+
+    def _should_retry(self, error, attempt):
+        if not is_overload_error(error) or attempt >= self.max_retries:
+            return False
+        self._count("retries")
+        telemetry.record_retry()
+        return True
+
+    def call(self, fn, estimated_tokens=0, requests=1, usage=None):
+        """
+        Runs `fn()` through the limiter, retrying overload errors up to max_retries times.
+
+        Args:
+            fn (callable): The call to make; re-invoked on retry.
+            estimated_tokens (int): Tokens to reserve (see estimate_tokens()).
+            requests (int): Provider requests `fn` makes (a crew run makes one per task).
+            usage (callable): Maps the result of `fn` to its actual total tokens (or None).
+
+        Returns:
+            The result of `fn()`. The last error is re-raised once retries are exhausted.
+        """
+        attempt = 0
+        while True:
+            try:
+                with self.slot(estimated_tokens, requests) as lease:
+                    result = fn()
+                    lease.actual_tokens = usage(result) if usage else None
+                    return result
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                log.warning(f"{type(e).__name__} from provider; retry {attempt}/{self.max_retries} in {delay:.1f}s.")
+                time.sleep(delay)
+
+    async def acall(self, coroutine_factory, estimated_tokens=0, requests=1, usage=None):
+        """Non-blocking counterpart of call(); `coroutine_factory()` must return a fresh coroutine per attempt."""
+        attempt = 0
+        while True:
+            try:
+                async with self.aslot(estimated_tokens, requests) as lease:
+                    result = await coroutine_factory()
+                    lease.actual_tokens = usage(result) if usage else None
+                    return result
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                log.warning(f"{type(e).__name__} from provider; retry {attempt}/{self.max_retries} in {delay:.1f}s.")
+                await asyncio.sleep(delay)
+
+    def stats(self):
+        """Returns counters plus the current concurrency limit."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["concurrency_limit"] = self.concurrency.limit
+        stats["in_flight"] = self.concurrency.in_flight
+        return stats
+
+
+# --- Shared Limiter ---
+_lock = threading.Lock()
+_limiter = None
+
+
+def get_limiter():
+    """Returns the process-wide RateLimiter, created from get_limiter_settings() on first use."""
+    global _limiter
+    with _lock:
+        if _limiter is None:
+            settings = get_limiter_settings()
+            _limiter = RateLimiter(**settings)
+            log.info(f"Created shared rate limiter: {settings}")
+        return _limiter
+
+
+def call(fn, estimated_tokens=0, requests=1, usage=None):
+    """RateLimiter.call() on the shared limiter; a plain call when rate limiting is disabled."""
+    if not is_enabled():
+        return fn()
+    return get_limiter().call(fn, estimated_tokens, requests, usage)
+
+
+async def acall(coroutine_factory, estimated_tokens=0, requests=1, usage=None):
+    """RateLimiter.acall() on the shared limiter; a plain await when rate limiting is disabled."""
+    if not is_enabled():
+        return await coroutine_factory()
+    return await get_limiter().acall(coroutine_factory, estimated_tokens, requests, usage)
+
+
+@contextmanager
+def slot(estimated_tokens=0, requests=1):
+    """RateLimiter.slot() on the shared limiter (no retries, e.g. for streamed calls)."""
+    if not is_enabled():
+        yield Lease(estimated_tokens)
+        return
+    with get_limiter().slot(estimated_tokens, requests) as lease:
+        yield lease
+
+
+if __name__ == "__main__":
+    # Self-check: a simulated provider that rejects work above 6 concurrent requests with 429
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    print("--- Testing adaptive rate limiter ---")
+    from concurrent.futures import ThreadPoolExecutor
+
+    class ProviderRateLimitError(Exception):
+        status_code = 429
+
+    provider_ceiling = 6
+    provider_lock = threading.Lock()
+    provider_state = {"active": 0, "rejected": 0, "served": 0}
+
+    def fake_request():
+        with provider_lock:
+            if provider_state["active"] >= provider_ceiling:
+                provider_state["rejected"] += 1
+                raise ProviderRateLimitError("429 Too Many Requests")
+            provider_state["active"] += 1
+        time.sleep(0.05)
+        with provider_lock:
+            provider_state["active"] -= 1
+            provider_state["served"] += 1
+        return "ok"
+
+    BACKOFF_BASE = 0.05 # Keep the demo fast
+    limiter = RateLimiter(requests_per_minute=6000, initial_concurrency=2, max_concurrency=16, max_retries=5)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=24) as pool:
+        results = list(pool.map(lambda _: limiter.call(fake_request, estimated_tokens=100), range(200)))
+    elapsed = time.perf_counter() - started
+    print(f"Served {provider_state['served']} requests in {elapsed:.2f}s "
+          f"({provider_state['served'] / elapsed:.0f}/s; ceiling ~{provider_ceiling / 0.05:.0f}/s), "
+          f"{provider_state['rejected']} rejected by the provider.")
+    print(f"Limiter stats: {limiter.stats()}")
+    assert results == ["ok"] * 200, "some calls failed after retries"
+    assert provider_state["rejected"] < 40, "too many 429s: the limiter did not back off"
+
+    bucket_limiter = RateLimiter(requests_per_minute=600, initial_concurrency=8, max_concurrency=8) # 10 req/s, burst 100
+    started = time.perf_counter()
+    for _ in range(130):
+        bucket_limiter.call(lambda: None)
+    print(f"130 calls at 600 rpm (burst 100) took {time.perf_counter() - started:.2f}s (expected ~3s).")
+    print("--- Test Finished ---")
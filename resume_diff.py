@@ -0,0 +1,269 @@
+import re
+import difflib
+import logging
+import functools
+import resume_model
+from resume_sections import BULLET_PATTERN, STOPWORDS, section_key
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+REWORDED_MIN_RATIO = 0.4 # Replaced bullets at least this similar count as reworded rather than removed + added
+MAX_CHANGES_PER_SECTION = 4 # In chat answers; the explanation prompt gets every change
+MAX_QUOTE_CHARS = 110
+DIFF_CACHE_SIZE = 16
+WORD_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9]+)*")
+# Questions that ask for a summary of the edits (not "why", not "what should I change")
+CHANGE_SUMMARY_PATTERNS = (
+    re.compile(r"\bwhat\b.*\b(chang\w*|modif\w*|edit\w*|updat\w*|different|differences?|diff|rewr\w*)\b"),
+    re.compile(r"\b(show|list|summari[sz]e|tell me|give me)\b.*\b(changes|differences|diff|edits|modifications|updates)\b"),
+    re.compile(r"\bwhich\b.*\b(changed|modified|edited|updated|rewritten)\b"),
+)
+NOT_A_SUMMARY_PATTERN = re.compile(r"\b(why|how come|should|could|would|else|suggest|recommend)\b")
+
+
+class LineChange:
+    """One edit inside a section: "added", "removed" or "reworded" (bullets), or "details" (other lines)."""
+
+    def __init__(self, kind, before=None, after=None):
+        self.kind = kind
+        self.before = before
+        self.after = after
+
+    def __repr__(self):
+        return f"LineChange({self.kind!r}, before={self.before!r}, after={self.after!r})"
+
+
+class SectionDiff:
+    """The changes to one aligned resume section; status is "unchanged", "modified", "added" or "removed"."""
+
+    def __init__(self, label, status, changes=None):
+        self.label = label
+        self.status = status
+        self.changes = changes or []
+
+    def __repr__(self):
+        return f"SectionDiff({self.label!r}, {self.status!r}, changes={len(self.changes)})"
+
+
+class ResumeDiff:
+    """Structured, section- and bullet-aligned diff between the original and the modified resume."""
+
+    def __init__(self, sections, added_keywords=()):
+        self.sections = sections
+        self.added_keywords = list(added_keywords) # Job-description words the original did not contain
+
+    @property
+    def changed_sections(self):
+        return [section for section in self.sections if section.status != "unchanged"]
+
+    @property
+    def unchanged_labels(self):
+        return [section.label for section in self.sections if section.status == "unchanged"]
+
+    def summary(self):
+        """A short chat answer to 'what did you change?'."""
+        changed = self.changed_sections
+        if not changed:
+            return "I did not find any changes between your original resume and the modified version."
+        parts = [f"Here is what changed compared to your original resume ({len(changed)} of {len(self.sections)} sections):"]
+        for section in changed:
+            parts.append("")
+            parts.extend(_describe_section(section, MAX_CHANGES_PER_SECTION))
+        if self.added_keywords:
+            parts.append("")
+            parts.append(f"Job-description keywords now in the resume: {', '.join(self.added_keywords)}.")
+        if self.unchanged_labels:
+            parts.append(f"Unchanged: {', '.join(self.unchanged_labels)}.")
+        return "\n".join(parts)
+
+    def to_prompt_text(self):
+        """Every change, compactly, as context for the explanation agent (replaces both full resumes)."""
+        parts = []
+        for section in self.changed_sections:
+            parts.extend(_describe_section(section, None))
+        if self.added_keywords:
+            parts.append(f"Job-description keywords added: {', '.join(self.added_keywords)}")
+        if self.unchanged_labels:
+            parts.append(f"Unchanged sections: {', '.join(self.unchanged_labels)}")
+        return "\n".join(parts) or "No changes."
+
+
+def _quote(text):
+    text = text if len(text) <= MAX_QUOTE_CHARS else text[:MAX_QUOTE_CHARS - 3].rstrip() + "..."
+    return f'"{text}"'
+
+
+def _describe_section(section, limit):
+    if section.status in ("added", "removed"):
+        return [f"{section.label}: section {section.status}"]
+    lines = [f"{section.label}:"]
+    shown = section.changes if limit is None else section.changes[:limit]
+    for change in shown:
+        if change.kind == "added":
+            lines.append(f"  - Added: {_quote(change.after)}")
+        elif change.kind == "removed":
+            lines.append(f"  - Removed: {_quote(change.before)}")
+        else:
+            verb = "Reworded" if change.kind == "reworded" else "Updated"
+            lines.append(f"  - {verb}: {_quote(change.before)} -> {_quote(change.after)}")
+    if limit is not None and len(section.changes) > limit:
+        lines.append(f"  - ... and {len(section.changes) - limit} more")
+    return lines
+
+
+# --- Section Units ---
+def _normalize(text):
+    return " ".join(BULLET_PATTERN.sub("", text, count=1).split())
+
+
+def _words(text):
+    return set(WORD_PATTERN.findall(text.lower()))
+
+
+class _Unit:
+    """A section reduced to comparable parts: details lines (titles, dates, prose) and bullets."""
+
+    def __init__(self, heading, title, details, bullets, label):
+        self.heading = heading
+        self.title = title
+        self.details = details
+        self.bullets = bullets
+        self.label = label
+
+    @property
+    def key(self):
+        """Alignment key: the kind of section plus the distinctive words of the entry title."""
+        title_words = sorted(word for word in _words(self.title or "") if len(word) >= 3 and word not in STOPWORDS)
+        return f"{section_key(self.heading) or (self.heading or 'header').lower()}|{' '.join(title_words[:3])}"
+
+
+def _label(section, entry=None):
+    if section.heading is None:
+        return "Header"
+    return f"{section.heading}: {entry.title}" if entry is not None and entry.title else section.heading
+
+
+def _unit(section, lines, entry=None):
+    details, bullets = [], []
+    for element_type, text in lines:
+        (bullets if element_type == "bullet" or BULLET_PATTERN.match(text) else details).append(_normalize(text))
+    return _Unit(section.heading, entry.title if entry is not None else None, details, bullets, _label(section, entry))
+
+
+def _units(model):
+    """One unit per header, section body and entry of a resume model (heading lines are compared through the keys)."""
+    units = [_unit(model.header, model.header.lines)] if model.header.lines else []
+    for section in model.sections:
+        if section.body or not section.entries:
+            units.append(_unit(section, section.body))
+        units += [_unit(section, entry.lines, entry) for entry in section.entries]
+    return units
+
+
+def _original_units(text):
+    return _units(resume_model.parse(text, marked=False))
+
+
+def _modified_units(block):
+    return _units(resume_model.parse(block, marked=True))
+
+
+# --- Diffing ---
+def _diff_bullets(before, after):
+    changes = []
+    matcher = difflib.SequenceMatcher(None, [b.lower() for b in before], [a.lower() for a in after], autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        removed, added = before[i1:i2], after[j1:j2]
+        for old, new in zip(removed, added):
+            if difflib.SequenceMatcher(None, old.lower(), new.lower()).ratio() >= REWORDED_MIN_RATIO:
+                changes.append(LineChange("reworded", old, new))
+            else:
+                changes += [LineChange("removed", before=old), LineChange("added", after=new)]
+        changes += [LineChange("removed", before=old) for old in removed[len(added):]]
+        changes += [LineChange("added", after=new) for new in added[len(removed):]]
+    return changes
+
+
+def _diff_units(original, modified):
+    changes = []
+    # Details are compared as word sets: splitting "Acme - Engineer" into company/title lines is not a change
+    if _words(" ".join(original.details)) != _words(" ".join(modified.details)):
+        changes.append(LineChange("details", " | ".join(original.details), " | ".join(modified.details)))
+    changes += _diff_bullets(original.bullets, modified.bullets)
+    return SectionDiff(modified.label, "modified" if changes else "unchanged", changes)
+
+
+@functools.lru_cache(maxsize=DIFF_CACHE_SIZE)
+def diff_resumes(original_text, modified_block, job_description=None):
+    """
+    Aligns the original (plain) resume and the modified (marked) block section by section and
+    bullet by bullet. Results are cached, so repeated chat questions reuse one diff.
+
+    Args:
+        original_text (str): The parsed original resume.
+        modified_block (str): The marked resume text (between the modification markers).
+        job_description (str): Optional; enables the list of added job-description keywords.
+
+    Returns:
+        ResumeDiff: The diff, or None if the modified block is not a marked resume.
+    """
+    if not original_text or not modified_block or not resume_model.is_marked(modified_block):
+        return None
+    original_units = _original_units(original_text)
+    modified_units = _modified_units(modified_block)
+    matcher = difflib.SequenceMatcher(None, [u.key for u in original_units], [u.key for u in modified_units], autojunk=False)
+    sections = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        before, after = original_units[i1:i2], modified_units[j1:j2]
+        # Equal keys align directly; replaced runs are paired in order (e.g. a renamed entry)
+        for old, new in zip(before, after):
+            sections.append(_diff_units(old, new))
+        sections += [SectionDiff(new.label, "added") for new in after[len(before):]]
+        sections += [SectionDiff(old.label, "removed") for old in before[len(after):]]
+
+    added_keywords = []
+    if job_description:
+        original_words = _words(original_text)
+        modified_words = _words(" ".join(" ".join(u.details + u.bullets) for u in modified_units))
+        added_keywords = sorted(
+            word for word in (modified_words & _words(job_description)) - original_words
+            if len(word) >= 3 and word not in STOPWORDS
+        )
+    diff = ResumeDiff(sections, added_keywords)
+    log.info(f"Resume diff: {len(diff.changed_sections)} of {len(sections)} sections changed.")
+    return diff
+
+
+def is_change_summary_question(query):
+    """True for chat questions like 'What did you change?' that the diff answers on its own."""
+    text = (query or "").lower()
+    if NOT_A_SUMMARY_PATTERN.search(text):
+        return False
+    return any(pattern.search(text) for pattern in CHANGE_SUMMARY_PATTERNS)
+
+
+if __name__ == "__main__":
+    # Example usage when running this script directly
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    print("--- Testing resume diff ---")
+    original = (
+        "Jane Doe\njane@example.com\nEXPERIENCE\nAcme Corp - Engineer\n- Built data pipelines\n- Fixed bugs\n"
+        "Beta LLC - Intern\n- Wrote tests\nSKILLS\nPython, SQL"
+    )
+    modified = (
+        "@@NAME@@ Jane Doe\n@@CONTACT@@ jane@example.com\n@@HEADING@@ EXPERIENCE\n"
+        "@@SUBHEAD_COMP@@ Acme Corp\n@@SUBHEAD_TITLE@@ Engineer\n"
+        "@@BULLET@@ - Built Python data pipelines on Kubernetes\n@@BULLET@@ - Fixed bugs\n@@BULLET@@ - Cut costs by 20%\n"
+        "@@SUBHEAD_COMP@@ Beta LLC\n@@SUBHEAD_TITLE@@ Intern\n@@BULLET@@ - Wrote tests\n"
+        "@@HEADING@@ SKILLS\n@@NORMAL@@ Python, SQL, Kubernetes"
+    )
+    resume_diff = diff_resumes(original, modified, "Python engineer with Kubernetes experience")
+    print(resume_diff.summary())
+    print("\nPrompt context:\n" + resume_diff.to_prompt_text())
+    for question in ("What did you change?", "Why did you change the Acme bullets?", "Show me the differences", "What should I add?"):
+        print(f"{question!r}: summary question = {is_change_summary_question(question)}")
+    print("--- Test Finished ---")
@@ -0,0 +1,363 @@
+import logging
+import threading
+from collections import OrderedDict
+from resume_sections import (
+    MARKER_PATTERN, BULLET_PATTERN, ResumeSection, looks_like_heading, section_key
+)
+from structured_output import ELEMENT_MARKERS, MARKER_TYPES
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+MODEL_CACHE_SIZE = 16 # Distinct resume texts whose models parse() keeps
+MIN_MARKED_FRACTION = 0.5 # parse() reads text with at least this share of marked lines as marked
+# Element type of the title line of a plain-text entry, by section key
+ENTRY_TITLE_TYPES = {"experience": "company", "project": "project"}
+TITLE_TYPES = ("company", "project") # Element types that open an entry
+
+
+class Entry:
+    """
+    One company/project entry. `lines` holds its (element type, text) pairs in document order,
+    the title line included; `title` is the company/project name (None if the entry has none).
+    """
+
+    __slots__ = ("title", "lines")
+
+    def __init__(self, title=None, lines=None):
+        self.title = title
+        self.lines = lines if lines is not None else []
+
+    @property
+    def bullets(self):
+        return [text for element_type, text in self.lines if element_type == "bullet"]
+
+    @property
+    def details(self):
+        """Non-bullet lines (title, role, dates, prose)."""
+        return [text for element_type, text in self.lines if element_type != "bullet"]
+
+    def __repr__(self):
+        return f"Entry(title={self.title!r}, lines={len(self.lines)})"
+
+
+class Section:
+    """
+    One resume section. `lines` holds its heading line followed by the lines before its first
+    entry; the jobs or projects of a section live in `entries`. The header (name and contact
+    lines) is a Section without a heading.
+    """
+
+    __slots__ = ("heading", "key", "lines", "entries")
+
+    def __init__(self, heading=None, lines=None, entries=None):
+        self.heading = heading
+        self.key = section_key(heading) if heading else None
+        self.lines = lines if lines is not None else []
+        self.entries = entries if entries is not None else []
+
+    @property
+    def body(self):
+        """The (element type, text) pairs before the first entry, without the heading line."""
+        return self.lines[1:] if self.heading is not None else self.lines
+
+    def iter_lines(self):
+        """All (element type, text) pairs of the section in document order."""
+        yield from self.lines
+        for entry in self.entries:
+            yield from entry.lines
+
+    def __repr__(self):
+        return f"Section(heading={self.heading!r}, lines={len(self.lines)}, entries={len(self.entries)})"
+
+
+class ResumeModel:
+    """
+    Compact structure of one resume: the header, then its sections with their entries, every
+    line kept once as an (element type, text) pair using the element types of the JSON output
+    mode ("name", "heading", "company", "bullet", ...). Built once from plain text (parsed
+    PDF/DOCX) or from a marked block and then only read: it renders back to plain text, marked
+    text, JSON elements or ResumeSection units, and looks sections up by name.
+
+    Models returned by parse() are shared between callers and must not be modified.
+    """
+
+    __slots__ = ("header", "sections", "marked", "_index")
+
+    def __init__(self, header=None, sections=None, marked=False):
+        self.header = header if header is not None else Section()
+        self.sections = sections if sections is not None else []
+        self.marked = marked # Built from marked text (decides the to_sections() layout)
+        self._index = None
+
+    # --- Building ---
+    @classmethod
+    def from_text(cls, text):
+        """
+        Builds the model of plain resume text with the rules of split_plain_sections(): lines
+        before the first heading form the header, experience/project sections are split into
+        entries (a new entry starts at the first non-bullet line after a bullet). Empty lines
+        are dropped.
+        """
+        header = current = Section()
+        sections = []
+        entry = title_type = None
+        last_was_bullet = False
+        for line in (text or "").splitlines():
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if looks_like_heading(line):
+                current = Section(stripped.rstrip(":").strip(), [("heading", stripped)])
+                sections.append(current)
+                entry = None
+                title_type = ENTRY_TITLE_TYPES.get(current.key)
+                last_was_bullet = False
+                continue
+            is_bullet = bool(BULLET_PATTERN.match(line))
+            if current is header:
+                header.lines.append(("name" if not header.lines else "contact", stripped))
+            elif title_type is not None:
+                if entry is None or (last_was_bullet and not is_bullet):
+                    entry = Entry()
+                    current.entries.append(entry)
+                if entry.title is None and not is_bullet:
+                    entry.title = stripped
+                    entry.lines.append((title_type, stripped))
+                else:
+                    entry.lines.append(("bullet" if is_bullet else "normal", stripped))
+            else:
+                current.lines.append(("bullet" if is_bullet else "normal", stripped))
+            last_was_bullet = is_bullet
+        return cls(header, sections)
+
+    @classmethod
+    def from_elements(cls, elements, marked=True):
+        """
+        Builds the model of typed lines, as the JSON output mode returns them (dicts with
+        "type"/"text", or (type, text) pairs). Headings open sections, company/project lines open
+        entries (only after the first heading, as split_marked_sections() does).
+        """
+        header = current = Section()
+        sections = []
+        entry = None
+        for element in elements:
+            element_type, text = (element.get("type"), element.get("text")) if isinstance(element, dict) else element
+            element_type = element_type if element_type in ELEMENT_MARKERS else "normal"
+            text = (text or "").strip()
+            if not text:
+                continue
+            if element_type == "heading":
+                current = Section(text, [("heading", text)])
+                sections.append(current)
+                entry = None
+            elif element_type in TITLE_TYPES and current is not header:
+                entry = Entry(text, [(element_type, text)])
+                current.entries.append(entry)
+            else:
+                (entry.lines if entry is not None else current.lines).append((element_type, text))
+        return cls(header, sections, marked=marked)
+
+    @classmethod
+    def from_marked(cls, block):
+        """
+        Builds the model of a marked resume block. Unmarked continuation lines become "bullet"
+        or "normal" lines of their own; blank lines are dropped.
+        """
+        pairs = []
+        for line in (block or "").splitlines():
+            match = MARKER_PATTERN.match(line)
+            if match:
+                pairs.append((MARKER_TYPES.get(match.group(1), "normal"), match.group(2)))
+            elif line.strip():
+                pairs.append(("bullet" if BULLET_PATTERN.match(line) else "normal", line))
+        return cls.from_elements(pairs, marked=True)
+
+    # --- Lookup ---
+    def section(self, name):
+        """
+        Returns the first section called `name` (its heading, case-insensitive) or of that kind
+        ("experience", "Work History", "skills", ...), or None.
+        """
+        if self._index is None:
+            index = {}
+            for section in self.sections:
+                index.setdefault(section.heading.lower(), section)
+                if section.key:
+                    index.setdefault(section.key, section)
+            self._index = index
+        name = (name or "").strip().lower()
+        return self._index.get(name) or self._index.get(section_key(name))
+
+    @property
+    def entries(self):
+        """All entries of the resume in document order."""
+        return [entry for section in self.sections for entry in section.entries]
+
+    def iter_lines(self):
+        """All (element type, text) pairs of the resume in document order."""
+        yield from self.header.lines
+        for section in self.sections:
+            yield from section.iter_lines()
+
+    def __len__(self):
+        return sum(1 for _ in self.iter_lines())
+
+    def __repr__(self):
+        return f"ResumeModel(sections={len(self.sections)}, entries={len(self.entries)}, lines={len(self)})"
+
+    # --- Rendering ---
+    def to_text(self):
+        """Plain text, one line per element."""
+        return "\n".join(text for _, text in self.iter_lines())
+
+    def to_marked(self):
+        """Marked text in the format the modifier writes (and format_resume_with_markers reads)."""
+        return "\n".join(_marked_line(element_type, text) for element_type, text in self.iter_lines())
+
+    def elements(self):
+        """The resume as JSON output mode elements ({"type", "text"} dicts, bullets without their prefix)."""
+        return [
+            {"type": element_type, "text": BULLET_PATTERN.sub("", text, count=1) if element_type == "bullet" else text}
+            for element_type, text in self.iter_lines()
+        ]
+
+    def to_sections(self):
+        """
+        The resume as ResumeSection units, laid out as split_plain_sections() (plain text lines)
+        or split_marked_sections() (marked lines) would split the text the model was built from.
+        """
+        render = _marked_line if self.marked else (lambda element_type, text: text)
+        units = []
+        if self.header.lines:
+            units.append(ResumeSection("header", lines=[render(*line) for line in self.header.lines]))
+        for section in self.sections:
+            heading_lines = [render(*line) for line in section.lines]
+            if self.marked:
+                units.append(ResumeSection("heading" if section.entries else "section", heading=section.heading, lines=heading_lines))
+            else:
+                units.append(ResumeSection("heading", heading=section.heading, lines=heading_lines[:1]))
+                if len(heading_lines) > 1:
+                    units.append(ResumeSection("section", heading=section.heading, lines=heading_lines[1:]))
+            for entry in section.entries:
+                units.append(ResumeSection("entry", heading=section.heading, title=entry.title, lines=[render(*line) for line in entry.lines]))
+        return units
+
+    # --- Serialization ---
+    def to_dict(self):
+        """JSON-serializable form (stored with the parsed resume)."""
+        return {
+            "marked": self.marked,
+            "header": [list(line) for line in self.header.lines],
+            "sections": [
+                {
+                    "heading": section.heading,
+                    "lines": [list(line) for line in section.lines],
+                    "entries": [{"title": entry.title, "lines": [list(line) for line in entry.lines]} for entry in section.entries],
+                }
+                for section in self.sections
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sections = [
+            Section(
+                section["heading"],
+                [tuple(line) for line in section["lines"]],
+                [Entry(entry.get("title"), [tuple(line) for line in entry["lines"]]) for entry in section.get("entries") or []],
+            )
+            for section in data.get("sections") or []
+        ]
+        return cls(Section(lines=[tuple(line) for line in data.get("header") or []]), sections, marked=bool(data.get("marked")))
+
+
+def _marked_line(element_type, text):
+    if element_type == "heading":
+        text = text.rstrip(":").strip()
+    return f"{ELEMENT_MARKERS.get(element_type, ELEMENT_MARKERS['normal'])} {text}"
+
+
+def is_marked(text):
+    """True if at least MIN_MARKED_FRACTION of the non-empty lines carry a formatting marker."""
+    lines = [line for line in (text or "").splitlines() if line.strip()]
+    return bool(lines) and sum(1 for line in lines if MARKER_PATTERN.match(line)) / len(lines) >= MIN_MARKED_FRACTION
+
+
+# --- Shared Models ---
+_models = OrderedDict() # (text, marked) -> ResumeModel, least recently used first
+_models_lock = threading.Lock()
+
+
+def cached(text, marked=False):
+    """The shared model of `text` if one was built or registered already, else None."""
+    with _models_lock:
+        model = _models.get((text or "", marked))
+        if model is not None:
+            _models.move_to_end((text or "", marked))
+        return model
+
+
+def register(text, model):
+    """Makes `model` the shared model of `text` (e.g. one restored from the parsed-resume cache)."""
+    with _models_lock:
+        _models[(text, model.marked)] = model
+        _models.move_to_end((text, model.marked))
+        while len(_models) > MODEL_CACHE_SIZE:
+            _models.popitem(last=False)
+    return model
+
+
+def parse(text, marked=None):
+    """
+    Returns the shared model of a resume text, building it on first use, so the parser, the
+    section planner and the diff all work from one structure per resume.
+
+    Args:
+        text (str): Plain resume text, or a marked block.
+        marked (bool): Whether `text` is marked; detected with is_marked() if None.
+
+    Returns:
+        ResumeModel: A shared, read-only model.
+    """
+    text = text or ""
+    if marked is None:
+        marked = is_marked(text)
+    model = cached(text, marked)
+    if model is not None:
+        return model
+    model = ResumeModel.from_marked(text) if marked else ResumeModel.from_text(text)
+    return register(text, model)
+
+
+if __name__ == "__main__":
+    # Example usage when running this script directly
+    import json
+    from resume_sections import split_plain_sections
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    print("--- Testing resume model ---")
+    sample_plain = "\n".join([
+        "Jane Doe",
+        "jane@example.com | 555-0100",
+        "EXPERIENCE",
+        "Acme Corporation - Software Engineer",
+        "- Built data pipelines in Python.",
+        "- Reduced cloud costs by 20%.",
+        "Globex - Data Analyst",
+        "- Wrote SQL reports.",
+        "SKILLS:",
+        "Python, SQL, AWS",
+    ])
+    model = parse(sample_plain)
+    print(model)
+    print(f"Shared: {parse(sample_plain) is model}")
+    print(f"Lookup 'Work Experience': {model.section('Work Experience')}, entries: {model.section('experience').entries}")
+    print(model.to_marked())
+    same_units = [s.to_dict() for s in model.to_sections()] == [s.to_dict() for s in split_plain_sections(sample_plain)]
+    print(f"Same units as split_plain_sections: {same_units}")
+    marked_model = parse(model.to_marked())
+    print(f"Marked round trip: {marked_model.to_marked() == model.to_marked()}, units: {marked_model.to_sections()}")
+    print(f"Dict round trip: {ResumeModel.from_dict(json.loads(json.dumps(model.to_dict()))).to_text() == model.to_text()}")
+    print(f"Elements: {model.elements()[:3]}")
+    print("--- Test Finished ---")
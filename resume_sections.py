@@ -0,0 +1,321 @@
+import re
+import logging
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+# Kept in sync with the FMT_* markers in job_application_agent.py (not imported to avoid a cycle)
+FMT_NAME = "@@NAME@@"
+FMT_CONTACT = "@@CONTACT@@"
+FMT_HEADING = "@@HEADING@@"
+FMT_SUBHEADING_COMPANY = "@@SUBHEAD_COMP@@"
+FMT_SUBHEADING_TITLE = "@@SUBHEAD_TITLE@@"
+FMT_SUBHEADING_PROJECT = "@@SUBHEAD_PROJ@@"
+FMT_DATES = "@@DATES@@"
+FMT_BULLET = "@@BULLET@@"
+FMT_NORMAL = "@@NORMAL@@"
+MARKER_PATTERN = re.compile(r"^\s*(@@[A-Z_]+@@)\s?(.*)$")
+
+# Markers that open a new entry inside a section (checked in this order of preference)
+ENTRY_MARKERS = (FMT_SUBHEADING_COMPANY, FMT_SUBHEADING_PROJECT)
+
+# Words in feedback that refer to a kind of section, keyed by a word expected in its heading
+SECTION_SYNONYMS = {
+    "education": ("education", "degree", "degrees", "university", "college", "school", "gpa", "coursework"),
+    "experience": ("experience", "work", "employment", "job", "jobs", "role", "roles", "position", "positions"),
+    "project": ("project", "projects"),
+    "skill": ("skill", "skills", "technologies", "tools", "tech", "stack"),
+    "certification": ("certification", "certifications", "certificate", "certificates", "conference", "conferences", "award", "awards"),
+    "summary": ("summary", "objective", "profile"),
+}
+HEADER_WORDS = ("name", "contact", "email", "phone", "linkedin", "github", "portfolio", "header", "address")
+# Feedback that clearly applies to the whole resume is never scoped to sections
+GLOBAL_CUES = ("whole", "entire", "overall", "everything", "everywhere", "throughout", "all sections",
+               "every section", "all bullets", "every bullet", "one page")
+# Words too generic to identify an entry by name
+STOPWORDS = {
+    "the", "and", "for", "with", "from", "that", "this", "into", "about", "inc", "llc", "ltd", "corp",
+    "corporation", "company", "group", "university", "college", "institute", "school", "project", "resume",
+    "team", "lab", "labs", "technologies", "solutions", "services", "systems", "engineer", "engineering",
+    "senior", "junior", "intern", "developer", "manager", "analyst", "present",
+}
+# A scoped edit only pays off if it touches a small part of the resume
+MAX_SCOPED_FRACTION = 0.6
+# Plain-text resumes: bullet lines, and the longest line still treated as a possible heading
+BULLET_PATTERN = re.compile(r"^\s*([-*•●▪◦‣–]|\d+[.)])\s+")
+MAX_HEADING_CHARS = 40
+# Sections whose entries (jobs, projects) are split into separate units
+ENTRY_SECTION_KEYS = ("experience", "project")
+
+
+class ResumeSection:
+    """
+    A contiguous run of marked resume lines that can be rewritten on its own.
+
+    kind is "header" (name/contact lines), "heading" (a section heading plus any lines before its
+    first entry), "entry" (one company/project entry) or "section" (a whole section without entries).
+    """
+
+    def __init__(self, kind, heading=None, title=None, lines=None):
+        self.kind = kind
+        self.heading = heading # Heading text of the enclosing section (None for the header)
+        self.title = title # Company/project name for entries
+        self.lines = lines if lines is not None else []
+
+    @property
+    def text(self):
+        return "\n".join(self.lines)
+
+    @property
+    def label(self):
+        """Short human-readable name, used in logs."""
+        if self.kind == "header":
+            return "header"
+        return f"{self.heading or 'section'}: {self.title}" if self.title else (self.heading or self.kind)
+
+    def to_dict(self):
+        """JSON-serializable form (used by the parsed-resume cache)."""
+        return {"kind": self.kind, "heading": self.heading, "title": self.title, "lines": list(self.lines)}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["kind"], heading=data.get("heading"), title=data.get("title"), lines=list(data.get("lines") or []))
+
+    def __repr__(self):
+        return f"ResumeSection(kind={self.kind!r}, label={self.label!r}, lines={len(self.lines)})"
+
+
+def _marker_of(line):
+    """Returns (marker, text) for a marked line, or (None, line) for continuation/blank lines."""
+    match = MARKER_PATTERN.match(line)
+    if match:
+        return match.group(1), match.group(2).strip()
+    return None, line.strip()
+
+
+def split_marked_sections(block):
+    """
+    Splits a marked resume block (the text between the modification markers) into sections.
+    Joining the sections' text with newlines reproduces the block line for line.
+
+    Args:
+        block (str): Resume text whose lines start with @@...@@ formatting markers.
+
+    Returns:
+        list[ResumeSection]: The sections in document order.
+    """
+    sections = []
+    current = ResumeSection("header")
+    heading = None
+    heading_section = None # The "heading"/"section" unit of the current heading
+
+    for line in block.splitlines():
+        marker, text = _marker_of(line)
+        if marker == FMT_HEADING:
+            if current.lines:
+                sections.append(current)
+            heading = text
+            current = heading_section = ResumeSection("section", heading=heading, lines=[line])
+            continue
+        if marker in ENTRY_MARKERS and heading is not None:
+            if current is heading_section:
+                heading_section.kind = "heading" # The section has entries; its first unit is just the heading
+            if current.lines:
+                sections.append(current)
+            current = ResumeSection("entry", heading=heading, title=text, lines=[line])
+            continue
+        current.lines.append(line)
+
+    if current.lines:
+        sections.append(current)
+    return sections
+
+
+def looks_like_heading(line):
+    """Heuristic for section headings in plain (parsed PDF/DOCX) resume text."""
+    stripped = line.strip().rstrip(":").strip()
+    if not stripped or len(stripped) > MAX_HEADING_CHARS or BULLET_PATTERN.match(line):
+        return False
+    if any(char in stripped for char in "|@,") or any(char.isdigit() for char in stripped):
+        return False
+    words = stripped.split()
+    if len(words) > 5:
+        return False
+    if section_key(stripped) is not None:
+        return stripped.isupper() or stripped.istitle() or len(words) <= 2
+    return stripped.isupper() and len(stripped) >= 4
+
+
+def split_plain_sections(text):
+    """
+    Splits plain resume text (as parsed from PDF/DOCX) into sections for per-section tailoring.
+
+    The lines before the first heading form the "header"; each heading line becomes its own
+    "heading" unit; experience/project sections are split into "entry" units (a new entry starts
+    at the first non-bullet line after a bullet); other sections stay whole ("section").
+
+    Args:
+        text (str): Plain resume text.
+
+    Returns:
+        list[ResumeSection]: The sections in document order (empty lines dropped).
+    """
+    sections = []
+    current = ResumeSection("header")
+    heading = None
+    last_was_bullet = False
+
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        if looks_like_heading(line):
+            if current.lines:
+                sections.append(current)
+            heading = line.strip().rstrip(":").strip()
+            sections.append(ResumeSection("heading", heading=heading, lines=[line.strip()]))
+            kind = "entry" if section_key(heading) in ENTRY_SECTION_KEYS else "section"
+            current = ResumeSection(kind, heading=heading)
+            last_was_bullet = False
+            continue
+        is_bullet = bool(BULLET_PATTERN.match(line))
+        if current.kind == "entry" and current.lines and last_was_bullet and not is_bullet:
+            sections.append(current)
+            current = ResumeSection("entry", heading=heading)
+        if current.kind == "entry" and current.title is None and not is_bullet:
+            current.title = line.strip()
+        current.lines.append(line.strip())
+        last_was_bullet = is_bullet
+
+    if current.lines:
+        sections.append(current)
+    return sections
+
+
+def mark_plain_section(section):
+    """
+    Adds formatting markers to a plain-text section without an LLM call. Used for headings and
+    short headers, and as the fallback when a section could not be tailored.
+    """
+    if section.kind == "heading":
+        return "\n".join(f"{FMT_HEADING} {line.rstrip(':').strip()}" for line in section.lines)
+    marked = []
+    for position, line in enumerate(section.lines):
+        if section.kind == "header":
+            marker = FMT_NAME if position == 0 else FMT_CONTACT
+        elif BULLET_PATTERN.match(line):
+            marker = FMT_BULLET
+        else:
+            marker = FMT_NORMAL
+        marked.append(f"{marker} {line.strip()}")
+    return "\n".join(marked)
+
+
+def join_sections(section_texts):
+    """Stitches section texts back together in order, skipping empty ones."""
+    return "\n".join(text.strip("\n") for text in section_texts if text and text.strip())
+
+
+def _words(text):
+    return set(re.findall(r"[a-z0-9][a-z0-9+#.]*", text.lower()))
+
+
+def _name_tokens(title):
+    """Distinctive words of an entry title (e.g. 'Acme Corporation' -> {'acme'})."""
+    return {w.strip(".") for w in _words(title) if len(w.strip(".")) >= 3 and w.strip(".") not in STOPWORDS}
+
+
+def section_key(heading):
+    """Maps a heading like 'PROFESSIONAL EXPERIENCE' to a SECTION_SYNONYMS key (or None)."""
+    heading_words = _words(heading or "")
+    for key in SECTION_SYNONYMS:
+        if any(word.startswith(key) for word in heading_words):
+            return key
+    return None
+
+
+def find_sections_for_feedback(sections, feedback):
+    """
+    Works out which sections a chat feedback message is about, using names and section words.
+
+    Entry names (company/project) win over section words, e.g. "rephrase my second bullet at Acme"
+    targets only the Acme entry, while "tighten my skills list" targets the skills section.
+
+    Args:
+        sections (list[ResumeSection]): Output of split_marked_sections().
+        feedback (str): The user's modification request.
+
+    Returns:
+        list[int]: Indices of the sections to regenerate, or [] if the feedback cannot be scoped
+        (it is global, matches nothing, or touches most of the resume).
+    """
+    feedback_lower = (feedback or "").lower()
+    if not feedback_lower.strip() or any(cue in feedback_lower for cue in GLOBAL_CUES):
+        return []
+    feedback_words = _words(feedback_lower)
+
+    # 1. Entries named in the feedback
+    targets = [i for i, s in enumerate(sections)
+               if s.kind == "entry" and s.title and (_name_tokens(s.title) & feedback_words)]
+
+    # 2. Otherwise, whole sections referred to by their kind (skills, education, ...)
+    if not targets:
+        wanted = {key for key, synonyms in SECTION_SYNONYMS.items() if feedback_words & set(synonyms)}
+        if wanted:
+            targets = [i for i, s in enumerate(sections)
+                       if s.kind in ("entry", "section") and section_key(s.heading) in wanted]
+        if any(word in feedback_words for word in HEADER_WORDS):
+            targets = sorted(set(targets) | {i for i, s in enumerate(sections) if s.kind == "header"})
+
+    if not targets:
+        return []
+    total_size = sum(len(s.text) for s in sections) or 1
+    scoped_size = sum(len(sections[i].text) for i in targets)
+    if scoped_size / total_size > MAX_SCOPED_FRACTION:
+        log.info(f"Feedback touches {scoped_size / total_size:.0%} of the resume; not scoping it.")
+        return []
+    return targets
+
+
+if __name__ == "__main__":
+    # Example usage when running this script directly
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    print("--- Testing resume section splitting ---")
+    sample_block = "\n".join([
+        f"{FMT_NAME} Jane Doe",
+        f"{FMT_CONTACT} jane@example.com | linkedin.com/in/janedoe",
+        f"{FMT_HEADING} EDUCATION",
+        f"{FMT_NORMAL} State University | MS in Computer Science",
+        f"{FMT_DATES} 2018 - 2020",
+        f"{FMT_HEADING} PROFESSIONAL EXPERIENCE",
+        f"{FMT_SUBHEADING_COMPANY} Acme Corporation",
+        f"{FMT_SUBHEADING_TITLE} Software Engineer",
+        f"{FMT_BULLET} - Built data pipelines in Python.",
+        f"{FMT_BULLET} - Reduced cloud costs by 20%.",
+        f"{FMT_SUBHEADING_COMPANY} Globex",
+        f"{FMT_SUBHEADING_TITLE} Data Analyst",
+        f"{FMT_BULLET} - Wrote SQL reports.",
+        f"{FMT_HEADING} TECHNICAL SKILLS",
+        f"{FMT_NORMAL} Python, SQL, AWS",
+    ])
+    parsed = split_marked_sections(sample_block)
+    for section in parsed:
+        print(section)
+    assert join_sections(s.text for s in parsed) == sample_block, "Round trip failed"
+    for request in ("Rephrase my second bullet at Acme", "Tighten the skills list", "Make the whole resume more concise"):
+        print(f"{request!r} -> {[parsed[i].label for i in find_sections_for_feedback(parsed, request)]}")
+    sample_plain = "\n".join([
+        "Jane Doe",
+        "jane@example.com | 555-0100",
+        "EXPERIENCE",
+        "Acme Corporation - Software Engineer",
+        "- Built data pipelines in Python.",
+        "- Reduced cloud costs by 20%.",
+        "Globex - Data Analyst",
+        "- Wrote SQL reports.",
+        "SKILLS",
+        "Python, SQL, AWS",
+    ])
+    for section in split_plain_sections(sample_plain):
+        print(section)
+    print("--- Test Finished ---")
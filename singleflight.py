@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import threading
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+
+class _Call:
+    """One in-flight execution that concurrent callers with the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key onto one execution: the first caller (the
+    leader) runs the function, callers arriving while it runs wait for and share its result
+    (or its exception). Nothing is remembered once the call finishes; that is the cache's job.
+
+    Sync callers coalesce across threads; async callers coalesce with other coroutines on the
+    same event loop.
+    """
+
+    def __init__(self, name="single-flight"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {} # key -> _Call
+        self._async_calls = {} # (event loop, key) -> asyncio.Future
+        self._stats = {"executions": 0, "coalesced": 0}
+
+    def do(self, key, fn):
+        """
+        Runs `fn()` unless a call with `key` is already in flight, in which case its outcome is shared.
+
+        Returns:
+            tuple: (result, shared) where `shared` is True if this caller attached to another's call.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats["executions"] += 1
+            else:
+                call.waiters += 1
+                self._stats["coalesced"] += 1
+        if not leader:
+            log.info(f"{self.name}: joined in-flight call {str(key)[:12]} ({call.waiters} waiting).")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    async def ado(self, key, coroutine_factory):
+        """Async counterpart of do(); `coroutine_factory()` is only called by the leader."""
+        loop_key = (asyncio.get_running_loop(), key)
+        with self._lock:
+            future = self._async_calls.get(loop_key)
+            leader = future is None
+            if leader:
+                future = self._async_calls[loop_key] = asyncio.get_running_loop().create_future()
+                self._stats["executions"] += 1
+            else:
+                self._stats["coalesced"] += 1
+        if not leader:
+            log.info(f"{self.name}: joined in-flight async call {str(key)[:12]}.")
+            # shield: a cancelled follower must not cancel the shared call
+            return await asyncio.shield(future), True
+
+        try:
+            result = await coroutine_factory()
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception() # Mark as retrieved so an unobserved failure is not logged by asyncio
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                del self._async_calls[loop_key]
+        return result, False
+
+    def stats(self):
+        """Returns executions (leader runs), coalesced (callers that shared a run) and in-flight counts."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls) + len(self._async_calls)
+        return stats
+
+
+if __name__ == "__main__":
+    # Example usage when running this script directly
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    print("--- Testing single-flight coalescing ---")
+    flight = SingleFlight("demo")
+    executions = []
+
+    def slow_call(value):
+        executions.append(value)
+        time.sleep(0.2)
+        return value * 2
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        results = list(pool.map(lambda _: flight.do("same-key", lambda: slow_call(21)), range(5)))
+    print(f"Sync results: {results}; executions: {len(executions)}; stats: {flight.stats()}")
+
+    async def _async_demo():
+        async def slow_async():
+            executions.append("async")
+            await asyncio.sleep(0.2)
+            return "done"
+        return await asyncio.gather(*(flight.ado("async-key", slow_async) for _ in range(4)))
+
+    print(f"Async results: {asyncio.run(_async_demo())}; stats: {flight.stats()}")
+    print("--- Test Finished ---")
@@ -0,0 +1,145 @@
+import logging
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+MAX_PREAMBLE_CHARS = 800 # Chatter allowed before the start marker ("Thought: ... Final Answer:" is far shorter)
+MIN_CHECKED_LINES = 8 # Body lines seen before the formatting-marker share is judged
+MIN_MARKED_FRACTION = 0.25 # Below this, the body is prose, not a marked resume (local repair cannot fix that)
+
+# Parser states
+PREAMBLE = "preamble" # Waiting for the start marker
+BODY = "body" # Inside the block, waiting for the end marker
+FREE = "free" # An allowed alternative answer (e.g. "QUESTION: ..."); nothing more is checked
+COMPLETE = "complete" # End marker seen; the rest of the generation is not needed
+VIOLATION = "violation" # The output cannot satisfy the contract; the generation should be cancelled
+
+
+class MarkerStreamParser:
+    """
+    Incremental checker for the marker contract of one streamed agent output. feed() every chunk
+    as it arrives; it returns True once the generation should stop, either because the end marker
+    has arrived (state COMPLETE) or because the output provably violates the contract (state
+    VIOLATION, reason in `violation`). Only failures the local output repair cannot fix count as
+    violations: no start marker (and no marked line) within `max_preamble_chars`, or a block whose
+    lines mostly lack formatting markers.
+    """
+
+    def __init__(self, start_marker, end_marker, line_pattern=None, alternative_prefixes=(), max_preamble_chars=MAX_PREAMBLE_CHARS):
+        """
+        Args:
+            start_marker, end_marker (str): The main markers enclosing the block.
+            line_pattern (re.Pattern): If given, body lines are expected to match it (FMT_* markers);
+                a matching line in the preamble also opens the block (the repair wraps such output).
+            alternative_prefixes (tuple): Line prefixes of an allowed unmarked answer (e.g. "QUESTION:").
+            max_preamble_chars (int): Output allowed before the block starts.
+        """
+        self.start_marker = start_marker
+        self.end_marker = end_marker
+        self.line_pattern = line_pattern
+        self.alternative_prefixes = tuple(alternative_prefixes)
+        self.max_preamble_chars = max_preamble_chars
+        self.state = PREAMBLE
+        self.violation = None
+        self._buffer = ""
+        self._line_start = 0 # Offset of the first line not checked yet
+        self._body_start = None
+        self._body_lines = 0
+        self._marked_lines = 0
+
+    @property
+    def text(self):
+        return self._buffer
+
+    @property
+    def finished(self):
+        return self.state in (COMPLETE, VIOLATION)
+
+    def feed(self, chunk):
+        """Consumes one chunk; returns True if the generation should stop."""
+        if self.finished or not chunk:
+            return self.finished
+        search_from = max(0, len(self._buffer) - max(len(self.start_marker), len(self.end_marker)))
+        self._buffer += chunk
+        if self.state == PREAMBLE:
+            self._scan_preamble(search_from)
+        if self.state == BODY:
+            self._scan_body(search_from)
+        return self.finished
+
+    def _fail(self, reason):
+        self.state = VIOLATION
+        self.violation = reason
+        log.warning(f"Streamed output violates the {self.start_marker!r} contract: {reason}")
+
+    def _complete_lines(self):
+        """Yields (offset, line) for the lines completed since the last call."""
+        end = self._buffer.rfind("\n")
+        if end < self._line_start:
+            return
+        offset = self._line_start
+        for line in self._buffer[self._line_start:end].split("\n"):
+            yield offset, line
+            offset += len(line) + 1
+        self._line_start = end + 1
+
+    def _scan_preamble(self, search_from):
+        start = self._buffer.find(self.start_marker, search_from)
+        if start != -1:
+            self._open_body(start + len(self.start_marker))
+            return
+        if any(prefix in self._buffer for prefix in self.alternative_prefixes): # The preamble is short, rescanning is cheap
+            self.state = FREE
+            return
+        for offset, line in self._complete_lines():
+            if self.line_pattern is not None and self.line_pattern.match(line.strip()):
+                self._open_body(offset) # Marked lines without the start marker: the repair wraps them
+                return
+        if len(self._buffer) > self.max_preamble_chars:
+            self._fail(f"no {self.start_marker!r} in the first {self.max_preamble_chars} characters")
+
+    def _open_body(self, offset):
+        self.state = BODY
+        self._body_start = offset
+        self._line_start = max(self._line_start, offset)
+
+    def _scan_body(self, search_from):
+        if self._buffer.find(self.end_marker, max(search_from, self._body_start)) != -1:
+            self.state = COMPLETE
+            return
+        if self.line_pattern is None:
+            return
+        for _, line in self._complete_lines():
+            stripped = line.strip()
+            if not stripped or self.end_marker.startswith(stripped):
+                continue
+            self._body_lines += 1
+            if self.line_pattern.match(stripped):
+                self._marked_lines += 1
+            if self._body_lines >= MIN_CHECKED_LINES and self._marked_lines / self._body_lines < MIN_MARKED_FRACTION:
+                self._fail(f"only {self._marked_lines} of {self._body_lines} lines carry a formatting marker")
+                return
+
+
+if __name__ == "__main__":
+    # Example usage when running this script directly
+    import re
+    from resume_sections import MARKER_PATTERN
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    print("--- Testing streaming marker parser ---")
+    start, end = "=== MODIFIED RESUME START ===", "=== MODIFIED RESUME END ==="
+
+    def run(label, text, **kwargs):
+        parser = MarkerStreamParser(start, end, line_pattern=MARKER_PATTERN, **kwargs)
+        chunks = re.findall(r"\S+\s*|\s+", text)
+        used = next((i + 1 for i, chunk in enumerate(chunks) if parser.feed(chunk)), len(chunks))
+        print(f"{label}: state={parser.state}, chunks used {used}/{len(chunks)}, violation={parser.violation}")
+
+    good = f"Thought: done\nFinal Answer: {start}\n@@NAME@@ Jane Doe\n@@BULLET@@ - Built things\n{end}\nHope this helps! " + "More chatter. " * 50
+    run("Well-formed", good)
+    run("Chatter only", "Sure, here are some thoughts about your resume. " * 40)
+    run("Unmarked body", f"{start}\n" + "This is a plain sentence about the resume.\n" * 20 + end)
+    run("Marked lines, no start marker", "Here you go:\n@@NAME@@ Jane Doe\n@@HEADING@@ SKILLS\n" + end)
+    run("Alternative answer", "QUESTION: Which project should the essay focus on? " * 30, alternative_prefixes=("QUESTION:",))
+    print("--- Test Finished ---")
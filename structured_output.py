@@ -0,0 +1,303 @@
+import re
+import json
+import logging
+from resume_sections import (
+    FMT_NAME, FMT_CONTACT, FMT_HEADING, FMT_SUBHEADING_COMPANY, FMT_SUBHEADING_TITLE,
+    FMT_SUBHEADING_PROJECT, FMT_DATES, FMT_BULLET, FMT_NORMAL, MARKER_PATTERN, BULLET_PATTERN
+)
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+# Resume element types of the JSON output mode and the formatting markers they stand for
+ELEMENT_MARKERS = {
+    "name": FMT_NAME,
+    "contact": FMT_CONTACT,
+    "heading": FMT_HEADING,
+    "company": FMT_SUBHEADING_COMPANY,
+    "title": FMT_SUBHEADING_TITLE,
+    "project": FMT_SUBHEADING_PROJECT,
+    "dates": FMT_DATES,
+    "bullet": FMT_BULLET,
+    "normal": FMT_NORMAL,
+}
+MARKER_TYPES = {marker: element_type for element_type, marker in ELEMENT_MARKERS.items()}
+ANALYSIS_LIST_FIELDS = ("strengths", "gaps", "missing_keywords", "recommendations")
+ANALYSIS_FIELDS = ("summary",) + ANALYSIS_LIST_FIELDS
+DOCUMENT_KEYS = ("analysis", "resume")
+CODE_FENCE_PATTERN = re.compile(r"^```(?:json)?\s*|\s*```$", re.MULTILINE)
+
+
+class StructuredOutputError(ValueError):
+    """The agent output holds no JSON object, or the object does not match the schema."""
+
+
+# --- Prompt Instructions ---
+def format_instructions(include_analysis=True, include_resume=True):
+    """
+    The output-format part of a JSON-mode task prompt (much shorter than the marker rules).
+
+    Args:
+        include_analysis (bool): Ask for the "analysis" object.
+        include_resume (bool): Ask for the "resume" element list.
+
+    Returns:
+        str: Instructions describing the schema, with a small example.
+    """
+    fields, example = [], {}
+    if include_analysis:
+        fields.append(
+            '"analysis": {"summary": string, "strengths": [string], "gaps": [string], '
+            '"missing_keywords": [string], "recommendations": [string]}'
+        )
+        example["analysis"] = {"summary": "Strong backend fit.", "strengths": ["Python"], "gaps": ["No Kubernetes"],
+                               "missing_keywords": ["Kubernetes"], "recommendations": ["Mention container work"]}
+    if include_resume:
+        fields.append(f'"resume": [{{"type": one of {", ".join(ELEMENT_MARKERS)}, "text": string}}] in document order')
+        example["resume"] = [
+            {"type": "name", "text": "John Doe"}, {"type": "heading", "text": "EXPERIENCE"},
+            {"type": "company", "text": "Example Corp"}, {"type": "title", "text": "Software Engineer"},
+            {"type": "dates", "text": "Jan 2023 - Present"}, {"type": "bullet", "text": "Did something important."},
+        ]
+    return (
+        "Respond with a single JSON object and nothing else (no markdown, no commentary) with these keys:\n"
+        + "\n".join(f"- {field}" for field in fields)
+        + "\nUse one resume element per line of the resume ('company'/'project' open an entry; 'normal' is any other line)."
+        + f"\nExample: {json.dumps(example)}"
+    )
+
+
+# --- Parsing ---
+def close_truncated_json(text):
+    """
+    Repairs a JSON document cut off mid-generation (max_tokens, dropped stream): everything after
+    the last complete object or array is dropped and the still-open brackets are closed.
+
+    Returns:
+        str: The closed document, or None if `text` is not truncated or nothing complete remains.
+    """
+    stack = []
+    in_string = escaped = False
+    last_complete = None # (offset, open brackets) after the last closed object/array
+    for offset, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append(char)
+        elif char in "}]":
+            if not stack:
+                return None
+            stack.pop()
+            if not stack:
+                return None # Complete document: nothing to repair
+            last_complete = (offset, list(stack))
+    if not stack or last_complete is None:
+        return None
+    offset, still_open = last_complete
+    closers = "".join("}" if bracket == "{" else "]" for bracket in reversed(still_open))
+    return text[:offset + 1] + closers
+
+
+def _next_document_start(decoder, text, start):
+    """Offset of the next complete object holding a top-level schema key, or None."""
+    start = text.find("{", start)
+    while start != -1:
+        try:
+            value, _ = decoder.raw_decode(text, start)
+            if isinstance(value, dict) and any(key in value for key in DOCUMENT_KEYS):
+                return start
+        except json.JSONDecodeError:
+            pass
+        start = text.find("{", start + 1)
+    return None
+
+
+def extract_json_object(text):
+    """
+    Returns the JSON object in `text`; code fences and surrounding chatter are skipped. Several
+    top-level objects (e.g. the joined analysis and modification stage outputs) are merged, the
+    first occurrence of a key winning. A truncated last object is closed (see close_truncated_json).
+
+    Returns:
+        tuple: (object, repaired) where `repaired` is True if a truncated object had to be closed.
+
+    Raises:
+        StructuredOutputError: If no object can be decoded.
+    """
+    if not isinstance(text, str):
+        raise StructuredOutputError("Output is not text.")
+    text = CODE_FENCE_PATTERN.sub("", text.strip())
+    decoder = json.JSONDecoder()
+    merged = None
+    repaired = False
+    start = text.find("{")
+    while start != -1:
+        try:
+            value, end = decoder.raw_decode(text, start)
+        except json.JSONDecodeError:
+            # Truncated: close it where the next stage's document begins (or at the end of the text)
+            next_start = _next_document_start(decoder, text, start + 1)
+            closed = close_truncated_json(text[start:next_start])
+            try:
+                value, end = decoder.raw_decode(closed)[0], next_start or len(text)
+                repaired = True
+                log.info("Closed a truncated JSON object.")
+            except (TypeError, json.JSONDecodeError):
+                start = text.find("{", start + 1)
+                continue
+        if isinstance(value, dict):
+            merged = merged or {}
+            for key, item in value.items():
+                merged.setdefault(key, item)
+        start = text.find("{", end)
+    if merged is None:
+        raise StructuredOutputError("No JSON object found in the output.")
+    return merged, repaired
+
+
+def _validate_analysis(analysis):
+    if not isinstance(analysis, dict):
+        raise StructuredOutputError('"analysis" must be an object.')
+    validated = {"summary": str(analysis.get("summary") or "").strip()}
+    for field in ANALYSIS_LIST_FIELDS:
+        items = analysis.get(field) or []
+        if isinstance(items, str):
+            items = [items]
+        if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+            raise StructuredOutputError(f'"analysis.{field}" must be a list of strings.')
+        validated[field] = [item.strip() for item in items if item.strip()]
+    if not any(validated.values()):
+        raise StructuredOutputError('"analysis" is empty.')
+    return validated
+
+
+def _validate_elements(elements):
+    if not isinstance(elements, list) or not elements:
+        raise StructuredOutputError('"resume" must be a non-empty list.')
+    validated = []
+    for position, element in enumerate(elements):
+        if not isinstance(element, dict):
+            raise StructuredOutputError(f"Resume element {position} is not an object.")
+        element_type = str(element.get("type", "")).strip().lower()
+        text = element.get("text")
+        if element_type not in ELEMENT_MARKERS:
+            raise StructuredOutputError(f"Resume element {position} has unknown type {element.get('type')!r}.")
+        if not isinstance(text, str):
+            raise StructuredOutputError(f"Resume element {position} has no text.")
+        text = " ".join(text.split())
+        if text:
+            validated.append({"type": element_type, "text": text})
+    if not validated:
+        raise StructuredOutputError('"resume" has no non-empty elements.')
+    return validated
+
+
+def parse_document(text, require_analysis=False, require_resume=False):
+    """
+    Parses and validates a JSON-mode agent output in one pass.
+
+    Args:
+        text (str): Raw agent output.
+        require_analysis, require_resume (bool): Fail if that part is missing.
+
+    Returns:
+        dict: {"analysis": dict or None, "resume": list of {"type", "text"} or None,
+        "repaired": True if the output was truncated and had to be closed}.
+
+    Raises:
+        StructuredOutputError: If the output is not a schema-conformant JSON object.
+    """
+    document, repaired = extract_json_object(text)
+    analysis = document.get("analysis")
+    elements = document.get("resume")
+    if analysis is None and require_analysis:
+        raise StructuredOutputError('Missing "analysis".')
+    if elements is None and require_resume:
+        raise StructuredOutputError('Missing "resume".')
+    return {
+        "analysis": _validate_analysis(analysis) if analysis is not None else None,
+        "resume": _validate_elements(elements) if elements is not None else None,
+        "repaired": repaired,
+    }
+
+
+# --- Conversion ---
+def analysis_to_text(analysis):
+    """Renders a validated analysis object as the plain-text analysis the GUI and chat use."""
+    parts = [analysis["summary"]] if analysis.get("summary") else []
+    for field in ANALYSIS_LIST_FIELDS:
+        if analysis.get(field):
+            parts.append(f"{field.replace('_', ' ').capitalize()}:\n" + "\n".join(f"- {item}" for item in analysis[field]))
+    return "\n\n".join(parts)
+
+
+def _element_pair(element):
+    if isinstance(element, dict):
+        return element.get("type"), element.get("text")
+    return element # (type, text)
+
+
+def elements_to_marked_text(elements):
+    """
+    Converts resume elements (dicts with "type"/"text", or (type, text) pairs) into marked text.
+    Unknown types become normal paragraphs; bullets get a "- " prefix if they have none.
+    """
+    lines = []
+    for element in elements:
+        element_type, text = _element_pair(element)
+        text = " ".join(str(text or "").split())
+        if not text:
+            continue
+        marker = ELEMENT_MARKERS.get(str(element_type).lower(), FMT_NORMAL)
+        if marker == FMT_BULLET and not BULLET_PATTERN.match(text):
+            text = f"- {text}"
+        lines.append(f"{marker} {text}")
+    return "\n".join(lines)
+
+
+def marked_text_to_elements(marked_text):
+    """Inverse of elements_to_marked_text (unmarked lines become "normal" elements)."""
+    elements = []
+    for line in (marked_text or "").splitlines():
+        if not line.strip():
+            continue
+        match = MARKER_PATTERN.match(line)
+        marker, text = (match.group(1), match.group(2)) if match else (FMT_NORMAL, line)
+        element_type = MARKER_TYPES.get(marker, "normal")
+        if element_type == "bullet":
+            text = BULLET_PATTERN.sub("", text, count=1)
+        elements.append({"type": element_type, "text": text.strip()})
+    return elements
+
+
+if __name__ == "__main__":
+    # Example usage when running this script directly
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    print("--- Testing structured output ---")
+    print(format_instructions())
+    raw = (
+        'Sure! ```json\n{"analysis": {"summary": "Good fit.", "strengths": ["Python"], "gaps": ["Kubernetes"]},'
+        ' "resume": [{"type": "name", "text": "Jane Doe"}, {"type": "heading", "text": "EXPERIENCE"},'
+        ' {"type": "company", "text": "Acme"}, {"type": "bullet", "text": "Built pipelines"}]}\n```'
+    )
+    document = parse_document(raw, require_analysis=True, require_resume=True)
+    print(analysis_to_text(document["analysis"]))
+    marked = elements_to_marked_text(document["resume"])
+    print(marked)
+    print(marked_text_to_elements(marked) == document["resume"])
+    truncated = '{"resume": [{"type": "name", "text": "Jane Doe"}, {"type": "bullet", "text": "Buil'
+    print(f"Truncated: {parse_document(truncated, require_resume=True)}")
+    for broken in ("no json here", '{"resume": [{"type": "footer", "text": "x"}]}'):
+        try:
+            parse_document(broken, require_resume=True)
+        except StructuredOutputError as e:
+            print(f"Rejected: {e}")
+    print("--- Test Finished ---")
@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+DEFAULT_TELEMETRY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "job_app_telemetry.jsonl")
+DEFAULT_MAX_FILE_BYTES = 5 * 1024 * 1024 # Rotate at 5 MB
+DEFAULT_BACKUP_COUNT = 3
+DEFAULT_WINDOW = 1000 # Records kept in memory for percentiles
+PERCENTILES = (50, 95, 99)
+# Numeric record fields summarized by the aggregator
+SUMMARY_FIELDS = ("latency", "time_to_first_token", "prompt_tokens", "completion_tokens")
+
+
+def _is_enabled():
+    return os.getenv("JOB_APP_DISABLE_TELEMETRY", "").strip().lower() not in ("1", "true", "yes")
+
+
+# The record of the run currently executing in this thread / asyncio task (None outside a run).
+# Worker threads of a run see it only if they are started in a copy of the run's context
+# (contextvars.copy_context().run); they then update the record concurrently, hence the lock.
+_current_record = contextvars.ContextVar("job_app_telemetry_record", default=None)
+_record_lock = threading.Lock()
+
+
+# --- Recording API ---
+@contextmanager
+def track_run(kind, model=None):
+    """
+    Context manager wrapping one agent run (one run_*/arun_* call). Yields the record dict,
+    which the helpers below fill in; on exit the latency is stamped and the record emitted.
+    Nested runs are recorded separately.
+    """
+    record = {
+        "timestamp": time.time(),
+        "kind": kind,
+        "model": model,
+        "cache": None, # "hit", "miss" or "coalesced" (shared an identical in-flight run)
+        "llm_calls": 0,
+        "retries": 0,
+        "prompt_tokens": None,
+        "completion_tokens": None,
+        "time_to_first_token": None,
+        "latency": None,
+        "extraction": None, # Which output-extraction path succeeded (analysis/modification runs)
+        "success": None, # False if the run returned an error/placeholder string
+        "error": None, # Exception type if the run raised
+    }
+    token = _current_record.set(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["latency"] = time.perf_counter() - started
+        _current_record.reset(token)
+        emit(record)
+
+
+def _add_tokens(record, field, value):
+    if value is not None:
+        record[field] = (record[field] or 0) + value
+
+
+def record_llm_call(prompt_tokens=None, completion_tokens=None, time_to_first_token=None, calls=1):
+    """Adds an LLM call's usage (or `calls` calls' combined usage) to the current run (no-op outside a run)."""
+    record = _current_record.get()
+    if record is None:
+        return
+    with _record_lock:
+        record["llm_calls"] += calls
+        _add_tokens(record, "prompt_tokens", prompt_tokens)
+        _add_tokens(record, "completion_tokens", completion_tokens)
+        if time_to_first_token is not None and record["time_to_first_token"] is None:
+            # Only the first streamed call of a run decides when the user first sees output
+            record["time_to_first_token"] = time_to_first_token
+
+
+def record_retry():
+    """Counts one retried LLM call in the current run."""
+    record = _current_record.get()
+    if record is not None:
+        with _record_lock:
+            record["retries"] += 1
+
+
+def current_field(name, default=None):
+    """Reads a field of the current run's record (`default` outside a run)."""
+    record = _current_record.get()
+    if record is None:
+        return default
+    with _record_lock:
+        return record.get(name, default)
+
+
+def annotate(**fields):
+    """Sets extra fields (e.g. cache="hit", extraction="markers") on the current run's record."""
+    record = _current_record.get()
+    if record is not None:
+        with _record_lock:
+            record.update(fields)
+
+
+# --- Aggregation ---
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-pct * len(sorted_values) // 100)) # ceil(pct/100 * n)
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class TelemetryAggregator:
+    """Keeps the most recent records in memory and reports per-kind percentiles and totals."""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self._records = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self._records.append(record)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def summary(self):
+        """
+        Summarizes the recorded runs, grouped by run kind.
+
+        Returns:
+            dict: kind -> {"runs", "cache_hit_rate", "coalesced", "retries", "errors", "extraction",
+                  "total_prompt_tokens", "total_completion_tokens",
+                  and for each SUMMARY_FIELDS entry a {"p50", "p95", "p99"} dict}.
+        """
+        with self._lock:
+            records = list(self._records)
+        grouped = {}
+        for record in records:
+            grouped.setdefault(record["kind"], []).append(record)
+
+        report = {}
+        for kind, runs in grouped.items():
+            hits = sum(1 for r in runs if r.get("cache") == "hit")
+            extraction = {}
+            for r in runs:
+                if r.get("extraction"):
+                    extraction[r["extraction"]] = extraction.get(r["extraction"], 0) + 1
+            entry = {
+                "runs": len(runs),
+                "cache_hit_rate": hits / len(runs),
+                "coalesced": sum(1 for r in runs if r.get("cache") == "coalesced"),
+                "retries": sum(r.get("retries", 0) for r in runs),
+                "errors": sum(1 for r in runs if r.get("error") or r.get("success") is False),
+                "extraction": extraction,
+                "total_prompt_tokens": sum(r.get("prompt_tokens") or 0 for r in runs),
+                "total_completion_tokens": sum(r.get("completion_tokens") or 0 for r in runs),
+            }
+            for field in SUMMARY_FIELDS:
+                values = sorted(r[field] for r in runs if r.get(field) is not None)
+                entry[field] = {f"p{pct}": _percentile(values, pct) for pct in PERCENTILES}
+            report[kind] = entry
+        return report
+
+
+aggregator = TelemetryAggregator()
+
+
+# --- JSONL Sink ---
+_sink_lock = threading.Lock()
+_sink_logger = None
+
+def _get_sink():
+    """Returns the logger that writes records to the rotating JSONL file, creating it on first use."""
+    global _sink_logger
+    with _sink_lock:
+        if _sink_logger is None:
+            path = os.getenv("JOB_APP_TELEMETRY_FILE", DEFAULT_TELEMETRY_FILE)
+            sink = logging.getLogger("job_app.telemetry")
+            sink.setLevel(logging.INFO)
+            sink.propagate = False # Keep JSON lines out of the console and job_app_helper.log
+            try:
+                handler = RotatingFileHandler(path, maxBytes=DEFAULT_MAX_FILE_BYTES, backupCount=DEFAULT_BACKUP_COUNT, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                sink.addHandler(handler)
+            except OSError as e:
+                log.warning(f"Telemetry file {path} unavailable, keeping records in memory only: {e}")
+            _sink_logger = sink
+        return _sink_logger
+
+def emit(record):
+    """Adds a finished record to the aggregator and appends it to the JSONL file."""
+    if not _is_enabled():
+        return
+    aggregator.add(record)
+    try:
+        _get_sink().info(json.dumps(record, default=str))
+    except Exception as e: # Telemetry must never break a run
+        log.debug(f"Could not write telemetry record: {e}")
+
+
+def summary():
+    """Returns the in-process aggregator's per-kind summary (see TelemetryAggregator.summary)."""
+    return aggregator.summary()
+
+
+if __name__ == "__main__":
+    # Example usage when running this script directly
+    import random
+    import tempfile
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    print("--- Testing telemetry ---")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ["JOB_APP_TELEMETRY_FILE"] = os.path.join(tmp_dir, "telemetry.jsonl")
+        for i in range(20):
+            with track_run("essay", model="demo-model"):
+                annotate(cache="hit" if i % 4 == 0 else "miss")
+                record_llm_call(prompt_tokens=random.randint(800, 1200), completion_tokens=random.randint(200, 600),
+                                time_to_first_token=random.uniform(0.2, 0.8))
+        print(json.dumps(summary(), indent=2))
+        with open(os.environ["JOB_APP_TELEMETRY_FILE"], encoding="utf-8") as f:
+            print(f"JSONL lines written: {sum(1 for _ in f)}")
+        for handler in _get_sink().handlers:
+            handler.close()
+    print("--- Test Finished ---")
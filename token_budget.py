@@ -0,0 +1,215 @@
+import os
+import math
+import logging
+import threading
+from cache import TieredCache
+from config import get_env_number
+import telemetry
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+CHARS_PER_TOKEN = 4 # Rough estimate, used for inputs and for outputs whose usage is not reported
+DEFAULT_MAX_OUTPUT_TOKENS = 8192 # Ceiling of any single budget
+BUDGET_STEP = 256 # Budgets are rounded up to this, so only a handful of LLM clients are ever built
+SAFETY_MARGIN = 1.3 # Headroom over the predicted output length
+LEARNING_RATE = 0.2 # Weight of the newest observation in the moving averages
+SPREAD_FACTOR = 2.0 # Budgets also cover this many average deviations of the observed lengths
+TRUNCATION_FRACTION = 0.97 # Output within this share of its budget counts as cut off
+TRUNCATION_GROWTH = 1.5 # A cut-off output raises its kind's estimate by this factor right away
+MIN_SOURCE_TOKENS = 50 # Shorter sources say little about the output/source ratio
+
+# Prior output-length model per task kind: (output tokens per source token, fixed tokens, minimum budget).
+# Proportional kinds rewrite their source (resume, section, text to re-wrap); the others have a
+# length set by the prompt (an analysis report, a 1-3 paragraph essay, a chat answer).
+PRIORS = {
+    "analysis": (0.0, 700, 512),
+    "analysis_json": (0.0, 600, 512),
+    "modification": (1.1, 250, 512), # Markers and the enclosure add a few tokens per line
+    "modification_json": (1.6, 150, 512), # One {"type": ..., "text": ...} object per line
+    "section": (1.1, 80, 256),
+    "essay": (0.0, 600, 512),
+    "explanation": (0.0, 300, 256),
+    "rewrap": (1.1, 100, 256),
+}
+
+
+def is_enabled():
+    """False if JOB_APP_ADAPTIVE_MAX_TOKENS is set to 0 (every task then gets the fixed default budget)."""
+    return os.getenv("JOB_APP_ADAPTIVE_MAX_TOKENS", "").strip().lower() not in ("0", "false", "no")
+
+
+def estimate_tokens(text):
+    return len(text or "") // CHARS_PER_TOKEN
+
+
+class Budget:
+    """
+    The generation budget of one task. It doubles as the task's callback: called with the task
+    output (a crewai TaskOutput, a llm_client.CompletionResult or a string) it reports the actual
+    output length back to the model that planned it.
+    """
+
+    def __init__(self, model, kind, source_tokens, predicted_tokens, max_tokens):
+        self.model = model
+        self.kind = kind
+        self.source_tokens = source_tokens
+        self.predicted_tokens = predicted_tokens
+        self.max_tokens = max_tokens
+
+    def __call__(self, output):
+        completion_tokens = getattr(output, "completion_tokens", None)
+        if completion_tokens is None:
+            text = output if isinstance(output, str) else getattr(output, "raw", None) or getattr(output, "text", None)
+            completion_tokens = estimate_tokens(text)
+        if self.model is not None:
+            self.model.record(self, completion_tokens)
+
+    def __repr__(self):
+        return (f"Budget(kind={self.kind!r}, source_tokens={self.source_tokens}, "
+                f"predicted_tokens={self.predicted_tokens}, max_tokens={self.max_tokens})")
+
+
+class OutputLengthModel:
+    """
+    Predicts the output length of each task kind from the size of its source text and turns it
+    into a max_tokens budget (prediction plus SAFETY_MARGIN and SPREAD_FACTOR average deviations,
+    rounded up to BUDGET_STEP). Starts from PRIORS and refines the per-kind estimates with moving
+    averages of the observed output lengths; a cut-off output raises its estimate at once, so the
+    next run of that kind is not cut off again. Estimates are kept in a small TieredCache
+    namespace and survive restarts. Thread-safe.
+    """
+
+    def __init__(self, priors=None, max_output_tokens=None, store=None):
+        self.priors = dict(priors or PRIORS)
+        self.max_output_tokens = max_output_tokens or max(BUDGET_STEP, get_env_number("JOB_APP_MAX_OUTPUT_TOKENS", DEFAULT_MAX_OUTPUT_TOKENS, int))
+        self.store = store
+        self._lock = threading.Lock()
+        self._estimates = {} # kind -> {"ratio", "fixed", "spread", "samples", "truncations"}
+
+    def _estimate(self, kind):
+        # Caller holds the lock
+        estimate = self._estimates.get(kind)
+        if estimate is None:
+            stored = self.store.get(kind) if self.store is not None else None
+            ratio, fixed, _ = self.priors[kind]
+            estimate = stored or {"ratio": ratio, "fixed": fixed, "spread": 0.0, "samples": 0, "truncations": 0}
+            self._estimates[kind] = estimate
+        return estimate
+
+    def _is_proportional(self, kind):
+        return self.priors[kind][0] > 0
+
+    def plan(self, kind, source_text=None):
+        """
+        Returns the Budget for a task of `kind` whose output is derived from `source_text`.
+
+        Args:
+            kind (str): A key of PRIORS.
+            source_text (str): The text the task rewrites (ignored for fixed-length kinds).
+
+        Returns:
+            Budget: Predicted output tokens and the max_tokens to request.
+        """
+        source_tokens = estimate_tokens(source_text)
+        with self._lock:
+            estimate = dict(self._estimate(kind))
+        scale = source_tokens if self._is_proportional(kind) else 1
+        predicted = estimate["fixed"] + (estimate["ratio"] * source_tokens if self._is_proportional(kind) else 0)
+        headroom = predicted * SAFETY_MARGIN + SPREAD_FACTOR * estimate["spread"] * scale
+        max_tokens = math.ceil(headroom / BUDGET_STEP) * BUDGET_STEP
+        max_tokens = min(self.max_output_tokens, max(self.priors[kind][2], max_tokens))
+        return Budget(self, kind, source_tokens, int(predicted), max_tokens)
+
+    def record(self, budget, completion_tokens):
+        """Refines the estimate of `budget.kind` with the actual length of an output it was planned for."""
+        if completion_tokens is None or budget.kind not in self.priors:
+            return
+        truncated = completion_tokens >= budget.max_tokens * TRUNCATION_FRACTION
+        proportional = self._is_proportional(budget.kind)
+        if proportional and budget.source_tokens < MIN_SOURCE_TOKENS and not truncated:
+            return
+        with self._lock:
+            estimate = self._estimate(budget.kind)
+            if proportional:
+                observed = max(0.0, completion_tokens - estimate["fixed"]) / max(budget.source_tokens, 1)
+                field = "ratio"
+            else:
+                observed = float(completion_tokens)
+                field = "fixed"
+            if truncated: # The real length is unknown but larger: jump past it instead of averaging
+                estimate[field] = max(estimate[field], observed) * TRUNCATION_GROWTH
+                estimate["truncations"] += 1
+            else: # Averaged from the prior, so a single odd output does not swing the budget
+                estimate["spread"] += LEARNING_RATE * (abs(observed - estimate[field]) - estimate["spread"])
+                estimate[field] += LEARNING_RATE * (observed - estimate[field])
+            estimate["samples"] += 1
+            snapshot = dict(estimate)
+        if truncated:
+            log.warning(f"{budget.kind} output hit its {budget.max_tokens}-token budget; raised the estimate to {snapshot[field]:.2f}.")
+            telemetry.annotate(truncated=budget.kind)
+        else:
+            log.debug(f"{budget.kind} output: {completion_tokens} tokens (predicted {budget.predicted_tokens}, budget {budget.max_tokens}).")
+        if self.store is not None:
+            self.store.put(budget.kind, snapshot)
+
+    def stats(self):
+        """Current per-kind estimates (only kinds planned or recorded in this process)."""
+        with self._lock:
+            return {kind: dict(estimate) for kind, estimate in self._estimates.items()}
+
+
+# --- Shared Model ---
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """Returns the process-wide OutputLengthModel, backed by the "token_budget" cache namespace."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = OutputLengthModel(store=TieredCache("token_budget", ttl_seconds=0))
+        return _model
+
+
+def plan(kind, source_text=None, default_max_tokens=None):
+    """
+    Budget for one task from the shared model. With adaptive budgets disabled, a Budget that only
+    carries `default_max_tokens` (and records nothing) is returned instead.
+    """
+    if not is_enabled():
+        return Budget(None, kind, estimate_tokens(source_text), None, default_max_tokens)
+    return get_model().plan(kind, source_text)
+
+
+def budget_mode(default_max_tokens=None):
+    """
+    Identifies how budgets are chosen, for response cache keys: ("adaptive", ceiling) or
+    ("fixed", default_max_tokens). Outputs generated under different budget modes are not shared.
+    """
+    if not is_enabled():
+        return ("fixed", default_max_tokens)
+    return ("adaptive", get_model().max_output_tokens)
+
+
+if __name__ == "__main__":
+    # Example usage when running this script directly
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    print("--- Testing output-length budgets ---")
+    model = OutputLengthModel()
+    short_resume = "Jane Doe\nEXPERIENCE\n- Built Python data pipelines\n" * 5
+    long_resume = "Jane Doe\nEXPERIENCE\n- Built Python data pipelines on Kubernetes for a large retailer\n" * 120
+    for kind, source in (("explanation", None), ("essay", None), ("analysis", None),
+                         ("modification", short_resume), ("modification", long_resume)):
+        print(f"Planned: {model.plan(kind, source)}")
+    budget = model.plan("modification", long_resume)
+    budget("x" * budget.max_tokens * CHARS_PER_TOKEN) # A cut-off output
+    print(f"After a cut-off output: {model.plan('modification', long_resume)}")
+    for repeats in (10, 14, 8, 12, 20):
+        budget = model.plan("explanation")
+        budget("A short answer about the changes. " * repeats)
+    print(f"After short explanations: {model.plan('explanation')}")
+    print(f"Estimates: {model.stats()}")
+    print("--- Test Finished ---")
@@ -1,10 +1,20 @@
 import os
+import time
+import hashlib
 import logging
 import re # Import regex
-from docx import Document
-from docx.shared import Pt, Inches, RGBColor
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT, WD_TAB_ALIGNMENT, WD_TAB_LEADER
-import pypdf
+import threading
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import structured_output
+import resume_sections
+import resume_model
+import docx_reader
+from cache import TieredCache, make_cache_key
+from config import get_env_number
+# python-docx and pypdf are imported inside the functions that use them to keep GUI startup fast
 # Removed tkinter imports as messagebox will be replaced by logging
 # import tkinter as tk
 # from tkinter import filedialog, messagebox
@@ -38,18 +48,68 @@ except ImportError:
     agent_defs = FallbackAgentDefs()
 
 
-# --- Existing Functions (parse_resume, save_text_to_file - modified to remove messagebox) ---
-
-def parse_resume(file_path):
+# --- Parsed Resume Cache ---
+# Extracted text is cached by a hash of the file content, so loading the same resume again (or
+# from another path) skips PDF/DOCX extraction. A (path, mtime, size) fingerprint in the same
+# cache avoids even re-hashing an unchanged file. Set JOB_APP_DISABLE_PARSE_CACHE=1 to turn it off.
+PARSER_VERSION = 4 # Bump when extraction changes, so text parsed by older code is not served
+PARSE_CACHE_MAX_BYTES = 20 * 1024 * 1024
+PARSE_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60 # 30 days
+HASH_CHUNK_BYTES = 1024 * 1024
+
+_parse_cache = None
+_parse_cache_lock = threading.Lock()
+
+
+def get_parse_cache():
+    """Returns the parsed-resume TieredCache, creating it on first use."""
+    global _parse_cache
+    with _parse_cache_lock:
+        if _parse_cache is None:
+            _parse_cache = TieredCache(
+                "parsed_resumes", max_disk_bytes=PARSE_CACHE_MAX_BYTES, ttl_seconds=PARSE_CACHE_TTL_SECONDS,
+                enabled=os.getenv("JOB_APP_DISABLE_PARSE_CACHE", "").strip().lower() not in ("1", "true", "yes")
+            )
+        return _parse_cache
+
+
+def file_content_hash(file_path):
+    """Returns the sha256 hex digest of a file's content, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _content_hash(file_path, cache):
+    """Content hash of the file, taken from its fingerprint entry when path, mtime and size are unchanged."""
+    st = os.stat(file_path)
+    fingerprint_key = make_cache_key("fingerprint", os.path.abspath(file_path), st.st_mtime_ns, st.st_size)
+    content_hash = cache.get(fingerprint_key)
+    if content_hash is None:
+        content_hash = file_content_hash(file_path)
+        cache.put(fingerprint_key, content_hash)
+    return content_hash
+
+
+def parse_resume_document(file_path, use_cache=True, max_pages=None, max_bytes=None, store=True, content_hash=None):
     """
-    Parses the text content from a resume file (.pdf or .docx).
-    Replaced messagebox with logging.
+    Parses a resume file (.pdf or .docx) into its text and section structure, served from the
+    parsed-resume cache when the same content was parsed before.
 
     Args:
         file_path (str): The path to the resume file.
+        use_cache (bool): False forces a fresh extraction (the result is still stored, see `store`).
+        max_pages, max_bytes (int): Extraction budget (see get_parse_budget; 0 = unlimited).
+        store (bool): False keeps the result out of the parsed-resume cache. With use_cache=False
+            as well, the cache is not touched at all.
+        content_hash (str): The file's file_content_hash(), if the caller already has it.
 
     Returns:
-        str: The extracted text content, or None if parsing fails or file type is unsupported.
+        dict: {"text": str, "sections": list of resume_sections.ResumeSection.to_dict() dicts,
+        "model": resume_model.ResumeModel.to_dict() of the text, "pages": PDF page count or DOCX line count, "truncated": True if the budget stopped extraction early,
+        "content_hash": str}, or None if parsing fails or the file type is unsupported.
     """
     if not file_path or not os.path.exists(file_path):
         log.error(f"File not found or path is invalid: {file_path}")
@@ -57,27 +117,248 @@ def parse_resume(file_path):
         return None
 
     _, file_extension = os.path.splitext(file_path)
-    text_content = ""
+    file_extension = file_extension.lower()
+    budget = get_parse_budget()
+    max_pages = budget["max_pages"] if max_pages is None else max_pages
+    max_bytes = budget["max_bytes"] if max_bytes is None else max_bytes
+    cache = get_parse_cache()
+    cache_key = None
+    if cache.enabled and (use_cache or store) and file_extension in ('.pdf', '.docx'):
+        try:
+            content_hash = content_hash or _content_hash(file_path, cache)
+            cache_key = make_cache_key("resume", PARSER_VERSION, file_extension, content_hash, max_pages, max_bytes)
+        except OSError as e:
+            log.warning(f"Could not hash {file_path}, parsing without the cache: {e}")
+        if cache_key and use_cache:
+            document = cache.get(cache_key)
+            if document is not None:
+                log.info(f"Parsed-resume cache hit for {os.path.basename(file_path)}; skipped extraction.")
+                resume_model.register(document["text"], resume_model.ResumeModel.from_dict(document["model"]))
+                return document
+
+    started = time.perf_counter()
+    extracted = _extract_resume_text(file_path, file_extension, max_pages, max_bytes)
+    if extracted is None:
+        return None
+    text, pages, truncated = extracted
+    model = resume_model.parse(text, marked=False) # Built once here; the agents and the diff reuse it
+    document = {
+        "text": text,
+        "sections": [section.to_dict() for section in model.to_sections()],
+        "model": model.to_dict(),
+        "pages": pages,
+        "truncated": truncated,
+        "content_hash": content_hash,
+    }
+    log.info(f"Parsed {os.path.basename(file_path)} in {time.perf_counter() - started:.3f}s.")
+    if cache_key and store:
+        cache.put(cache_key, document)
+    return document
+
+
+def get_resume_sections(document):
+    """The ResumeSection objects of a parse_resume_document() result."""
+    return [resume_sections.ResumeSection.from_dict(section) for section in document.get("sections") or []]
+
+
+def get_resume_model(document):
+    """
+    The shared resume_model.ResumeModel of a parse_resume_document() result: the one built at
+    parse time, restored from the document (and registered for the agents and the diff) if this
+    process no longer holds it.
+    """
+    model = resume_model.cached(document["text"])
+    if model is None:
+        model = resume_model.register(document["text"], resume_model.ResumeModel.from_dict(document["model"]))
+    return model
+
+
+def get_parse_cache_stats():
+    """Returns hit/miss counters for the parsed-resume cache (fingerprint and document lookups)."""
+    return get_parse_cache().stats()
+
+
+# --- Existing Functions (parse_resume, save_text_to_file - modified to remove messagebox) ---
+
+def parse_resume(file_path):
+    """
+    Parses the text content from a resume file (.pdf or .docx).
+    Replaced messagebox with logging. Repeat loads of the same content come from the
+    parsed-resume cache (see parse_resume_document).
+
+    Args:
+        file_path (str): The path to the resume file.
+
+    Returns:
+        str: The extracted text content, or None if parsing fails or file type is unsupported.
+    """
+    document = parse_resume_document(file_path)
+    return document["text"] if document else None
+
+
+# --- Text Extraction ---
+# Pages are extracted as a stream and joined once at the end. Large PDFs are fanned out across a
+# process pool (pypdf is pure Python, so threads would not help) in page chunks whose results are
+# consumed in page order, and a page/byte budget stops oversized uploads early.
+DEFAULT_MAX_PAGES = 100 # Longer than any resume or portfolio worth sending to the model
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 # Of extracted text
+PDF_PARALLEL_MIN_PAGES = 8 # Smaller PDFs are extracted in-process (worker start-up would dominate)
+PDF_PAGES_PER_CHUNK = 4 # Pages per pool task: small enough to stream, large enough to amortize re-opening the file
+DEFAULT_EXTRACTION_WORKERS = 4
+
+_extraction_pool = None
+_extraction_pool_lock = threading.Lock()
+
 
+def get_parse_budget():
+    """
+    Returns the extraction budget, read from the environment.
+
+    Environment variables:
+        JOB_APP_PARSE_MAX_PAGES: PDF pages read at most (0 = unlimited).
+        JOB_APP_PARSE_MAX_BYTES: Bytes of extracted text kept at most (0 = unlimited).
+        JOB_APP_PARSE_WORKERS: Processes for large PDFs (1 = always in-process).
+
+    Returns:
+        dict: max_pages, max_bytes, workers.
+    """
+    return {
+        "max_pages": max(0, get_env_number("JOB_APP_PARSE_MAX_PAGES", DEFAULT_MAX_PAGES, int)),
+        "max_bytes": max(0, get_env_number("JOB_APP_PARSE_MAX_BYTES", DEFAULT_MAX_BYTES, int)),
+        "workers": max(1, get_env_number("JOB_APP_PARSE_WORKERS", min(DEFAULT_EXTRACTION_WORKERS, os.cpu_count() or 1), int)),
+    }
+
+
+def _get_extraction_pool(workers):
+    """Returns the shared page-extraction process pool, starting it on first use."""
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is None:
+            # Not fork: the app is multi-threaded by now (warm-up, HTTP pool), and a forked child
+            # can deadlock on a lock another thread held at fork time
+            _extraction_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_extraction_pool.shutdown, wait=False, cancel_futures=True)
+        return _extraction_pool
+
+
+def _discard_extraction_pool():
+    """Drops a broken pool so the next large PDF starts a fresh one."""
+    global _extraction_pool
+    with _extraction_pool_lock:
+        pool, _extraction_pool = _extraction_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _extract_pdf_pages(file_path, start, stop):
+    """Process-pool task: the text of pages [start, stop) of a PDF, one string per page."""
+    import pypdf # Deferred import
+    with open(file_path, 'rb') as file:
+        reader = pypdf.PdfReader(file)
+        return [reader.pages[page_num].extract_text() or "" for page_num in range(start, stop)]
+
+
+def iter_pdf_pages(file_path, max_pages=None, parallel=None):
+    """
+    Yields the text of a PDF page by page, in order. Stopping the iteration early cancels the
+    pages not extracted yet.
+
+    Args:
+        file_path (str): The path to the PDF.
+        max_pages (int): Read at most this many pages (None/0 = all).
+        parallel (bool): Force (or forbid) the process pool; by default it is used for PDFs of at
+            least PDF_PARALLEL_MIN_PAGES pages when more than one worker is configured.
+
+    Yields:
+        tuple: (page_index, page_count, text); page_count is the document's total.
+    """
+    import pypdf # Deferred import
+    workers = get_parse_budget()["workers"]
+    with open(file_path, 'rb') as file:
+        reader = pypdf.PdfReader(file)
+        page_count = len(reader.pages)
+        limit = min(page_count, max_pages) if max_pages else page_count
+        log.info(f"Found {page_count} page(s) in PDF.")
+        if limit < page_count:
+            log.warning(f"Reading only the first {limit} of {page_count} pages (page budget).")
+        if parallel is None:
+            parallel = workers > 1 and limit >= PDF_PARALLEL_MIN_PAGES
+        if not parallel:
+            for page_num in range(limit):
+                yield page_num, page_count, reader.pages[page_num].extract_text() or ""
+            return
+
+    next_page = 0
+    futures = []
     try:
-        if file_extension.lower() == '.pdf':
+        pool = _get_extraction_pool(workers)
+        futures = [pool.submit(_extract_pdf_pages, file_path, start, min(start + PDF_PAGES_PER_CHUNK, limit))
+                   for start in range(0, limit, PDF_PAGES_PER_CHUNK)]
+        for future in futures:
+            for text in future.result():
+                yield next_page, page_count, text
+                next_page += 1
+    except (BrokenProcessPool, OSError, RuntimeError) as e:
+        # No usable pool (e.g. a frozen app or a killed worker): finish in-process
+        log.warning(f"Parallel PDF extraction failed at page {next_page + 1}, continuing in-process: {e}")
+        _discard_extraction_pool()
+        for offset, text in enumerate(_extract_pdf_pages(file_path, next_page, limit)):
+            yield next_page + offset, page_count, text
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def _extract_resume_text(file_path, file_extension, max_pages=None, max_bytes=None):
+    """
+    Extracts the text of a .pdf or .docx file, within the page/byte budget.
+
+    Returns:
+        tuple: (text, PDF page count or DOCX line count, truncated), or None if parsing fails or
+        the file type is unsupported.
+    """
+    parts = []
+    size = 0
+    count = 0
+    truncated = False
+
+    def add(text):
+        """Collects one page/paragraph; returns False once the byte budget is used up."""
+        nonlocal size, truncated
+        size += len(text.encode("utf-8")) + 1
+        if max_bytes and size > max_bytes:
+            truncated = True
+            return False
+        parts.append(text)
+        return True
+
+    try:
+        if file_extension == '.pdf':
             log.info(f"Parsing PDF file: {file_path}")
-            with open(file_path, 'rb') as file:
-                reader = pypdf.PdfReader(file)
-                num_pages = len(reader.pages)
-                log.info(f"Found {num_pages} page(s) in PDF.")
-                for page_num in range(num_pages):
-                    page = reader.pages[page_num]
-                    extracted = page.extract_text()
-                    if extracted: # Check if text was actually extracted
-                         text_content += extracted + "\n"
+            pages = iter_pdf_pages(file_path, max_pages)
+            try:
+                for page_num, count, extracted in pages:
+                    if extracted and not add(extracted): # Check if text was actually extracted
+                        log.warning(f"Stopped at page {page_num + 1}: extracted text exceeds {max_bytes} bytes.")
+                        break
+            finally:
+                pages.close() # Cancels the pages still queued in the pool
+            truncated = truncated or bool(max_pages and count > max_pages)
             log.info("Successfully parsed PDF.")
 
-        elif file_extension.lower() == '.docx':
+        elif file_extension == '.docx':
+            # Streamed straight from the OOXML (no python-docx object model), so page headers,
+            # tables and text boxes are included
             log.info(f"Parsing DOCX file: {file_path}")
-            document = Document(file_path)
-            for para in document.paragraphs:
-                text_content += para.text + "\n"
+            lines = docx_reader.iter_docx_lines(file_path)
+            try:
+                for line in lines:
+                    count += 1
+                    if not add(line):
+                        log.warning(f"Stopped at line {count}: extracted text exceeds {max_bytes} bytes.")
+                        break
+            finally:
+                lines.close() # Stops reading the archive
             log.info("Successfully parsed DOCX.")
 
         else:
@@ -85,12 +366,13 @@ def parse_resume(file_path):
             # messagebox.showwarning("Unsupported File", f"Unsupported file type: {file_extension}\nPlease select a .pdf or .docx file.") # Replaced
             return None
 
+        text_content = "\n".join(parts)
         if not text_content.strip():
              log.warning(f"No text content extracted from file: {file_path}")
              # messagebox.showwarning("Empty File", f"Could not extract text from the file:\n{os.path.basename(file_path)}") # Replaced
              return None
 
-        return text_content.strip()
+        return text_content.strip(), count, truncated
 
     except Exception as e:
         log.error(f"Error parsing file {file_path}: {e}", exc_info=True)
@@ -147,6 +429,7 @@ def save_text_to_file(content, initial_dir=".", title="Save File", default_exten
         _ , chosen_extension = os.path.splitext(file_path)
 
         if chosen_extension.lower() == '.docx':
+             from docx import Document # Deferred import
              # Save as DOCX (plain text paragraphs)
              doc = Document()
              # Add content paragraph by paragraph to preserve some structure if needed
@@ -179,12 +462,20 @@ def format_resume_with_markers(marked_text, filename="formatted_resume.docx"):
     Replaced messagebox calls with logging.
 
     Args:
-        marked_text (str): The AI-generated resume text containing formatting markers.
+        marked_text (str | list | dict | resume_model.ResumeModel): The AI-generated resume text containing
+            formatting markers, or the JSON output mode's structure: a list of {"type", "text"} elements
+            (or (type, text) pairs), or a parsed document with a "resume" list (see structured_output),
+            or a resume model.
         filename (str): The name for the output DOCX file.
 
     Returns:
         str: The path where the file was saved, or None if error.
     """
+    if isinstance(marked_text, resume_model.ResumeModel):
+        marked_text = marked_text.to_marked()
+    if isinstance(marked_text, (list, tuple, dict)):
+        elements = marked_text.get("resume") if isinstance(marked_text, dict) else marked_text
+        marked_text = structured_output.elements_to_marked_text(elements or [])
     if not marked_text or not isinstance(marked_text, str) or marked_text.strip().startswith(("(", "Error:", "(Agent Error:")):
         log.error(f"Invalid or error content passed to format_resume_with_markers. Content type: {type(marked_text)}")
         # messagebox.showerror("Formatting Error", "Cannot format resume due to invalid input content.") # Replaced
@@ -192,6 +483,11 @@ def format_resume_with_markers(marked_text, filename="formatted_resume.docx"):
 
     log.info(f"Attempting to format resume and save to {filename}")
     try:
+        # Deferred imports (python-docx is only needed when saving)
+        from docx import Document
+        from docx.shared import Pt, Inches, RGBColor
+        from docx.enum.text import WD_PARAGRAPH_ALIGNMENT, WD_TAB_ALIGNMENT, WD_TAB_LEADER
+
         doc = Document()
 
         # --- Define Standard Styles (Customize as needed) ---